@@ -1,209 +1,469 @@
+import os
 import json
+import time
+import threading
 import boto3
+import telemetry
+from telemetry import logger
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from job_prefilter import prefilter_jobs
+from job_dedup import JobDeduper, dedup_jobs, propagate_scores, job_key
+from stage_loader import run_stage, run_stage_collected
+from pipeline_stream import StreamingPipeline
+from artifacts import artifacts, summarize_hops
+from checkpoints import Checkpoints, PendingJobs, run_id_for, batch_run_id
 
 lambda_client = boto3.client("lambda")
 
-def extract_text_from_pdf(bucket, key):
-    try:
-        # Implementation of text extraction from PDF
-        target_lambda_function = "extract-cv-text"
-        
-        payload = {
-            "bucket": bucket,
-            "key": key,
-        }
-        # Invoke the next Lambda
+# "lambda" invokes every stage as its own Lambda, "in-process" calls the stage modules directly
+PIPELINE_TRANSPORT = os.environ.get("PIPELINE_TRANSPORT", "lambda")
+# "batch" runs fetch, score and store one after the other, "streaming" overlaps them in-process
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "batch")
+
+# Scoring fan-out: jobs are split into shards that are scored by parallel workers
+SCORING_SHARD_SIZE = int(os.environ.get("SCORING_SHARD_SIZE", "25"))
+SCORING_MAX_PARALLEL = int(os.environ.get("SCORING_MAX_PARALLEL", "4"))
+SCORING_SHARD_RETRIES = int(os.environ.get("SCORING_SHARD_RETRIES", "2"))
+
+# CVs of one S3 event are processed together, at most this many at a time
+CV_MAX_PARALLEL = int(os.environ.get("CV_MAX_PARALLEL", "8"))
+
+# Pass job lists between Lambda stages as object store references instead of inline payloads
+PIPELINE_ARTIFACTS = os.environ.get("PIPELINE_ARTIFACTS", "false").lower() == "true"
+
+class StageTransport:
+    use_artifacts = False
+
+    def __init__(self):
+        self.timings = {}
+        self.lock = threading.Lock()
+        self.artifact_hops = []
+
+    def record(self, function_name, elapsed):
+        with self.lock:
+            self.timings[function_name] = round(self.timings.get(function_name, 0) + elapsed, 4)
+        logger.info(f"Stage {function_name} took {elapsed:.3f}s ({self.name})")
+
+    def invoke(self, function_name, payload):
+        start = time.perf_counter()
+        try:
+            with telemetry.span(f"invoke.{function_name}", transport=self.name):
+                return self.call(function_name, payload)
+        finally:
+            self.record(function_name, time.perf_counter() - start)
+
+    def invoke_many(self, function_name, payloads, max_parallel):
+        # Returns {key: result or exception}, one failing payload does not affect the others
+        start = time.perf_counter()
+        outcomes = {}
+        with telemetry.span(f"invoke.{function_name}", transport=self.name, calls=len(payloads)), \
+                self.executor(max(1, min(max_parallel, len(payloads)))) as executor:
+            futures = {executor.submit(self.worker, function_name, payload): key for key, payload in payloads.items()}
+            for future in as_completed(futures):
+                try:
+                    outcomes[futures[future]] = self.unwrap(future.result())
+                except Exception as e:
+                    outcomes[futures[future]] = e
+        self.record(function_name, time.perf_counter() - start)
+        return outcomes
+
+    def executor(self, max_workers):
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    @property
+    def worker(self):
+        return self.call
+
+    def unwrap(self, result):
+        return result
+
+    def call(self, function_name, payload):
+        raise NotImplementedError
+
+class LambdaTransport(StageTransport):
+    name = "lambda"
+    use_artifacts = PIPELINE_ARTIFACTS
+
+    def call(self, function_name, payload):
+        request_payload = json.dumps(payload)
         response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
+            FunctionName=function_name,
             InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
+            Payload=request_payload
         )
 
         response_payload = response['Payload'].read()
+        telemetry.count(f"payload_bytes.{function_name}.request", len(request_payload.encode("utf-8")))
+        telemetry.count(f"payload_bytes.{function_name}.response", len(response_payload))
         result = json.loads(response_payload)
-        result_body = json.loads(result['body'])
-        cv_text = result_body.get("cv_text", [])
-        return cv_text
+        if not result:
+            raise Exception(f"{function_name} returned no result")
+        # Counts recorded by the stage Lambda become part of this run
+        telemetry.merge(result.get("telemetry"))
+        if result.get('statusCode') != 200:
+            raise Exception(result.get('body'))
+        return json.loads(result['body'])
+
+class InProcessTransport(StageTransport):
+    # Stage results are passed on as Python objects, without JSON round trips
+    name = "in-process"
+
+    def call(self, function_name, payload):
+        return run_stage(function_name, payload)
+
+    def executor(self, max_workers):
+        try:
+            return ProcessPoolExecutor(max_workers=max_workers)
+        except (OSError, NotImplementedError) as e:
+            # e.g. no /dev/shm inside Lambda
+            logger.warning(f"Process pool unavailable ({e}), falling back to threads")
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+    @property
+    def worker(self):
+        return run_stage_collected
+
+    def unwrap(self, result):
+        result, snapshot = result
+        telemetry.merge(snapshot)
+        return result
+
+TRANSPORTS = {
+    LambdaTransport.name: LambdaTransport,
+    InProcessTransport.name: InProcessTransport,
+}
+
+def send_records(transport, payload, field, records, hop):
+    if transport.use_artifacts:
+        payload[f"{field}_ref"] = artifacts.put(records, hop)
+    else:
+        payload[field] = records
+    return payload
+
+def receive_records(transport, body, field):
+    if isinstance(body, list):
+        return body
+    transport.artifact_hops.extend(body.get("artifacts", []))
+    if f"{field}_ref" in body:
+        return artifacts.get(body[f"{field}_ref"])
+    return body[field]
+
+def extract_text_from_pdf(transport, bucket, key):
+    try:
+        # Implementation of text extraction from PDF
+        result_body = transport.invoke("extract-cv-text", {
+            "bucket": bucket,
+            "key": key,
+        })
+        return result_body.get("cv_text", []), result_body.get("pdf_sha256")
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-def parse_cv(cv_text):
+def parse_cv(transport, cv_text, pdf_sha256=None):
     try:
         # Implementation of CV parsing
-        target_lambda_function = "parse-cv"
-        
-        payload = {
+        result_body = transport.invoke("parse-cv", {
             "cv_text": cv_text,
-        }
-
-        # Invoke the next Lambda
-        response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
-            InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
-        )
-
-        response_payload = response['Payload'].read()
-        result = json.loads(response_payload)
-        result_body = json.loads(result['body'])
+            "pdf_sha256": pdf_sha256,
+        })
         structured_cv = result_body['parsed_cv']
         return structured_cv
     except Exception as e:
         raise Exception(f"Error parsing CV: {str(e)}")
 
-def extract_job_keywords(structured_cv):
+def extract_job_keywords(transport, structured_cv):
     try:
-        target_lambda_function = "extract-job-keywords"
-
-        payload = {
-            "structured-cv": json.dumps(structured_cv),
-        }
-
-        # Invoke the next Lambda
-        response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
-            InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
-        )
-
-        response_payload = response['Payload'].read()
-        result = json.loads(response_payload)
-
-        print(f"Received response from {target_lambda_function}: {result}")
-
-        # Parse the body and extract keywords
-        parsed_body = json.loads(result['body'])
+        parsed_body = transport.invoke("extract-job-keywords", {
+            "structured-cv": structured_cv,
+        })
         keywords = parsed_body.get("keywords", [])
-        print("Extracted keywords:", keywords)
+        logger.info(f"Extracted keywords: {keywords}")
         return keywords
     except Exception as e:
         raise Exception(f"Error extracting keywords: {str(e)}")
 
-def fetch_jobs(keywords):
+def fetch_jobs_by_keyword(transport, keywords, consumers):
     try:
-        target_lambda_function = "fetch-jobs"
-
-        payload = {
+        result_body = transport.invoke("fetch-jobs", {
             "keywords": keywords,
-        }
-
-        # Invoke the next Lambda
-        response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
-            InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
-        )
-
-        response_payload = response['Payload'].read()
-        result = json.loads(response_payload)
-
-        print(f"Received response from {target_lambda_function}: {result}")
-
-        # Parse the body and extract keywords
-        jobs = json.loads(result['body'])
-        print("Extracted jobs:", jobs)
-        return jobs
+            "by_keyword": True,
+            "consumers": consumers,
+            "output_ref": transport.use_artifacts,
+        })
+        jobs = receive_records(transport, result_body, "jobs")
+        logger.info(f"Fetched {len(jobs)} jobs for {len(keywords)} keywords")
+        return jobs, result_body["keyword_jobs"], result_body.get("consumer_jobs", {})
     except Exception as e:
         raise Exception(f"Error fetching jobs: {str(e)}")
 
-def score_jobs(jobs, structured_cv):
+def normalize_keyword(keyword):
+    return " ".join(str(keyword).lower().split())
+
+def fetch_jobs_for_cvs(transport, cv_runs):
+    # Each distinct keyword is queried once and its jobs are shared by every CV that asked for it
+    for cv_run in cv_runs:
+        cv_run["jobs"] = cv_run["checkpoints"].load("fetch-jobs")
+    pending = [cv_run for cv_run in cv_runs if cv_run["jobs"] is None]
+    if not pending:
+        return
+    cv_keywords = [list(dict.fromkeys(normalize_keyword(keyword) for keyword in cv_run["keywords"])) for cv_run in pending]
+    keywords = list(dict.fromkeys(keyword for keywords in cv_keywords for keyword in keywords))
+    logger.info(f"{len(keywords)} distinct keywords for {len(pending)} CVs, {sum(map(len, cv_keywords))} requested")
+    # Incremental fetches keep their watermarks per CV, so each CV gets the postings that are new to it
+    consumers = {cv_run["consumer"]: keywords for cv_run, keywords in zip(pending, cv_keywords)}
+    jobs, keyword_jobs, consumer_jobs = fetch_jobs_by_keyword(transport, keywords, consumers)
+    jobs_by_id = {job.get("id"): job for job in jobs}
+    for cv_run, keywords in zip(pending, cv_keywords):
+        if cv_run["consumer"] in consumer_jobs:
+            job_ids = dict.fromkeys(consumer_jobs[cv_run["consumer"]])
+        else:
+            job_ids = dict.fromkeys(job_id for keyword in keywords for job_id in keyword_jobs.get(keyword, []))
+        cv_run["jobs"] = [jobs_by_id[job_id] for job_id in job_ids if job_id in jobs_by_id]
+        # Jobs an earlier run fetched but did not store are requeued, a refetched copy takes their place
+        queued = [job for job in cv_run["pending"].load() if job.get("id") not in job_ids]
+        if queued:
+            logger.info(f"Requeued {len(queued)} jobs of {cv_run['key']} that an earlier run did not store")
+        cv_run["jobs"] += queued
+        cv_run["pending"].save(cv_run["jobs"])
+        cv_run["checkpoints"].save("fetch-jobs", cv_run["jobs"])
+
+def shard_payload(payload, cvs, shard):
+    # Only the CVs that have jobs in this shard are sent along
+    return dict(payload, cvs={index: cvs[index] for index in dict.fromkeys(job["cv_index"] for job in shard)})
+
+def scoring_checkpoint(value):
+    # Checkpoints written before unscored jobs were kept hold only the scored jobs
+    return {"jobs": value, "unscored": []} if isinstance(value, list) else value
+
+def score_jobs(transport, jobs, cvs, shard_size=SCORING_SHARD_SIZE, max_parallel=SCORING_MAX_PARALLEL, checkpoints=None):
+    # Every job names its CV in "cv_index", so one shard can carry jobs of several CVs.
+    # Returns (scored jobs, jobs that could not be scored)
     try:
-        target_lambda_function = "job-scoring"
-
-        payload = {
-            "jobs": jobs,
-            "cv": structured_cv,
-        }
-
-        # Invoke the next Lambda
-        response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
-            InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
-        )
-
-        response_payload = response['Payload'].read()
-        result = json.loads(response_payload)
-
-        print(f"Received response from {target_lambda_function}: {result}")
-        if result['statusCode'] != 200:
-            raise Exception(f"Error scoring jobs: {result['body']}")
-            return
-        # Parse the body and extract keywords
-        parsed_body = json.loads(result['body'])
-        scored_jobs = parsed_body["jobs"]
-        print("Extracted scored jobs:", scored_jobs)
-        return scored_jobs
+        shard_size = max(1, shard_size)
+        shards = [jobs[i:i + shard_size] for i in range(0, len(jobs), shard_size)]
+        checkpoints = checkpoints or Checkpoints(None)
+        payload = {"output_ref": transport.use_artifacts}
+        if "SCORING_RATE_PER_SECOND" in os.environ:
+            # Split the provider quota between the parallel scoring workers
+            payload["rate_per_second"] = float(os.environ["SCORING_RATE_PER_SECOND"]) / max(1, min(max_parallel, len(shards)))
+        # Shards finished by an earlier attempt of this run are not scored again
+        results = [scoring_checkpoint(checkpoints.load(f"job-scoring-{shard_size}-{i}")) for i in range(len(shards))]
+        pending = [i for i in range(len(shards)) if results[i] is None]
+        if len(pending) < len(shards):
+            logger.info(f"Resuming scoring, {len(shards) - len(pending)} of {len(shards)} shards already done")
+        for attempt in range(SCORING_SHARD_RETRIES + 1):
+            if not pending:
+                break
+            if attempt:
+                logger.warning(f"Retrying {len(pending)} failed scoring shards")
+                telemetry.count("retries.scoring_shard", len(pending))
+            outcomes = transport.invoke_many(
+                "job-scoring",
+                {i: send_records(transport, shard_payload(payload, cvs, shards[i]), "jobs", shards[i], "job-scoring-in") for i in pending},
+                max_parallel
+            )
+            pending = []
+            for i, outcome in sorted(outcomes.items()):
+                try:
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    results[i] = {"jobs": receive_records(transport, outcome, "jobs"), "unscored": outcome.get("unscored", [])}
+                    checkpoints.save(f"job-scoring-{shard_size}-{i}", results[i])
+                except Exception as e:
+                    logger.error(f"Scoring shard {i} failed: {e}")
+                    pending.append(i)
+        if pending:
+            raise Exception(f"{len(pending)} of {len(shards)} shards failed after {SCORING_SHARD_RETRIES} retries")
+        # Shards are merged back in the original job order. Jobs that could not be scored are returned as sent,
+        # the shard checkpoints keep them so a resumed run returns them as well
+        scored_jobs = [job for result in results for job in result["jobs"]]
+        failed = {(str(entry["id"]), str(entry["cv_index"])) for result in results for entry in result["unscored"]}
+        unscored = [job for job in jobs if (str(job.get("id")), str(job.get("cv_index"))) in failed]
+        logger.info(f"Scored {len(scored_jobs)} jobs in {len(shards)} shards")
+        if unscored:
+            reasons = [entry for result in results for entry in result["unscored"]]
+            logger.warning(f"{len(unscored)} jobs could not be scored and are requeued: {reasons[:5]}")
+        return scored_jobs, unscored
     except Exception as e:
         raise Exception(f"Error scoring jobs: {str(e)}")
 
-def store_jobs_to_s3(email, jobs):
-    target_lambda_function = "store-job-matches-to-s3"
-
-    payload = {
-        "jobs": jobs,
-        "email": email,
-    }
+def score_jobs_for_cvs(transport, cv_runs):
+    pending = []
+    for cv_run in cv_runs:
+        scored = scoring_checkpoint(cv_run["checkpoints"].load("job-scoring"))
+        if scored is None:
+            pending.append(cv_run)
+        else:
+            cv_run["jobs"], cv_run["unscored"] = scored["jobs"], scored["unscored"]
+    if not pending:
+        return
+    cvs = {str(index): cv_run["cv"] for index, cv_run in enumerate(pending)}
+    # Copies, so a job shared by several CVs gets a score per CV
+    jobs = [dict(job, cv_index=str(index)) for index, cv_run in enumerate(pending) for job in cv_run["jobs"]]
+    checkpoints = Checkpoints(batch_run_id([cv_run["checkpoints"].run_id for cv_run in pending]))
+    scored_jobs, unscored = score_jobs(transport, jobs, cvs, checkpoints=checkpoints)
+    for cv_run in pending:
+        cv_run["jobs"], cv_run["unscored"] = [], []
+    for job in scored_jobs:
+        pending[int(job.pop("cv_index"))]["jobs"].append(job)
+    for job in unscored:
+        pending[int(job.pop("cv_index"))]["unscored"].append(job)
+    for cv_run in pending:
+        cv_run["checkpoints"].save("job-scoring", {"jobs": cv_run["jobs"], "unscored": cv_run["unscored"]})
+
+def store_jobs_to_s3(transport, email, jobs):
     try:
-        # Invoke the next Lambda
-        response = lambda_client.invoke(
-            FunctionName=target_lambda_function,
-            InvocationType='RequestResponse',  # can be "Event" as well
-            Payload=json.dumps(payload)
-        )
-
-        response_payload = response['Payload'].read()
-        result = json.loads(response_payload)
-
-        print(f"Received response from {target_lambda_function}: {result}")
-
-        # Parse the body and extract keywords
-        if result['statusCode'] != 200:
-            raise Exception(f"Error while storing scored jobs to s3 bucket: {result['body']}")
-            return
-
-        parsed_body = json.loads(result['body'])
-        scored_jobs = parsed_body["jobs"]
-        print("Jobs successfully added to respective s3 bucket.")
+        transport.invoke("store-job-matches-to-s3", send_records(transport, {
+            "email": email,
+        }, "jobs", jobs, "store-job-matches-to-s3-in"))
+        logger.info("Jobs successfully added to respective s3 bucket.")
+        return True
     except Exception as e:
-        print(f"Error while storing scored jobs to s3 bucket: {e}")
+        logger.error(f"Error while storing scored jobs to s3 bucket: {e}")
+        return False
+
+def prepare_cv(transport, record):
+    bucket = record["s3"]["bucket"]["name"]
+    key = record["s3"]["object"]["key"]
+    etag = record["s3"]["object"].get("eTag")
+    # Identifies the CV across uploads of new versions, e.g. for the fetch watermarks and requeued jobs
+    consumer = f"{bucket}/{key}"
+
+    # Stage outputs are checkpointed per CV object, a retry resumes after the last finished stage
+    checkpoints = Checkpoints(run_id_for(bucket, key, etag) if etag else None)
+
+    # Step 1: Extract text
+    text, pdf_sha256 = checkpoints.stage("extract-cv-text", lambda: extract_text_from_pdf(transport, bucket, key))
+
+    # Step 2: Parse CV, cached by the PDF's SHA-256
+    structured_cv = checkpoints.stage("parse-cv", lambda: parse_cv(transport, text, pdf_sha256))
+
+    # Step 3: Extract keywords
+    keywords = checkpoints.stage("extract-job-keywords", lambda: extract_job_keywords(transport, structured_cv))
+    return {
+        "key": key,
+        "consumer": consumer,
+        "checkpoints": checkpoints,
+        "pending": PendingJobs(consumer),
+        "cv": structured_cv,
+        "keywords": keywords,
+        "email": structured_cv.get("Email", "anonymous@example.com"),
+    }
 
-def lambda_handler(event, context):
+def prepare_cv_safely(transport, record):
     try:
-        bucket = event["Records"][0]["s3"]["bucket"]["name"]
-        key = event["Records"][0]["s3"]["object"]["key"]
-
-        # Step 1: Extract text
-        text = extract_text_from_pdf(bucket, key)
-
-        # Step 2: Parse CV
-        structured_cv = parse_cv(text)
-
-        # Step 3: Extract keywords
-        keywords = extract_job_keywords(structured_cv)
-
-        # Step 4: Fetch jobs
-        jobs = fetch_jobs(keywords)
-
-        # Step 5: Score jobs
-        jobs = score_jobs(jobs, structured_cv)
-
-        # Step 6: Save CSV to S3
-        email = structured_cv.get("Email", "anonymous@example.com")
+        return prepare_cv(transport, record)
+    except Exception as e:
+        logger.error(f"Error preparing CV {record['s3']['object']['key']}: {e}")
+        return {"key": record["s3"]["object"]["key"], "error": str(e)}
+
+def store_cv_matches(transport, cv_run):
+    # Skipped if this run already stored its matches
+    if cv_run["checkpoints"].load("store-job-matches-to-s3") is not None:
+        cv_run["stored"] = True
+    else:
         #csv_key = save_jobs_to_csv(email, jobs)
-        store_jobs_to_s3(email, jobs)
-
+        cv_run["stored"] = store_jobs_to_s3(transport, cv_run["email"], cv_run["jobs"])
+        if cv_run["stored"]:
+            cv_run["checkpoints"].save("store-job-matches-to-s3", {"stored": len(cv_run["jobs"])})
+    # Only the jobs that could not be scored stay queued for the next run, after a failed store all of them do
+    if cv_run["stored"]:
+        cv_run["pending"].save(cv_run["unscored"])
+
+def stream_cv_matches(cv_run):
+    # Steps 4-8: Fetched pages flow into the scorer and scored jobs are stored in micro-batches
+    try:
+        cv_run["stream"] = StreamingPipeline(cv_run["cv"], cv_run["email"]).run(cv_run["keywords"])
+        logger.info(f"Streaming pipeline stats for {cv_run['key']}: {cv_run['stream']}")
+    except Exception as e:
+        logger.error(f"Error streaming matches for {cv_run['key']}: {e}")
+        cv_run["error"] = str(e)
+
+def for_each_email(cv_runs, fn, max_parallel=CV_MAX_PARALLEL):
+    # CVs with the same email go one after the other since they update the same matches file
+    by_email = {}
+    for cv_run in cv_runs:
+        by_email.setdefault(cv_run["email"], []).append(cv_run)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(by_email)))) as executor:
+        list(executor.map(lambda group: [fn(cv_run) for cv_run in group], by_email.values()))
+
+def match_cvs(transport, cv_runs):
+    # Step 4: Fetch jobs, shared between CVs with overlapping keywords
+    fetch_jobs_for_cvs(transport, cv_runs)
+
+    # Step 5: Drop repeated and near-duplicate postings, one deduper so all CVs cluster alike
+    deduper = JobDeduper()
+    for cv_run in cv_runs:
+        cv_run["jobs"], cv_run["duplicates"] = cv_run["checkpoints"].stage("dedup", lambda: dedup_jobs(cv_run["jobs"], deduper))
+
+    # Step 6: Rank jobs locally and only send the most relevant ones to the LLM
+    for cv_run in cv_runs:
+        cv_run["jobs"] = cv_run["checkpoints"].stage("prefilter", lambda: prefilter_jobs(cv_run["jobs"], cv_run["cv"]))
+
+    # Step 7: Score jobs, shards mix jobs of several CVs. Duplicates take the score of their scored posting
+    score_jobs_for_cvs(transport, cv_runs)
+    for cv_run in cv_runs:
+        cv_run["jobs"] = propagate_scores(cv_run["jobs"], cv_run["duplicates"])
+        # Duplicates of a job that could not be scored are requeued with it
+        cv_run["unscored"] += [copy for job in cv_run["unscored"] for copy in cv_run["duplicates"].get(job_key(job), [])]
+
+    # Step 8: Save CSV to S3
+    for_each_email(cv_runs, lambda cv_run: store_cv_matches(transport, cv_run))
+
+def summarize_cv_run(cv_run):
+    summary = {"key": cv_run["key"], "error": cv_run.get("error")}
+    if "checkpoints" in cv_run:
+        summary.update({
+            "run_id": cv_run["checkpoints"].run_id,
+            "resumed": cv_run["checkpoints"].resumed,
+            "jobs": len(cv_run["jobs"]) if cv_run.get("jobs") is not None else None,
+            "unscored": len(cv_run["unscored"]) if cv_run.get("unscored") is not None else None,
+            "stored": cv_run.get("stored"),
+            "stream": cv_run.get("stream"),
+        })
+    return summary
+
+@telemetry.traced_handler("Main-cv-job-match")
+def lambda_handler(event, context):
+    transport = TRANSPORTS[event.get("transport", PIPELINE_TRANSPORT)]()
+    try:
+        records = event["Records"]
+        max_workers = max(1, min(CV_MAX_PARALLEL, len(records)))
+
+        # Steps 1-3 for every CV in the event, a failing CV does not stop the others
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            cv_runs = list(executor.map(lambda record: prepare_cv_safely(transport, record), records))
+        ready = [cv_run for cv_run in cv_runs if "error" not in cv_run]
+        if not ready:
+            raise Exception("; ".join(cv_run["error"] for cv_run in cv_runs))
+
+        if event.get("mode", PIPELINE_MODE) == "streaming":
+            # Each CV gets its own streaming pipeline, repeated Adzuna queries are served by the response cache
+            for_each_email(ready, stream_cv_matches)
+            if all("error" in cv_run for cv_run in ready):
+                raise Exception("; ".join(cv_run["error"] for cv_run in ready))
+        else:
+            match_cvs(transport, ready)
+
+        logger.info(f"Stage timings ({transport.name}): {transport.timings}")
+        artifact_report = summarize_hops(transport.artifact_hops + artifacts.take_hops())
+        if artifact_report["hops"]:
+            logger.info(f"Artifact bytes saved: {artifact_report['bytes_saved']}")
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "message": "Processing complete",
+                "transport": transport.name,
+                "timings": transport.timings,
+                "cvs": [summarize_cv_run(cv_run) for cv_run in cv_runs],
+                "artifacts": artifact_report,
                 #"csv_key": csv_key
             })
         }
 
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error: {e}")
         return {
             "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+            "body": json.dumps({"error": str(e), "timings": transport.timings})
+        }
@@ -0,0 +1,75 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from object_store import make_object_store
+
+# Payloads up to this size are still passed inline
+ARTIFACT_INLINE_MAX_BYTES = int(os.environ.get("ARTIFACT_INLINE_MAX_BYTES", str(32 * 1024)))
+
+class ArtifactStore:
+    # Stage outputs are written once as gzipped JSONL and passed on as {"key", "sha256"} references
+    def __init__(self, store, inline_max_bytes=ARTIFACT_INLINE_MAX_BYTES):
+        self.store = store
+        self.inline_max_bytes = inline_max_bytes
+        self.lock = threading.Lock()
+        self.hops = []
+
+    def put(self, records, hop):
+        raw = "\n".join(json.dumps(record) for record in records).encode("utf-8")
+        if len(raw) <= self.inline_max_bytes:
+            ref = {"inline": records}
+            self.record_hop(hop, len(records), len(raw), len(raw), 0)
+            return ref
+        data = gzip.compress(raw)
+        checksum = hashlib.sha256(data).hexdigest()
+        # Content-addressed, so writing the same output twice is harmless
+        key = f"artifacts/{hop}/{checksum}.jsonl.gz"
+        self.store.put(key, data, content_type="application/gzip")
+        ref = {"key": key, "sha256": checksum, "records": len(records), "bytes": len(data)}
+        self.record_hop(hop, len(records), len(raw), len(json.dumps(ref)), len(data))
+        return ref
+
+    def get(self, ref):
+        if "inline" in ref:
+            return ref["inline"]
+        obj = self.store.get(ref["key"])
+        if obj is None:
+            raise KeyError(f"Artifact {ref['key']} not found")
+        data = obj[0]
+        if hashlib.sha256(data).hexdigest() != ref["sha256"]:
+            raise ValueError(f"Checksum mismatch for artifact {ref['key']}")
+        return [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines() if line]
+
+    def record_hop(self, hop, records, payload_bytes, sent_bytes, stored_bytes):
+        with self.lock:
+            self.hops.append({
+                "hop": hop,
+                "records": records,
+                "inline": sent_bytes == payload_bytes,
+                "payload_bytes": payload_bytes,
+                "sent_bytes": sent_bytes,
+                "stored_bytes": stored_bytes,
+                "bytes_saved": payload_bytes - sent_bytes,
+            })
+
+    def take_hops(self):
+        with self.lock:
+            hops, self.hops = self.hops, []
+        return hops
+
+artifact_store = make_object_store("ARTIFACT_STORE", "/tmp/pipeline-artifacts")
+artifacts = ArtifactStore(artifact_store)
+
+def load_records(event, field):
+    # A stage input is either inline under `field` or a reference under `<field>_ref`
+    if f"{field}_ref" in event:
+        return artifacts.get(event[f"{field}_ref"])
+    return event.get(field, [])
+
+def summarize_hops(hops):
+    return {
+        "hops": hops,
+        "bytes_saved": sum(hop["bytes_saved"] for hop in hops),
+    }
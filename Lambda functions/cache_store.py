@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import boto3
+import telemetry
+from telemetry import logger
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class SQLiteCacheBackend:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0], row[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, len(value.encode("utf-8")))
+            )
+            self.conn.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def evict(self, prefix, ttl=None, max_entries=None, max_bytes=None):
+        # Drops expired entries, then least recently used ones until the limits hold
+        evicted = 0
+        with self.lock:
+            if ttl:
+                evicted += self.conn.execute(
+                    "DELETE FROM entries WHERE substr(key, 1, ?) = ? AND created < ?", (len(prefix), prefix, time.time() - ttl)
+                ).rowcount
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries WHERE substr(key, 1, ?) = ? ORDER BY accessed DESC", (len(prefix), prefix)
+            ).fetchall()
+            kept_entries, kept_bytes, stale = 0, 0, []
+            for key, size in rows:
+                if (max_entries and kept_entries >= max_entries) or (max_bytes and kept_bytes + size > max_bytes):
+                    stale.append((key,))
+                else:
+                    kept_entries += 1
+                    kept_bytes += size
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+            self.conn.commit()
+        return evicted + len(stale)
+
+class S3CacheBackend:
+    def __init__(self, bucket, prefix="cache/", endpoint_url=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        # endpoint_url allows S3-compatible stores such as MinIO
+        self.s3 = boto3.client("s3", endpoint_url=endpoint_url) if endpoint_url else boto3.client("s3")
+
+    def get(self, key):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        created = float(response.get("Metadata", {}).get("created", response["LastModified"].timestamp()))
+        return response["Body"].read().decode("utf-8"), created
+
+    def set(self, key, value):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=value.encode("utf-8"),
+            ContentType="application/json",
+            Metadata={"created": str(time.time())},
+        )
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def evict(self, prefix, ttl=None, max_entries=None, max_bytes=None):
+        # S3 has no access time, so size-based eviction drops the oldest objects first
+        objects = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            objects.extend(page.get("Contents", []))
+        objects.sort(key=lambda obj: obj["LastModified"], reverse=True)
+        cutoff = time.time() - ttl if ttl else None
+        kept_entries, kept_bytes, stale = 0, 0, []
+        for obj in objects:
+            expired = cutoff is not None and obj["LastModified"].timestamp() < cutoff
+            over_limit = (max_entries and kept_entries >= max_entries) or (max_bytes and kept_bytes + obj["Size"] > max_bytes)
+            if expired or over_limit:
+                stale.append({"Key": obj["Key"]})
+            else:
+                kept_entries += 1
+                kept_bytes += obj["Size"]
+        for i in range(0, len(stale), 1000):
+            self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": stale[i:i + 1000], "Quiet": True})
+        return len(stale)
+
+class Cache:
+    def __init__(self, backend, namespace, ttl=None, max_entries=None, max_bytes=None):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        try:
+            entry = self.backend.get(f"{self.namespace}/{key}") if self.backend else None
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            entry = None
+        if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+            entry = None
+        if entry is None:
+            self.misses += 1
+            telemetry.count(f"cache.{self.namespace}.misses")
+            return None
+        self.hits += 1
+        telemetry.count(f"cache.{self.namespace}.hits")
+        return json.loads(entry[0])
+
+    def set(self, key, value):
+        if not self.backend:
+            return
+        try:
+            self.backend.set(f"{self.namespace}/{key}", json.dumps(value))
+            self.writes += 1
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def evict(self):
+        if not self.backend or not (self.ttl or self.max_entries or self.max_bytes):
+            return 0
+        try:
+            evicted = self.backend.evict(f"{self.namespace}/", self.ttl, self.max_entries, self.max_bytes)
+        except Exception as e:
+            logger.warning(f"Cache eviction failed: {e}")
+            return 0
+        self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+def optional_number(value, cast):
+    return cast(value) if value not in (None, "", "0") else None
+
+def make_cache(namespace, env_prefix, default_path, default_ttl=None):
+    # Backend and limits come from <env_prefix>_BACKEND, _PATH, _BUCKET, _TTL, _MAX_ENTRIES, ...
+    backend_name = os.environ.get(f"{env_prefix}_BACKEND", "sqlite").lower()
+    if backend_name == "s3":
+        backend = S3CacheBackend(
+            os.environ[f"{env_prefix}_BUCKET"],
+            prefix=os.environ.get(f"{env_prefix}_PREFIX", "cache/"),
+            endpoint_url=os.environ.get(f"{env_prefix}_ENDPOINT_URL"),
+        )
+    elif backend_name == "sqlite":
+        backend = SQLiteCacheBackend(os.environ.get(f"{env_prefix}_PATH", default_path))
+    else:
+        backend = None
+    return Cache(
+        backend,
+        namespace,
+        ttl=optional_number(os.environ.get(f"{env_prefix}_TTL", default_ttl), float),
+        max_entries=optional_number(os.environ.get(f"{env_prefix}_MAX_ENTRIES"), int),
+        max_bytes=optional_number(os.environ.get(f"{env_prefix}_MAX_BYTES"), int),
+    )
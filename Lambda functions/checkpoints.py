@@ -0,0 +1,63 @@
+import json
+import hashlib
+from object_store import make_object_store
+from telemetry import logger
+
+checkpoint_store = make_object_store("CHECKPOINT_STORE", "/tmp/pipeline-checkpoints")
+
+def run_id_for(bucket, key, etag):
+    # Same CV object (key + ETag) -> same run, a re-uploaded CV gets a fresh run
+    return hashlib.sha256(f"{bucket}/{key}@{etag}".encode("utf-8")).hexdigest()[:24]
+
+def batch_run_id(run_ids):
+    # Work shared by several CVs is checkpointed under the ordered list of their run ids
+    if not run_ids or None in run_ids:
+        return None
+    return hashlib.sha256("|".join(run_ids).encode("utf-8")).hexdigest()[:24]
+
+class Checkpoints:
+    # Stage outputs of one pipeline run, so a retry skips the stages that already finished
+    def __init__(self, run_id, store=None):
+        self.run_id = run_id
+        self.store = store or checkpoint_store
+        self.resumed = []
+
+    def path(self, name):
+        return f"runs/{self.run_id}/{name}.json"
+
+    def load(self, name):
+        if not self.run_id:
+            return None
+        obj = self.store.get(self.path(name))
+        if obj is None:
+            return None
+        self.resumed.append(name)
+        return json.loads(obj[0])["value"]
+
+    def save(self, name, value):
+        if self.run_id:
+            self.store.put(self.path(name), json.dumps({"value": value}).encode("utf-8"), content_type="application/json")
+
+    def stage(self, name, fn):
+        checkpoint = self.load(name)
+        if checkpoint is not None:
+            logger.info(f"Resuming {name} from checkpoint of run {self.run_id}")
+            return checkpoint
+        value = fn()
+        self.save(name, value)
+        return value
+
+class PendingJobs:
+    # Jobs of one consumer (a CV) that were fetched but not stored yet. Incremental fetches record their
+    # watermark when the jobs are fetched, so jobs a run could not score or store are kept here and requeued
+    # by the consumer's next run instead of being lost
+    def __init__(self, consumer, store=None):
+        self.key = f"pending/{hashlib.sha256(consumer.encode('utf-8')).hexdigest()[:24]}.json"
+        self.store = store or checkpoint_store
+
+    def load(self):
+        obj = self.store.get(self.key)
+        return json.loads(obj[0])["value"] if obj is not None else []
+
+    def save(self, jobs):
+        self.store.put(self.key, json.dumps({"value": jobs}).encode("utf-8"), content_type="application/json")
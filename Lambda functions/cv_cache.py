@@ -0,0 +1,51 @@
+import os
+import time
+import tempfile
+import pdf_extract
+from cache_store import make_cache
+
+# Bump whenever text extraction changes so cached texts are not reused
+EXTRACTOR_VERSION = "1"
+
+# Extracted text and parsed CVs of the same PDF, shared by the Lambda stages and jobAgent.py
+cv_cache = make_cache("cv", "CV_CACHE", os.path.join(tempfile.gettempdir(), "cv-cache.sqlite"))
+
+# Work not repeated thanks to cache hits
+saved = {"pages": 0, "llm_calls": 0, "seconds": 0.0}
+
+def read_pdf_text(source):
+    # source is a path, bytes or a stream. Returns (text, sha256 of the PDF bytes),
+    # the text is served from the cache for a known PDF
+    with pdf_extract.open_source(source) as (path, sha256):
+        key = f"text/{EXTRACTOR_VERSION}/{sha256}"
+        cached = cv_cache.get(key)
+        if cached is not None:
+            saved["pages"] += cached["pages"]
+            saved["seconds"] += cached["seconds"]
+            return cached["text"], sha256
+        start = time.perf_counter()
+        text, pages, failed = pdf_extract.extract_text(path)
+    # A text with skipped pages is incomplete and must be extracted again next time
+    if not failed:
+        cv_cache.set(key, {"text": text, "pages": pages, "seconds": round(time.perf_counter() - start, 4)})
+        cv_cache.evict()
+    return text, sha256
+
+def parsed_key(sha256, parser_version, model_name):
+    return f"parsed/{parser_version}/{model_name}/{sha256}"
+
+def get_parsed_cv(sha256, parser_version, model_name):
+    cached = cv_cache.get(parsed_key(sha256, parser_version, model_name))
+    if cached is None:
+        return None
+    saved["llm_calls"] += 1
+    saved["seconds"] += cached["seconds"]
+    return cached["parsed_cv"]
+
+def set_parsed_cv(sha256, parser_version, model_name, parsed_cv, seconds):
+    cv_cache.set(parsed_key(sha256, parser_version, model_name), {"parsed_cv": parsed_cv, "seconds": round(seconds, 4)})
+    cv_cache.evict()
+
+def stats():
+    return dict(cv_cache.stats(), saved_pages=saved["pages"], saved_llm_calls=saved["llm_calls"],
+                saved_seconds=round(saved["seconds"], 4))
@@ -1,32 +1,39 @@
-import io
 import boto3
 import json
-from PyPDF2 import PdfReader
+import cv_cache
+import telemetry
+from telemetry import logger
 
 s3 = boto3.client("s3")
 
-def lambda_handler(event, context):
-    try:
-        # Get bucket and key from event
-        bucket = event["bucket"]
-        key = event["key"]
+def run(event):
+    # Get bucket and key from event
+    bucket = event["bucket"]
+    key = event["key"]
 
-        response = s3.get_object(Bucket=bucket, Key=key)
-        file_stream = io.BytesIO(response["Body"].read())
+    response = s3.get_object(Bucket=bucket, Key=key)
 
-        pdf_reader = PdfReader(file_stream)
-        text = "".join([page.extract_text() or "" for page in pdf_reader.pages])    
+    # The body is streamed to a temp file, a re-uploaded PDF with the same bytes is served from the CV cache
+    text, pdf_sha256 = cv_cache.read_pdf_text(response["Body"])
+    logger.info(f"Extracted {len(text)} characters from {key}")
 
+    return {
+        "message": "PDF text extracted",
+        "cv_text": text,
+        "pdf_sha256": pdf_sha256,
+        "cache": cv_cache.stats()
+    }
+
+@telemetry.traced_handler("extract-cv-text")
+def lambda_handler(event, context):
+    try:
         result = {
             "statusCode": 200,
-            "body": json.dumps({
-                "message": "PDF text extracted",
-                "cv_text": text
-            })
+            "body": json.dumps(run(event))
         }
-        print(f"Result: {result}")
         return result
     except Exception as e:
+        logger.error(f"Error extracting text from PDF: {e}")
         return {
             "statusCode": 500,
             "body": json.dumps({
@@ -1,56 +1,75 @@
-import os
-import re
 import json
-import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
+import llm_backends
+import llm_client
+import llm_output
+import prompt_builder
+import telemetry
+from telemetry import logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# A cheap stage, routed to the small local model when LOCAL_LLM_BASE_URL is set. Retries, rate limiting and
+# the circuit breaker are handled by llm_client
+llm = llm_backends.route("extract-job-keywords")
 
-# Load Gemini LLM with API key from environment
-llm = ChatGoogleGenerativeAI(
-    model='gemini-2.0-flash-exp',
-    google_api_key=os.environ.get("GEMINI_API_KEY")
-)
+# Objects at the root for OpenAI's structured output, the prompt's plain list is accepted as well
+KEYWORDS_SCHEMA = {
+    "title": "job_keywords",
+    "type": "object",
+    "properties": {"keywords": {"type": "array", "items": {"type": "string"}}},
+    "required": ["keywords"],
+}
 
+def validate_keywords(parsed):
+    if isinstance(parsed, dict):
+        parsed = parsed.get("keywords")
+    if not isinstance(parsed, list):
+        raise ValueError("Output is not a list")
+    keywords = [keyword.strip() for keyword in parsed if isinstance(keyword, str) and keyword.strip()]
+    if not keywords:
+        raise ValueError("No keywords in the output")
+    return keywords
+
+def build_prompt(profile):
+    return (
+        "You are given a structured candidate profile that includes skills, work experience, and education.\n"
+        "From this profile, extract only the **top 3 most relevant job role or field keywords** that best describe the candidate’s main areas of expertise.\n"
+        "Do not include infrastructure tools (e.g., Docker, CI/CD), libraries (e.g., TensorFlow, PyTorch), or general terms (e.g., SQL, AWS) unless they are central to the field.\n\n"
+        "Return only a JSON list of exactly 3 most concise and relevant keywords. Examples: [\"data science\", \"machine learning\", \"natural language processing\"]\n\n"
+        f"Profile:\n{profile}"
+    )
+
+def run(event):
+    # Get structured CV JSON from event
+    structured_cv = event.get("structured-cv")
+    if not structured_cv:
+        raise ValueError("Missing 'structured_cv' in event payload")
+    # Lambda callers send the CV JSON-encoded, in-process callers pass the dict itself
+    if isinstance(structured_cv, str):
+        structured_cv = json.loads(structured_cv)
+
+    # Create prompt to extract keywords
+    verbose_prompt = build_prompt(json.dumps(structured_cv, indent=2))
+    if prompt_builder.compact():
+        prompt = prompt_builder.record("extract-job-keywords", build_prompt(prompt_builder.cv_digest(structured_cv)),
+                                       telemetry.estimate_tokens(verbose_prompt))
+    else:
+        prompt = verbose_prompt
+
+    keywords = llm_output.invoke(llm, prompt, "extract-job-keywords", KEYWORDS_SCHEMA, validate_keywords)
+
+    return {
+        "keywords": keywords,
+        "llm": llm_client.stats(),
+        "output": llm_output.stats()
+    }
+
+@telemetry.traced_handler("extract-job-keywords")
 def lambda_handler(event, context):
     try:
-        # Get structured CV JSON from event
-        structured_cv = event.get("structured-cv")
-        if not structured_cv:
-            raise ValueError("Missing 'structured_cv' in event payload")
-
-        # Create prompt to extract keywords
-        prompt = (
-            "You are given a structured candidate profile in JSON format that includes skills, work experience, and education.\n"
-            "From this profile, extract only the **top 3 most relevant job role or field keywords** that best describe the candidate’s main areas of expertise.\n"
-            "Do not include infrastructure tools (e.g., Docker, CI/CD), libraries (e.g., TensorFlow, PyTorch), or general terms (e.g., SQL, AWS) unless they are central to the field.\n\n"
-            "Return only a JSON list of exactly 3 most concise and relevant keywords. Examples: [\"data science\", \"machine learning\", \"natural language processing\"]\n\n"
-            f"Profile:\n{json.dumps(structured_cv, indent=2)}"
-        )
-
-        # Call Gemini model
-        result = llm.invoke(prompt)
-
-        # Clean up response text from code fences and whitespace
-        clean_result = re.sub(r"^```(?:json)?|```$", "", result.content.strip(), flags=re.MULTILINE).strip()
-
-        # Try parsing model output as JSON
-        try:
-            keywords = json.loads(clean_result)
-            if not isinstance(keywords, list):
-                raise ValueError("Output is not a list")
-        except Exception as parse_err:
-            logger.error(f"Failed to parse model output: {result}")
-            raise parse_err
-
         result = {
             "statusCode": 200,
-            "body": json.dumps({
-                "keywords": keywords
-            })
+            "body": json.dumps(run(event))
         }
-        logger.info(f"Extracted keywords: {result}")
+        logger.info(f"Extracted keywords: {result['body']}")
 
         return result
 
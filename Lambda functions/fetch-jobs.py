@@ -1,45 +1,251 @@
 import json
 import os
+import time
+import random
+import itertools
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from cache_store import content_hash, make_cache
+from fetch_state import WatermarkStore, query_key
+from artifacts import artifacts
+import telemetry
+from telemetry import logger
 
 adzuna_app_id = os.environ.get("ADZUNA_APP_ID")
 adzuna_api_key = os.environ.get("ADZUNA_API_KEY")
-adzuna_endpoint = "https://api.adzuna.com/v1/api/jobs/de/search/1"
+adzuna_base_url = os.environ.get("ADZUNA_BASE_URL", "https://api.adzuna.com/v1/api/jobs")
 
-def lambda_handler(event, context):
-    job_keywords = event.get("keywords", [])
+# Fetch settings, can be overridden per invocation through the event
+ADZUNA_COUNTRIES = [c.strip() for c in os.environ.get("ADZUNA_COUNTRIES", "de").split(",") if c.strip()]
+ADZUNA_PAGES = int(os.environ.get("ADZUNA_PAGES", "1"))
+ADZUNA_RESULTS_PER_PAGE = int(os.environ.get("ADZUNA_RESULTS_PER_PAGE", "20"))
+ADZUNA_MAX_WORKERS = int(os.environ.get("ADZUNA_MAX_WORKERS", "16"))
+ADZUNA_MAX_RETRIES = int(os.environ.get("ADZUNA_MAX_RETRIES", "4"))
+ADZUNA_TIMEOUT = float(os.environ.get("ADZUNA_TIMEOUT", "10"))
+ADZUNA_INCREMENTAL = os.environ.get("ADZUNA_INCREMENTAL", "false").lower() == "true"
+FETCH_STATE_PATH = os.environ.get("FETCH_STATE_PATH", "/tmp/adzuna-fetch-state.json")
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# One pooled session reused across requests and warm invocations
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=ADZUNA_MAX_WORKERS))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=ADZUNA_MAX_WORKERS))
+
+# Raw Adzuna responses, so repeating a query within the TTL costs no request
+response_cache = make_cache("adzuna-responses", "ADZUNA_CACHE", "/tmp/adzuna-cache.sqlite", default_ttl=3600)
+
+def retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, min(30, 2 ** attempt))
+
+def fetch_page(keyword, country, page, results_per_page, sort_by=None):
+    url = f"{adzuna_base_url}/{country}/search/{page}"
+    params = {
+        "results_per_page": results_per_page,
+        "what": keyword,
+        # "where": "Germany",
+        "full_time": 1,
+        # "experience": "0"
+    }
+    if sort_by:
+        params["sort_by"] = sort_by
+    cache_key = content_hash(url, params)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached.get("results", [])
+    params.update({"app_id": adzuna_app_id, "app_key": adzuna_api_key})
+    for attempt in range(ADZUNA_MAX_RETRIES + 1):
+        with telemetry.span("adzuna.request", keyword=keyword, page=page):
+            response = session.get(url, params=params, timeout=ADZUNA_TIMEOUT)
+        telemetry.count("payload_bytes.adzuna.response", len(response.content))
+        if response.status_code in RETRYABLE_STATUS_CODES and attempt < ADZUNA_MAX_RETRIES:
+            delay = retry_delay(response, attempt)
+            logger.warning(f"Adzuna returned {response.status_code} for {keyword} ({country}, page {page}), retrying in {delay:.1f}s")
+            telemetry.count("retries.adzuna")
+            time.sleep(delay)
+            continue
+        response.raise_for_status()
+        payload = response.json()
+        response_cache.set(cache_key, payload)
+        return payload.get("results", [])
+
+def fetch_page_safely(query):
+    keyword, country, page, results_per_page = query
+    try:
+        jobs = fetch_page(keyword, country, page, results_per_page)
+        logger.debug(f"Fetched {len(jobs)} jobs from Adzuna for {keyword} ({country}, page {page})")
+        return jobs
+    except Exception as e:
+        logger.error(f"Error fetching jobs from Adzuna API for {keyword} ({country}, page {page}): {e}")
+        return []
+
+def dedupe_jobs(pages, seen_ids=None):
+    seen_ids = set() if seen_ids is None else seen_ids
     results = []
+    for job in itertools.chain.from_iterable(pages):
+        job_id = job.get("id")
+        if job_id is not None and job_id in seen_ids:
+            continue
+        seen_ids.add(job_id)
+        results.append(job)
+    return results
 
+def group_by_keyword(queries, pages):
+    # Returns the unique jobs plus the job ids found for each keyword, so callers can share one fetch
+    seen_ids = set()
+    jobs, keyword_jobs = [], {}
+    for query, page in zip(queries, pages):
+        keyword_jobs.setdefault(query[0], []).extend(job.get("id") for job in page)
+        jobs.extend(dedupe_jobs([page], seen_ids))
+    return jobs, keyword_jobs
+
+def fetch_jobs(keywords, countries=None, pages=ADZUNA_PAGES, results_per_page=ADZUNA_RESULTS_PER_PAGE, by_keyword=False):
+    queries = [
+        (keyword, country, page, results_per_page)
+        for keyword in keywords
+        for country in (countries or ADZUNA_COUNTRIES)
+        for page in range(1, pages + 1)
+    ]
+    if not queries:
+        return ([], {}) if by_keyword else []
+    with ThreadPoolExecutor(max_workers=min(ADZUNA_MAX_WORKERS, len(queries))) as executor:
+        # map keeps the keyword x country x page order, so deduplication keeps the first occurrence
+        if by_keyword:
+            return group_by_keyword(queries, executor.map(fetch_page_safely, queries))
+        return dedupe_jobs(executor.map(fetch_page_safely, queries))
+
+def iter_job_pages(keywords, countries=None, pages=ADZUNA_PAGES, results_per_page=ADZUNA_RESULTS_PER_PAGE):
+    # Yields deduplicated pages as soon as they arrive, with at most ADZUNA_MAX_WORKERS requests in flight
+    queries = iter([
+        (keyword, country, page, results_per_page)
+        for keyword in keywords
+        for country in (countries or ADZUNA_COUNTRIES)
+        for page in range(1, pages + 1)
+    ])
+    seen_ids = set()
+    with ThreadPoolExecutor(max_workers=ADZUNA_MAX_WORKERS) as executor:
+        pending = {executor.submit(fetch_page_safely, query) for query in itertools.islice(queries, ADZUNA_MAX_WORKERS)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_query = next(queries, None)
+                if next_query is not None:
+                    pending.add(executor.submit(fetch_page_safely, next_query))
+                page = dedupe_jobs([future.result()], seen_ids)
+                if page:
+                    yield page
+
+def fetch_new_jobs_for_query(query, watermarks, consumers=(None,)):
+    # Pages are newest first, so stop as soon as a page reaches postings every consumer saw in a previous run.
+    # Returns the new or changed jobs of each consumer
+    keyword, country, pages, results_per_page = query
+    keys = {consumer: query_key(keyword, country, consumer) for consumer in consumers}
+    fetched, new_jobs = [], {consumer: [] for consumer in consumers}
+    pending = set(consumers)
     try:
-        for keyword in job_keywords:
-            params = {
-                "app_id": adzuna_app_id,
-                "app_key": adzuna_api_key,
-                "results_per_page": 3,
-                "what": keyword,
-                # "where": "Germany",
-                "full_time": 1,
-                # "experience": "0"
-            }
-            try:
-                response = requests.get(adzuna_endpoint, params=params)
-                print(f"Response from Adzuna for {keyword}: {response.text}")
-                jobs = response.json().get("results", [])
-                results.extend(jobs)
-            except Exception as e:
-                print(f"Error fetching jobs from Adzuna API: {e}")
+        for page in range(1, pages + 1):
+            jobs = fetch_page(keyword, country, page, results_per_page, sort_by="date")
+            fetched.extend(jobs)
+            for consumer, key in keys.items():
+                for job in jobs:
+                    if watermarks.classify(key, job) != "known":
+                        new_jobs[consumer].append(job)
+                    elif watermarks.is_before_watermark(key, job):
+                        pending.discard(consumer)
+            if not pending or len(jobs) < results_per_page:
+                break
+    except Exception as e:
+        logger.error(f"Error fetching jobs from Adzuna API for {keyword} ({country}): {e}")
+    for key in keys.values():
+        watermarks.record(key, fetched)
+    logger.info(f"{max(map(len, new_jobs.values()))} new or changed jobs out of {len(fetched)} fetched "
+                f"for {keyword} ({country}) and {len(consumers)} consumers")
+    return new_jobs
+
+def fetch_new_jobs(keywords, countries=None, pages=ADZUNA_PAGES, results_per_page=ADZUNA_RESULTS_PER_PAGE,
+                   state_path=FETCH_STATE_PATH, by_keyword=False, consumers=None):
+    # consumers maps a consumer id (a CV) to its keywords, each one has its own watermarks.
+    # Without it all callers share one watermark per query
+    consumers = consumers or {None: keywords}
+    watermarks = WatermarkStore(state_path)
+    queries = [
+        (keyword, country, pages, results_per_page)
+        for keyword in keywords
+        for country in (countries or ADZUNA_COUNTRIES)
+    ]
+    if not queries:
+        return ([], {}, {}) if by_keyword else []
+    query_consumers = [
+        [consumer for consumer, consumer_keywords in consumers.items() if query[0] in consumer_keywords]
+        for query in queries
+    ]
+    with ThreadPoolExecutor(max_workers=min(ADZUNA_MAX_WORKERS, len(queries))) as executor:
+        new_jobs = list(executor.map(
+            lambda query, query_consumers: fetch_new_jobs_for_query(query, watermarks, query_consumers or [None]),
+            queries, query_consumers))
+    watermarks.save()
+    pages_per_query = [dedupe_jobs(jobs.values()) for jobs in new_jobs]
+    if not by_keyword:
+        return dedupe_jobs(pages_per_query)
+    results, keyword_jobs = group_by_keyword(queries, pages_per_query)
+    consumer_jobs = {consumer: [] for consumer in consumers if consumer is not None}
+    for jobs in new_jobs:
+        for consumer, consumer_new_jobs in jobs.items():
+            if consumer is not None:
+                consumer_jobs[consumer].extend(job.get("id") for job in consumer_new_jobs)
+    return results, keyword_jobs, consumer_jobs
 
+def run(event):
+    job_keywords = event.get("keywords", [])
+    by_keyword = bool(event.get("by_keyword"))
+    options = {
+        "countries": event.get("countries"),
+        "pages": int(event.get("pages", ADZUNA_PAGES)),
+        "results_per_page": int(event.get("results_per_page", ADZUNA_RESULTS_PER_PAGE)),
+        "by_keyword": by_keyword,
+    }
+    keyword_jobs = consumer_jobs = None
+    if event.get("incremental", ADZUNA_INCREMENTAL):
+        # "consumers" maps CV ids to their keywords, a single caller can pass its id as "consumer"
+        consumers = event.get("consumers") or ({event["consumer"]: job_keywords} if event.get("consumer") else None)
+        results = fetch_new_jobs(job_keywords, consumers=consumers, **options)
+        if by_keyword:
+            results, keyword_jobs, consumer_jobs = results
+    else:
+        results = fetch_jobs(job_keywords, **options)
+        if by_keyword:
+            results, keyword_jobs = results
+    response_cache.evict()
+    logger.info(f"Fetched {len(results)} unique jobs for {len(job_keywords)} keywords")
+    if event.get("output_ref"):
+        body = {"jobs_ref": artifacts.put(results, "fetch-jobs-out"), "artifacts": artifacts.take_hops()}
+    elif by_keyword:
+        body = {"jobs": results}
+    else:
+        return results
+    if by_keyword:
+        body["keyword_jobs"] = keyword_jobs
+        if consumer_jobs is not None:
+            body["consumer_jobs"] = consumer_jobs
+    return body
+
+@telemetry.traced_handler("fetch-jobs")
+def lambda_handler(event, context):
+    try:
         result = {
             "statusCode": 200,
-            "body": json.dumps(results)
+            "body": json.dumps(run(event))
         }
-        print(f"Results: {result}")
         return result
     except Exception as e:
-        print(e)
+        logger.error(f"Error fetching jobs: {e}")
         return {
                 "statusCode": 500,
                 "body": json.dumps({
                     "message": "Error fetching jobs from Adzuna API."
                 })
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,67 @@
+import os
+import json
+import threading
+from cache_store import content_hash
+
+FETCH_STATE_MAX_SEEN = int(os.environ.get("FETCH_STATE_MAX_SEEN", "5000"))
+
+def job_fingerprint(job):
+    # Only fields that describe the posting, Adzuna tracking fields change on every response
+    return content_hash(
+        job.get("title", ""),
+        job.get("description", ""),
+        job.get("company", {}).get("display_name", ""),
+        job.get("location", {}).get("display_name", ""),
+        job.get("category", {}).get("label", ""),
+        job.get("salary_min"),
+        job.get("salary_max"),
+        job.get("contract_time"),
+        job.get("contract_type"),
+    )
+
+def query_key(keyword, country, consumer=None):
+    # Watermarks are kept per consumer (a CV), so one CV's run does not hide existing postings from another
+    key = f"{country}:{keyword.strip().lower()}"
+    return f"{consumer}|{key}" if consumer else key
+
+class WatermarkStore:
+    # Per-consumer and query watermark (newest `created` timestamp and fingerprints of seen ids) kept in a local JSON file
+    def __init__(self, path, max_seen=FETCH_STATE_MAX_SEEN):
+        self.path = path
+        self.max_seen = max_seen
+        self.lock = threading.Lock()
+        self.queries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.queries = json.load(f)
+
+    def watermark(self, key):
+        return self.queries.get(key, {"last_created": "", "seen": {}})
+
+    def classify(self, key, job):
+        seen = self.watermark(key)["seen"]
+        job_id = str(job.get("id", ""))
+        if job_id not in seen:
+            return "new"
+        return "known" if seen[job_id]["fingerprint"] == job_fingerprint(job) else "changed"
+
+    def is_before_watermark(self, key, job):
+        return job.get("created", "") <= self.watermark(key)["last_created"]
+
+    def record(self, key, jobs):
+        with self.lock:
+            watermark = self.queries.setdefault(key, {"last_created": "", "seen": {}})
+            for job in jobs:
+                created = job.get("created", "")
+                watermark["seen"][str(job.get("id", ""))] = {"fingerprint": job_fingerprint(job), "created": created}
+                watermark["last_created"] = max(watermark["last_created"], created)
+            if len(watermark["seen"]) > self.max_seen:
+                newest = sorted(watermark["seen"].items(), key=lambda item: item[1]["created"], reverse=True)
+                watermark["seen"] = dict(newest[:self.max_seen])
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.queries, f)
+            os.replace(tmp_path, self.path)
@@ -1,21 +1,43 @@
 import os
-import re
 import json
-import time
-import boto3
-from datetime import datetime
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import threading
+from cache_store import content_hash, make_cache
+from artifacts import artifacts, load_records
+import llm_backends
+import llm_client
+import llm_output
+import prompt_builder
+import telemetry
+from telemetry import logger
 
-# Initialize LLM
-gemini_api_key = os.environ["GEMINI_API_KEY"]
-llm = ChatGoogleGenerativeAI(model='gemini-2.0-flash-exp', google_api_key=gemini_api_key)
+# Backends for this stage from the LLM_BACKENDS_* settings, retries, rate limiting and the circuit breaker
+# are handled by llm_client
+llm = llm_backends.route("job-scoring")
+MODEL_NAME = llm.model
 
-def build_scoring_prompt(job, cv):
+# Bump whenever the scoring prompts change so cached scores are not reused
+PROMPT_VERSION = "2" if prompt_builder.compact() else "1"
+score_cache = make_cache("job-scores", "SCORE_CACHE", "/tmp/job-score-cache.sqlite")
+
+# Scoring engine settings, can be overridden per invocation through the event
+SCORING_CONCURRENCY = int(os.environ.get("SCORING_CONCURRENCY", "8"))
+SCORING_MAX_RETRIES = int(os.environ.get("SCORING_MAX_RETRIES", str(llm_client.LLM_MAX_RETRIES)))
+SCORING_BATCH_SIZE = int(os.environ.get("SCORING_BATCH_SIZE", "1"))  # jobs per LLM call, 1 keeps one prompt per job
+SCORING_BATCH_MAX_ATTEMPTS = int(os.environ.get("SCORING_BATCH_MAX_ATTEMPTS", "3"))
+
+# Reused across warm invocations so the async LLM client stays bound to one loop,
+# the lock serializes callers that share this module from several threads
+event_loop = asyncio.new_event_loop()
+event_loop_lock = threading.Lock()
+
+def build_verbose_scoring_prompt(job, cv, cv_json=None):
+    cv_json = json.dumps(cv, indent=2) if cv_json is None else cv_json
     return f"""
         You are a job matching assistant. Score the fit of a candidate for a job posting.
 
         ### Candidate CV (JSON)
-        {json.dumps(cv, indent=2)}
+        {cv_json}
 
         ### Job Posting
         Title: {job.get("title", "")}
@@ -39,27 +61,306 @@ def build_scoring_prompt(job, cv):
         "reason": "Short explanation"
         }}""".strip()
 
-def lambda_handler(event, context):
-    jobs = event.get("jobs", [])
-    cv = event.get("cv", {})
-    for job in jobs:
+def build_job_block(job, job_key):
+    return {
+        "id": job_key,
+        "title": job.get("title", ""),
+        "company": job.get("company", {}).get("display_name", ""),
+        "location": job.get("location", {}).get("display_name", ""),
+        "category": job.get("category", {}).get("label", ""),
+        "description": job.get("description", ""),
+    }
+
+def build_verbose_batch_scoring_prompt(jobs, cv, cv_json=None):
+    cv_json = json.dumps(cv, indent=2) if cv_json is None else cv_json
+    job_blocks = [build_job_block(job, str(index)) for index, job in enumerate(jobs)]
+    return f"""
+        You are a job matching assistant. Score the fit of a candidate for each of the job postings below.
+
+        ### Candidate CV (JSON)
+        {cv_json}
+
+        ### Job Postings (JSON array)
+        {json.dumps(job_blocks, indent=2)}
+
+        ### Instructions:
+        Score how well each job matches the candidate's background. Use the following criteria:
+        - Relevant skills match (e.g., programming languages, frameworks)
+        - Job title relevance to past experience
+        - Educational background fit
+        - General industry alignment
+
+        Return only a JSON array with exactly one object per job posting, using the posting's "id", like this:
+
+        ```json
+        [
+        {{
+        "id": "0",
+        "score": 0–100,
+        "reason": "Short explanation"
+        }}
+        ]""".strip()
+
+# Compact prompts put the static instructions first, so providers that cache prompt prefixes reuse them
+SCORING_CRITERIA = ("Criteria: relevant skills match (programming languages, frameworks), job title relevance to past "
+                    "experience, educational background fit, general industry alignment.")
+SCORING_INSTRUCTIONS = f"""You are a job matching assistant. Score how well the candidate fits the job posting.
+{SCORING_CRITERIA}
+Return only a JSON object: {{"score": <0-100>, "reason": "<short explanation>"}}"""
+BATCH_SCORING_INSTRUCTIONS = f"""You are a job matching assistant. Score how well the candidate fits each job posting.
+{SCORING_CRITERIA}
+Return only a JSON array with exactly one object per job posting, using the posting's "id": [{{"id": "0", "score": <0-100>, "reason": "<short explanation>"}}]"""
+
+def build_scoring_prompt(job, cv, prepared=None):
+    if not prompt_builder.compact():
+        return build_verbose_scoring_prompt(job, cv)
+    prepared = prepared or prompt_builder.PreparedCV(cv)
+    head = f"""{SCORING_INSTRUCTIONS}
+
+### Candidate
+{prepared.digest}
+
+### Job Posting
+Title: {job.get("title", "")}
+Company: {job.get("company", {}).get("display_name", "")}
+Location: {job.get("location", {}).get("display_name", "")}
+Category: {job.get("category", {}).get("label", "")}
+Description: """
+    # The description gets what is left of the prompt budget
+    budget = prompt_builder.description_budget(prompt_builder.SCORING_PROMPT_TOKEN_BUDGET - telemetry.estimate_tokens(head))
+    prompt = head + prompt_builder.normalize_description(job.get("description"), budget)
+    # The verbose prompt without its CV JSON, whose tokens were counted once per CV
+    verbose_tokens = telemetry.estimate_tokens(build_verbose_scoring_prompt(job, cv, cv_json="")) + prepared.verbose_tokens
+    return prompt_builder.record("job-scoring", prompt, verbose_tokens)
+
+def build_batch_scoring_prompt(jobs, cv, prepared=None):
+    if not prompt_builder.compact():
+        return build_verbose_batch_scoring_prompt(jobs, cv)
+    prepared = prepared or prompt_builder.PreparedCV(cv)
+    head = f"{BATCH_SCORING_INSTRUCTIONS}\n\n### Candidate\n{prepared.digest}\n\n### Job Postings (JSON array)\n"
+    job_blocks = [dict(build_job_block(job, str(index)), description="") for index, job in enumerate(jobs)]
+    # The batch budget left after the fixed fields is shared evenly between the descriptions
+    fixed = telemetry.estimate_tokens(head + json.dumps(job_blocks, ensure_ascii=False, separators=(",", ":")))
+    share = prompt_builder.description_budget((prompt_builder.SCORING_BATCH_TOKEN_BUDGET - fixed) // max(1, len(jobs)))
+    for block, job in zip(job_blocks, jobs):
+        block["description"] = prompt_builder.normalize_description(job.get("description"), share)
+    prompt = head + json.dumps(job_blocks, ensure_ascii=False, separators=(",", ":"))
+    verbose_tokens = telemetry.estimate_tokens(build_verbose_batch_scoring_prompt(jobs, cv, cv_json="")) + prepared.verbose_tokens
+    return prompt_builder.record("job-scoring", prompt, verbose_tokens)
+
+# Answers are constrained to these schemas on backends that support it, the others are parsed leniently
+# and repaired by llm_output
+SCORE_SCHEMA = {
+    "title": "job_score",
+    "type": "object",
+    "properties": {"score": {"type": "integer"}, "reason": {"type": "string"}},
+    "required": ["score", "reason"],
+}
+BATCH_SCORE_SCHEMA = {
+    "title": "job_scores",
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": {
+        "type": "object",
+        "properties": {"id": {"type": "string"}, "score": {"type": "integer"}, "reason": {"type": "string"}},
+        "required": ["id", "score", "reason"],
+    }}},
+    "required": ["results"],
+}
+
+def validate_score_item(item):
+    if not isinstance(item, dict):
+        return None
+    score, reason = item.get("score"), item.get("reason")
+    if isinstance(score, str):
+        # "85", "85.0" and "85%"
         try:
-            prompt = build_scoring_prompt(job, cv)
-            response = llm.invoke(prompt)
-
-            cleaned = re.sub(r"^```json|```$", "", response.content.strip(), flags=re.MULTILINE)
-            parsed = json.loads(cleaned)
-            score = parsed["score"]
-            reason = parsed["reason"]
-        except Exception as e:
-            score = 0
-            reason = f"Error: {str(e)}"
-            time.sleep(3)
-        job["score"] = json.dumps({"score": score, "reason": reason})
-        print(f"Job {job.get('id', 'N/A')} scored {score} reason: {reason}")
+            score = float(score.strip().rstrip("%"))
+        except ValueError:
+            return None
+        score = int(score) if score.is_integer() else score
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+        return None
+    if not isinstance(reason, str):
+        return None
+    return score, reason
+
+def validate_score(parsed):
+    validated = validate_score_item(parsed)
+    if validated is None:
+        raise ValueError("Expected an object with a score from 0 to 100 and a reason")
+    return validated
+
+def validate_batch(parsed):
+    # Returns the valid items by job id, malformed or unknown entries are dropped and their jobs re-queued
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results", parsed.get("jobs"))
+    if not isinstance(parsed, list):
+        raise ValueError("Batch output is not a list")
+    results = {}
+    for item in parsed:
+        validated = validate_score_item(item)
+        if validated is not None and "id" in item:
+            results[str(item["id"])] = validated
+    if parsed and not results:
+        raise ValueError("No valid score in the batch output")
+    return results
+
+def set_job_score(job, score, reason):
+    job["score"] = json.dumps({"score": score, "reason": reason})
+    logger.debug(f"Job {job.get('id', 'N/A')} scored {score} reason: {reason}")
+
+def raise_failures(results):
+    # Failed calls already left an "Error: ..." score, only an open circuit gets here and fails the invocation
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+async def score_job(job, cv, semaphore, max_retries, prepared=None):
+    try:
+        prompt = build_scoring_prompt(job, cv, prepared)
+        score, reason = await llm_output.ainvoke(llm, prompt, "job-scoring", SCORE_SCHEMA, validate_score, max_retries, semaphore)
+    except llm_client.CircuitOpenError:
+        raise
+    except Exception as e:
+        # No score rather than a score of 0, the job is reported under "unscored" instead of as a poor match
+        score = None
+        reason = f"Error: {str(e)}"
+    set_job_score(job, score, reason)
+
+async def score_batch(batch, cv, semaphore, max_retries, prepared=None):
+    # Returns the jobs of the batch that did not get a valid score
+    try:
+        prompt = build_batch_scoring_prompt(batch, cv, prepared)
+        results = await llm_output.ainvoke(llm, prompt, "job-scoring", BATCH_SCORE_SCHEMA, validate_batch, max_retries, semaphore)
+    except llm_client.CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.error(f"Batch of {len(batch)} jobs failed: {e}")
+        return batch
+    missing = []
+    for index, job in enumerate(batch):
+        if str(index) in results:
+            set_job_score(job, *results[str(index)])
+        else:
+            missing.append(job)
+    return missing
+
+async def score_jobs(jobs, cv, concurrency=SCORING_CONCURRENCY, max_retries=SCORING_MAX_RETRIES, semaphore=None):
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+    # The CV digest is built once and shared by every prompt of this CV
+    prepared = prompt_builder.PreparedCV(cv) if prompt_builder.compact() else None
+    raise_failures(await asyncio.gather(*[score_job(job, cv, semaphore, max_retries, prepared) for job in jobs], return_exceptions=True))
+    return jobs
+
+async def score_jobs_batched(jobs, cv, batch_size=SCORING_BATCH_SIZE, concurrency=SCORING_CONCURRENCY,
+                             max_retries=SCORING_MAX_RETRIES, max_attempts=SCORING_BATCH_MAX_ATTEMPTS, semaphore=None):
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+    batch_size = max(1, batch_size)
+    prepared = prompt_builder.PreparedCV(cv) if prompt_builder.compact() else None
+    pending = list(jobs)
+    for attempt in range(max_attempts):
+        if not pending:
+            break
+        if attempt:
+            logger.warning(f"Re-queueing {len(pending)} jobs with missing or malformed scores")
+            telemetry.count("retries.scoring_requeue", len(pending))
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        missing = await asyncio.gather(*[score_batch(batch, cv, semaphore, max_retries, prepared) for batch in batches], return_exceptions=True)
+        raise_failures(missing)
+        pending = [job for batch_missing in missing for job in batch_missing]
+    for job in pending:
+        set_job_score(job, None, "Error: no valid score returned for this job")
+    return jobs
+
+async def score_groups(groups, batch_size, concurrency):
+    # All CVs of one invocation share the concurrency limit, the rate limit is shared per model by llm_client
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    if batch_size > 1:
+        engines = [score_jobs_batched(jobs, cv, batch_size=batch_size, semaphore=semaphore) for cv, jobs in groups]
+    else:
+        engines = [score_jobs(jobs, cv, semaphore=semaphore) for cv, jobs in groups]
+    raise_failures(await asyncio.gather(*engines, return_exceptions=True))
+
+def group_jobs_by_cv(event, jobs):
+    # Jobs of several CVs can be scored in one invocation, each job then names its CV in "cv_index"
+    if "cvs" not in event:
+        return [(event.get("cv", {}), jobs)]
+    groups = {}
+    for job in jobs:
+        groups.setdefault(str(job.get("cv_index")), []).append(job)
+    return [(event["cvs"][index], group) for index, group in groups.items()]
+
+def score_cache_key(job, cv):
+    return content_hash(cv, job.get("id", ""), content_hash(job.get("description", "")), MODEL_NAME, PROMPT_VERSION)
+
+def apply_cached_scores(jobs, cv):
+    # Returns the jobs that still need an LLM score
+    uncached = []
+    for job in jobs:
+        cached = score_cache.get(score_cache_key(job, cv))
+        if cached is None:
+            uncached.append(job)
+        else:
+            job["score"] = json.dumps(cached)
+    return uncached
+
+def cache_scores(jobs, cv):
+    for job in jobs:
+        score_data = json.loads(job.get("score", "{}"))
+        # Failed calls are recorded with an "Error: ..." reason and must be retried next time
+        if "score" in score_data and not str(score_data.get("reason", "")).startswith("Error:"):
+            score_cache.set(score_cache_key(job, cv), score_data)
+
+def split_unscored(jobs):
+    # Jobs whose call or repair failed are left out of the results and listed with their error instead
+    scored, unscored = [], []
+    for job in jobs:
+        score_data = json.loads(job.get("score", "{}"))
+        if score_data.get("score") is None:
+            unscored.append({"id": job.get("id"), "cv_index": job.get("cv_index"), "reason": score_data.get("reason", "")})
+        else:
+            scored.append(job)
+    return scored, unscored
+
+def run(event):
+    all_jobs = load_records(event, "jobs")
+    groups = [(cv, apply_cached_scores(jobs, cv)) for cv, jobs in group_jobs_by_cv(event, all_jobs)]
+    uncached = sum(len(jobs) for _, jobs in groups)
+    logger.info(f"{len(all_jobs) - uncached} of {len(all_jobs)} jobs served from the score cache")
+    batch_size = int(event.get("batch_size", SCORING_BATCH_SIZE))
+    concurrency = int(event.get("concurrency", SCORING_CONCURRENCY))
+    if "rate_per_second" in event:
+        # This worker's share of the provider quota, set by the orchestrator
+        llm_client.set_rate(llm, float(event["rate_per_second"]))
+    with event_loop_lock:
+        event_loop.run_until_complete(score_groups(groups, batch_size, concurrency))
+    for cv, jobs in groups:
+        cache_scores(jobs, cv)
+    score_cache.evict()
+    scored_jobs, unscored = split_unscored(all_jobs)
+    if unscored:
+        logger.warning(f"{len(unscored)} of {len(all_jobs)} jobs could not be scored and are left out")
+        telemetry.count("scoring.unscored", len(unscored))
+    if event.get("output_ref"):
+        return {
+            "jobs_ref": artifacts.put(scored_jobs, "job-scoring-out"),
+            "unscored": unscored,
+            "cache": score_cache.stats(),
+            "llm": llm_client.stats(),
+            "output": llm_output.stats(),
+            "artifacts": artifacts.take_hops()
+        }
+    return {
+        "jobs": scored_jobs,
+        "unscored": unscored,
+        "cache": score_cache.stats(),
+        "llm": llm_client.stats(),
+        "output": llm_output.stats()
+    }
+
+@telemetry.traced_handler("job-scoring")
+def lambda_handler(event, context):
     return {
             "statusCode": 200,
-            "body": json.dumps({
-                "jobs": jobs
-            })
+            "body": json.dumps(run(event))
         }
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import re
+import zlib
+import time
+import numpy as np
+from cache_store import content_hash
+from telemetry import logger
+
+# MinHash signature length and LSH banding, 16 bands of 4 rows catch pairs from a Jaccard similarity of about 0.5
+DEDUP_NUM_PERM = int(os.environ.get("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.environ.get("DEDUP_BANDS", "16"))
+# Estimated Jaccard similarity of the word shingles from which two postings are the same job
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.7"))
+DEDUP_SHINGLE_SIZE = int(os.environ.get("DEDUP_SHINGLE_SIZE", "3"))
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+MERSENNE_PRIME = (1 << 61) - 1
+HASH_MASK = (1 << 32) - 1
+SHINGLE_MULTIPLIER = 1000003
+
+def normalize_text(text):
+    return " ".join(WORD_PATTERN.findall(TAG_PATTERN.sub(" ", str(text or "")).lower()))
+
+def job_text(job):
+    company = job.get("company")
+    company = company.get("display_name", "") if isinstance(company, dict) else company
+    return normalize_text(f"{job.get('title', '')} {company or ''} {job.get('description', '')}")
+
+def job_key(job):
+    job_id = job.get("id")
+    return str(job_id) if job_id is not None else content_hash(job_text(job))[:24]
+
+class JobDeduper:
+    # Greedy clustering: a posting joins the first earlier canonical posting it is a near-duplicate of,
+    # otherwise it becomes canonical itself. Only signatures, band keys and ids are kept, never the texts,
+    # so memory grows by about 2 KB per distinct posting and postings can be fed in any number of batches.
+    def __init__(self, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS, threshold=DEDUP_THRESHOLD, shingle_size=DEDUP_SHINGLE_SIZE):
+        self.bands = max(1, min(bands, num_perm))
+        self.rows = max(1, num_perm // self.bands)
+        self.num_perm = self.bands * self.rows
+        self.threshold = threshold
+        self.shingle_size = max(1, shingle_size)
+        rng = np.random.default_rng(1)
+        self.a = rng.integers(1, MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        self.band_multipliers = rng.integers(1, MERSENNE_PRIME, self.rows, dtype=np.uint64) | np.uint64(1)
+        # Band key -> cluster index, or a list of them once several clusters share the key
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = np.zeros((1024, self.num_perm), dtype=np.uint32)
+        self.canonical_keys = []
+        # Job id -> index of its canonical posting, also answers exact id repeats without hashing
+        self.cluster_by_key = {}
+        self.stats = {"jobs": 0, "exact": 0, "near": 0}
+
+    def signature(self, text):
+        words = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in text.split()), dtype=np.uint64)
+        if not len(words):
+            return None
+        # Shingle hashes are combined from the word hashes, a text shorter than a shingle is one shingle
+        size = min(self.shingle_size, len(words))
+        hashes = np.zeros(len(words) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * np.uint64(SHINGLE_MULTIPLIER) + words[offset:offset + len(hashes)]
+        hashes = np.unique(hashes % np.uint64(MERSENNE_PRIME))
+        # (a * x + b) mod p, reduced to 32 bits, with uint64 wrap-around standing in for the products
+        permuted = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % np.uint64(MERSENNE_PRIME)
+        return (permuted & np.uint64(HASH_MASK)).min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature):
+        # One integer per band, folded from its rows
+        rows = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        return (rows * self.band_multipliers).sum(axis=1).tolist()
+
+    def add_canonical(self, key, signature):
+        cluster = len(self.canonical_keys)
+        self.canonical_keys.append(key)
+        if signature is not None:
+            if cluster == len(self.signatures):
+                self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+            self.signatures[cluster] = signature
+            for bucket, band_key in zip(self.buckets, self.band_keys(signature)):
+                members = bucket.get(band_key)
+                if members is None:
+                    bucket[band_key] = cluster
+                elif isinstance(members, list):
+                    members.append(cluster)
+                else:
+                    bucket[band_key] = [members, cluster]
+        return cluster
+
+    def cluster_of(self, job):
+        # Index of the cluster the posting belongs to
+        key = job_key(job)
+        self.stats["jobs"] += 1
+        cluster = self.cluster_by_key.get(key)
+        if cluster is not None:
+            self.stats["exact"] += 1
+            return cluster
+        signature = self.signature(job_text(job))
+        if signature is not None:
+            candidates = set()
+            for bucket, band_key in zip(self.buckets, self.band_keys(signature)):
+                members = bucket.get(band_key)
+                if isinstance(members, list):
+                    candidates.update(members)
+                elif members is not None:
+                    candidates.add(members)
+            for candidate in sorted(candidates):
+                if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                    self.stats["near"] += 1
+                    self.cluster_by_key[key] = candidate
+                    return candidate
+        cluster = self.add_canonical(key, signature)
+        self.cluster_by_key[key] = cluster
+        return cluster
+
+def dedup_jobs(jobs, deduper=None, representatives=None):
+    # Returns (jobs to score, {key of a scored job: [its duplicates]}). The first posting of a cluster is scored.
+    # A shared deduper clusters consistently across calls, representatives carries the scored posting per cluster along.
+    start = time.perf_counter()
+    deduper = deduper or JobDeduper()
+    representatives = {} if representatives is None else representatives
+    canonical, duplicates = [], {}
+    for job in jobs:
+        cluster = deduper.cluster_of(job)
+        representative = representatives.get(cluster)
+        if representative is None:
+            representatives[cluster] = job_key(job)
+            canonical.append(job)
+        elif representative != job_key(job):
+            duplicates.setdefault(representative, []).append(job)
+    skipped = sum(map(len, duplicates.values()))
+    logger.info(f"Dedup kept {len(canonical)} of {len(jobs)} jobs, {skipped} duplicates in "
+                f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    return canonical, duplicates
+
+def propagate_scores(scored_jobs, duplicates, scores=None):
+    # Duplicates get the score of their scored posting. Duplicates of a posting that was not scored
+    # (e.g. dropped by the prefilter) are dropped as well. scores keeps scores across calls.
+    scores = {} if scores is None else scores
+    for job in scored_jobs:
+        scores[job_key(job)] = job.get("score")
+    propagated = list(scored_jobs)
+    for key, copies in duplicates.items():
+        if key in scores:
+            propagated.extend(dict(job, score=scores[key], duplicate_of=key) for job in copies)
+    return propagated
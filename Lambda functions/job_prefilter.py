@@ -0,0 +1,107 @@
+import os
+import re
+import zlib
+import time
+import functools
+import numpy as np
+from collections import Counter
+from telemetry import logger
+
+PREFILTER_TOP_K = int(os.environ.get("PREFILTER_TOP_K", "50"))  # 0 keeps every job above the threshold
+PREFILTER_THRESHOLD = float(os.environ.get("PREFILTER_THRESHOLD", "0.02"))
+PREFILTER_FEATURES = int(os.environ.get("PREFILTER_FEATURES", str(2 ** 18)))
+# Hashed tokens kept per container, least recently used ones are dropped beyond this
+PREFILTER_TOKEN_CACHE_SIZE = int(os.environ.get("PREFILTER_TOKEN_CACHE_SIZE", "100000"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+CV_FIELD_PATTERN = re.compile(r"skill|experience|title|role|position|project", re.IGNORECASE)
+
+@functools.lru_cache(maxsize=PREFILTER_TOKEN_CACHE_SIZE)
+def feature_id(token, n_features):
+    # Bare numbers (years, durations) carry no signal about the role
+    return -1 if token.isdigit() else zlib.crc32(token.encode("utf-8")) % n_features
+
+class HashingTfidfVectorizer:
+    # Hashed bag-of-words. IDF comes from the jobs ranked in each call, nothing is kept between calls,
+    # so the same jobs rank the same on every warm invocation
+    def __init__(self, n_features=PREFILTER_FEATURES):
+        self.n_features = n_features
+
+    def term_counts(self, texts):
+        # Flat (document, feature, count) arrays for the whole corpus
+        doc_ids, feature_ids, counts = [], [], []
+        for doc, text in enumerate(texts):
+            token_counts = Counter(TOKEN_PATTERN.findall(text.lower()))
+            features = [feature_id(token, self.n_features) for token in token_counts]
+            doc_ids.extend([doc] * len(features))
+            feature_ids.extend(features)
+            counts.extend(token_counts.values())
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        feature_ids = np.asarray(feature_ids, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.float64)
+        known = feature_ids >= 0
+        return doc_ids[known], feature_ids[known], counts[known]
+
+    def fit(self, term_counts, n_documents):
+        # Smoothed IDF of every feature over this corpus
+        _, features, _ = term_counts
+        document_frequency = np.bincount(features, minlength=self.n_features)
+        return np.log((1 + n_documents) / (1 + document_frequency)) + 1
+
+    def transform_one(self, text, idf):
+        _, features, counts = self.term_counts([text])
+        vector = np.zeros(self.n_features, dtype=np.float64)
+        vector[features] = (1 + np.log(counts)) * idf[features]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def similarities(self, query, term_counts, n_documents, idf):
+        docs, features, counts = term_counts
+        weights = (1 + np.log(counts)) * idf[features]
+        norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_documents))
+        dots = np.bincount(docs, weights=weights * query[features], minlength=n_documents)
+        return np.divide(dots, norms, out=np.zeros(n_documents), where=norms > 0)
+
+vectorizer = HashingTfidfVectorizer()
+
+def collect_text(value, keep_all=False):
+    if isinstance(value, dict):
+        return " ".join(
+            collect_text(item, keep_all or bool(CV_FIELD_PATTERN.search(str(key))))
+            for key, item in value.items()
+        )
+    if isinstance(value, list):
+        return " ".join(collect_text(item, keep_all) for item in value)
+    return str(value) if keep_all and value is not None else ""
+
+def cv_to_text(structured_cv):
+    if isinstance(structured_cv, str):
+        return structured_cv
+    text = collect_text(structured_cv)
+    return text if text.strip() else collect_text(structured_cv, keep_all=True)
+
+def job_to_text(job):
+    title = job.get("title", "")
+    category = job.get("category", {}).get("label", "")
+    # Title is repeated so it weighs more than a long description
+    return f"{title} {title} {category} {job.get('description', '')}"
+
+def rank_jobs(jobs, structured_cv):
+    term_counts = vectorizer.term_counts([job_to_text(job) for job in jobs])
+    idf = vectorizer.fit(term_counts, len(jobs))
+    query = vectorizer.transform_one(cv_to_text(structured_cv), idf)
+    return vectorizer.similarities(query, term_counts, len(jobs), idf)
+
+def prefilter_jobs(jobs, structured_cv, top_k=PREFILTER_TOP_K, threshold=PREFILTER_THRESHOLD):
+    if not jobs:
+        return jobs
+    start = time.perf_counter()
+    similarities = rank_jobs(jobs, structured_cv)
+    ranked = np.argsort(-similarities, kind="stable")
+    ranked = ranked[similarities[ranked] >= threshold]
+    if top_k > 0:
+        ranked = ranked[:top_k]
+    # Keep the original job order for the selected jobs
+    selected = [jobs[i] for i in np.sort(ranked)]
+    logger.info(f"Prefilter kept {len(selected)} of {len(jobs)} jobs in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return selected
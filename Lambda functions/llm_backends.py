@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import llm_client
+import telemetry
+from telemetry import logger
+
+# Which backends a stage may use: LLM_BACKENDS_<STAGE> (e.g. LLM_BACKENDS_EXTRACT_JOB_KEYWORDS=local,gemini),
+# "auto" allows every configured backend of a large enough tier. Among the allowed ones each call goes to the
+# cheapest backend whose expected latency fits the stage's budget (LLM_LATENCY_BUDGET_<STAGE>, seconds).
+STAGE_PROFILES = {
+    # tier: smallest model tier with acceptable quality, output_tokens: typical answer length for the cost estimate
+    "parse-cv": {"tier": "large", "latency_budget": 30.0, "output_tokens": 600},
+    "extract-job-keywords": {"tier": "small", "latency_budget": 15.0, "output_tokens": 20},
+    "job-scoring": {"tier": "large", "latency_budget": 10.0, "output_tokens": 60},
+    "agent": {"tier": "large", "latency_budget": 20.0, "output_tokens": 300},
+}
+TIERS = {"small": 0, "large": 1}
+# Observed latencies replace a backend's latency prior once a stage has this many samples
+LLM_ROUTING_MIN_SAMPLES = int(os.environ.get("LLM_ROUTING_MIN_SAMPLES", "5"))
+
+# Reasoning models served locally (deepseek-r1) answer with their chain of thought first,
+# stripped here from local answers and by llm_output from every parsed answer
+THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+def env_name(stage):
+    return stage.upper().replace("-", "_")
+
+def profile(stage):
+    return STAGE_PROFILES.get(stage, STAGE_PROFILES["job-scoring"])
+
+class Backend:
+    # Defaults per backend, each can be overridden with <PREFIX>_MODEL, _TIER, _PRICE_INPUT, _PRICE_OUTPUT
+    # (USD per million tokens), _LATENCY (expected seconds per call before any call was measured) and
+    # _STRUCTURED_OUTPUT (false for servers without schema-constrained output)
+    name = None
+    prefix = None
+    # The setting that makes the backend available
+    setting = None
+    model = None
+    tier = "large"
+    price_input = 0.0
+    price_output = 0.0
+    latency = 1.0
+    structured_output = True
+
+    def __init__(self):
+        self.model = os.environ.get(f"{self.prefix}_MODEL", self.model)
+        self.tier = os.environ.get(f"{self.prefix}_TIER", self.tier)
+        self.price_input = float(os.environ.get(f"{self.prefix}_PRICE_INPUT", self.price_input))
+        self.price_output = float(os.environ.get(f"{self.prefix}_PRICE_OUTPUT", self.price_output))
+        self.latency = float(os.environ.get(f"{self.prefix}_LATENCY", self.latency))
+        self.structured_output = os.environ.get(f"{self.prefix}_STRUCTURED_OUTPUT", str(self.structured_output)).lower() == "true"
+
+    def configured(self):
+        raise NotImplementedError
+
+    def build(self, **options):
+        # A LangChain chat model, provider retries are off (max_retries=0) since llm_client retries
+        raise NotImplementedError
+
+    def constrain(self, llm, schema):
+        # The chat model answering in the JSON schema through LangChain's structured output
+        return StructuredChatModel(llm, schema)
+
+    def cost(self, prompt_tokens, output_tokens):
+        return (prompt_tokens * self.price_input + output_tokens * self.price_output) / 1e6
+
+class GeminiBackend(Backend):
+    name = "gemini"
+    prefix = "GEMINI"
+    setting = "GEMINI_API_KEY"
+    model = "gemini-2.0-flash-exp"
+    price_input = 0.10
+    price_output = 0.40
+    latency = 1.5
+
+    def api_key(self):
+        # jobAgent.py reads GEMINI_API from its .env file
+        return os.environ.get("GEMINI_API_KEY") or os.environ.get("GEMINI_API")
+
+    def configured(self):
+        return bool(self.api_key())
+
+    def build(self, **options):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=self.model, google_api_key=self.api_key(), max_retries=0,
+                                      timeout=llm_client.LLM_TIMEOUT, **options)
+
+class OpenAIBackend(Backend):
+    # Any OpenAI-compatible remote API (OpenAI, DeepSeek, Fireworks, ...)
+    name = "openai"
+    prefix = "OPENAI"
+    setting = "OPENAI_API_KEY"
+    model = "gpt-4o-mini"
+    price_input = 0.15
+    price_output = 0.60
+    latency = 2.0
+
+    def configured(self):
+        return bool(os.environ.get("OPENAI_API_KEY"))
+
+    def build(self, **options):
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=self.model, api_key=os.environ["OPENAI_API_KEY"], base_url=os.environ.get("OPENAI_BASE_URL"),
+                          max_retries=0, timeout=llm_client.LLM_TIMEOUT, **options)
+
+class LocalBackend(Backend):
+    # A local OpenAI-compatible server such as Ollama (LOCAL_LLM_BASE_URL=http://localhost:11434/v1), free but
+    # small, so by default it only serves small-tier stages
+    name = "local"
+    prefix = "LOCAL_LLM"
+    setting = "LOCAL_LLM_BASE_URL"
+    model = "deepseek-r1:1.5b"
+    tier = "small"
+    latency = 3.0
+
+    def __init__(self):
+        super().__init__()
+        self.concurrency = int(os.environ.get("LOCAL_LLM_CONCURRENCY", "4"))
+
+    def configured(self):
+        return bool(os.environ.get("LOCAL_LLM_BASE_URL"))
+
+    def build(self, queued=True, **options):
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model=self.model, base_url=os.environ["LOCAL_LLM_BASE_URL"],
+                         api_key=os.environ.get("LOCAL_LLM_API_KEY", "ollama"), max_retries=0,
+                         timeout=llm_client.LLM_TIMEOUT, **options)
+        return self.wrap(llm) if queued else llm
+
+    def wrap(self, llm):
+        return QueuedChatModel(llm, self.concurrency)
+
+    def constrain(self, llm, schema):
+        # The server gets the schema as an OpenAI response_format, requests stay queued
+        if isinstance(llm, QueuedChatModel):
+            return self.wrap(StructuredChatModel(llm.llm, schema))
+        return StructuredChatModel(llm, schema)
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    OpenAIBackend.name: OpenAIBackend,
+    LocalBackend.name: LocalBackend,
+}
+
+class QueuedChatModel:
+    # Requests from every thread and event loop share one queue with at most `concurrency` of them in flight,
+    # the rest wait here instead of timing out at a local server with few parallel slots
+    def __init__(self, llm, concurrency):
+        self.llm = llm
+        self.model = telemetry.model_name(llm)
+        self.concurrency = max(1, concurrency)
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def submit(self, prompt):
+        future = Future()
+        with self.lock:
+            # Started lazily, and again in a forked worker process, which has none of the parent's threads
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            self.executor.submit(self.send, prompt, future)
+        return future
+
+    def send(self, prompt, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            response = self.llm.invoke(prompt)
+            if isinstance(getattr(response, "content", None), str):
+                response.content = THINK_PATTERN.sub("", response.content).strip()
+            future.set_result(response)
+        except Exception as e:
+            future.set_exception(e)
+
+    def invoke(self, prompt):
+        return self.submit(prompt).result()
+
+    async def ainvoke(self, prompt):
+        return await asyncio.wrap_future(self.submit(prompt))
+
+class StructuredChatModel:
+    # Callers still get a message: its content is the structured answer as JSON, or the raw text when
+    # LangChain could not parse it, which llm_output then parses leniently or repairs
+    def __init__(self, llm, schema):
+        self.model = telemetry.model_name(llm)
+        self.runnable = llm.with_structured_output(schema, include_raw=True)
+
+    def message(self, result):
+        raw = result["raw"]
+        if result.get("parsed") is not None:
+            raw.content = json.dumps(result["parsed"])
+        elif not raw.content and getattr(raw, "invalid_tool_calls", None):
+            raw.content = raw.invalid_tool_calls[0].get("args") or ""
+        return raw
+
+    def invoke(self, prompt):
+        return self.message(self.runnable.invoke(prompt))
+
+    async def ainvoke(self, prompt):
+        return self.message(await self.runnable.ainvoke(prompt))
+
+class Route:
+    # The backends a stage may use. llm_client asks for its candidates per call, best first, and falls back
+    # to the next one while a backend's circuit is open or its retries are used up.
+    def __init__(self, stage, backends, models=None):
+        if not backends:
+            raise ValueError(f"No LLM backend configured for {stage}, set GEMINI_API_KEY, OPENAI_API_KEY or LOCAL_LLM_BASE_URL")
+        self.stage = stage
+        self.backends = backends
+        self.latency_budget = float(os.environ.get(f"LLM_LATENCY_BUDGET_{env_name(stage)}", profile(stage)["latency_budget"]))
+        self.output_tokens = profile(stage)["output_tokens"]
+        # Chat models are built on first use, prebuilt ones (benchmarks) can be passed by backend name and
+        # are used as they are, without a schema
+        self.models = dict(models or {})
+        self.prebuilt = set(self.models)
+        self.constrained = {}
+        self.lock = threading.Lock()
+        # Cache keys and logs name the route by all of its models
+        self.model = "+".join(backend.model for backend in backends)
+
+    def chat_model(self, backend, schema=None):
+        with self.lock:
+            if backend.name not in self.models:
+                self.models[backend.name] = backend.build()
+            llm = self.models[backend.name]
+            if schema is None or not backend.structured_output or backend.name in self.prebuilt:
+                return llm
+            key = (backend.name, schema["title"])
+            if key not in self.constrained:
+                self.constrained[key] = backend.constrain(llm, schema)
+            return self.constrained[key]
+
+    def expected_latency(self, backend):
+        guard = llm_client.guards.get(backend.model)
+        samples = []
+        if guard:
+            with guard.lock:
+                samples = sorted(guard.latencies.get(self.stage, ()))
+        if len(samples) < LLM_ROUTING_MIN_SAMPLES:
+            return backend.latency
+        return samples[len(samples) // 2]
+
+    def rank(self, prompt):
+        # Cheapest backend within the latency budget first, then the rest by expected latency.
+        # Backends with an open circuit go last, they are only tried if every other one fails.
+        prompt_tokens = telemetry.estimate_tokens(prompt)
+        scored = []
+        for backend in self.backends:
+            guard = llm_client.guards.get(backend.model)
+            latency = self.expected_latency(backend)
+            within_budget = latency <= self.latency_budget
+            cost = backend.cost(prompt_tokens, self.output_tokens) if within_budget else latency
+            scored.append((bool(guard and guard.breaker.rejecting()), not within_budget, cost, latency, backend))
+        return [backend for *_, backend in sorted(scored, key=lambda item: item[:4])]
+
+    def candidates(self, prompt, schema=None):
+        return [self.chat_model(backend, schema) for backend in self.rank(prompt)]
+
+def allowed_backends(stage):
+    setting = os.environ.get(f"LLM_BACKENDS_{env_name(stage)}", "auto").strip().lower()
+    if setting != "auto":
+        # Listed backends are used even below the stage's tier
+        names = [name.strip() for name in setting.split(",") if name.strip()]
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise ValueError(f"Unknown LLM backends for {stage}: {unknown}, known: {list(BACKENDS)}")
+        backends = [BACKENDS[name]() for name in names]
+        missing = [backend for backend in backends if not backend.configured()]
+        if missing:
+            raise ValueError(f"LLM backends for {stage} are not configured: "
+                             f"{', '.join(f'{backend.name} (set {backend.setting})' for backend in missing)}")
+        return backends
+    return eligible(stage, [backend_class() for backend_class in BACKENDS.values() if backend_class().configured()])
+
+def eligible(stage, backends):
+    # Backends whose tier is large enough for the stage
+    tier = TIERS[profile(stage)["tier"]]
+    return [backend for backend in backends if TIERS.get(backend.tier, 0) >= tier]
+
+def route(stage):
+    backends = allowed_backends(stage)
+    logger.info(f"LLM backends for {stage}: {[f'{backend.name}:{backend.model}' for backend in backends]}")
+    return Route(stage, backends)
+
+def chat_model(stage, **options):
+    # One plain chat model for callers that need the LangChain object itself (the browser_use agent),
+    # the best ranked backend without batching or fallback
+    selected = Route(stage, allowed_backends(stage)).rank("")[0]
+    logger.info(f"LLM backend for {stage}: {selected.name}:{selected.model}")
+    if isinstance(selected, LocalBackend):
+        return selected, selected.build(queued=False, **options)
+    return selected, selected.build(**options)
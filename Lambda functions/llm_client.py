@@ -0,0 +1,373 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import telemetry
+from telemetry import logger
+
+# Shared by every stage that calls an LLM: one token bucket, circuit breaker and latency history per model,
+# so all calls to a model in this process draw on the same quota and fail fast together
+
+# Token bucket per model, 0 disables rate limiting
+LLM_RATE_PER_SECOND = float(os.environ.get("LLM_RATE_PER_SECOND", "4"))
+LLM_BURST = int(os.environ.get("LLM_BURST", "4"))
+# Retries of rate-limit and transient errors, exponential backoff with full jitter
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "30"))
+# Request timeout passed to the provider client, which leaves retrying to this module
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+# A request still running after this quantile of the stage's recent latencies is sent a second time,
+# the first answer wins. 0 disables hedging.
+LLM_HEDGE_QUANTILE = float(os.environ.get("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "2.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MAX_RATIO = float(os.environ.get("LLM_HEDGE_MAX_RATIO", "0.05"))  # hedges per call at most
+# Consecutive transient failures that open the circuit, 0 disables the breaker. While open, calls raise
+# CircuitOpenError right away. After the cooldown one probe call decides whether it closes again.
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "10"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_STATUS_PATTERN = re.compile(r"\b(?:408|429|500|502|503|504)\b")
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "TooManyRequests", "RateLimitError",
+}
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class TokenBucket:
+    # Callers reserve a token and wait the returned delay themselves, so sync and async callers can share one bucket
+    def __init__(self, rate, capacity):
+        self.lock = threading.Lock()
+        self.configure(rate, capacity)
+
+    def configure(self, rate, capacity):
+        with self.lock:
+            self.rate = rate
+            self.capacity = max(1, capacity)
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # Takes a token, possibly ahead of time, and returns the seconds until it may be used
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_acquire(self):
+        # Takes a token only if one is available right now
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class CircuitBreaker:
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def check(self, model):
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+                self.probing = False
+            if self.state == "half-open" and not self.probing:
+                self.probing = True
+                return
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"Circuit for {model} is open after {self.consecutive_failures} failures, "
+                               f"retry in {retry_in:.0f}s")
+
+    def rejecting(self):
+        # True while calls would be rejected without a probe
+        with self.lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.cooldown
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        # Returns True when this failure opened the circuit
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == "half-open" or (self.failures and self.consecutive_failures >= self.failures):
+                opened = self.state != "open"
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+                return opened
+            return False
+
+class ModelGuard:
+    def __init__(self, model):
+        self.model = model
+        self.bucket = TokenBucket(LLM_RATE_PER_SECOND, LLM_BURST)
+        self.breaker = CircuitBreaker()
+        self.lock = threading.Lock()
+        # Latencies of successful requests per stage, prompts of different stages take very different times
+        self.latencies = {}
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                      "rejected": 0, "opened": 0, "rate_limit_wait_seconds": 0.0}
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+        telemetry.count(f"llm.{name}", value)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.latencies.setdefault(stage, deque(maxlen=200)).append(seconds)
+
+    def hedge_delay(self, stage):
+        # None while hedging is off or the stage has too few samples to know its tail
+        if LLM_HEDGE_QUANTILE <= 0:
+            return None
+        with self.lock:
+            samples = sorted(self.latencies.get(stage, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(LLM_HEDGE_MIN_DELAY, samples[min(len(samples) - 1, int(LLM_HEDGE_QUANTILE * len(samples)))])
+
+    def may_hedge(self):
+        with self.lock:
+            if self.stats["hedges"] >= LLM_HEDGE_MAX_RATIO * self.stats["calls"]:
+                return False
+        return self.bucket.try_acquire()
+
+    def admit(self):
+        # Fails fast while the circuit is open, otherwise returns the seconds to wait for a rate token
+        try:
+            self.breaker.check(self.model)
+        except CircuitOpenError:
+            self.add("rejected")
+            raise
+        delay = self.bucket.reserve()
+        self.add("calls")
+        if delay:
+            self.add("rate_limit_wait_seconds", delay)
+        return delay
+
+    def record(self, error):
+        # Only transient errors count against the model, any other answer shows the provider is up
+        if error is None or not is_retryable(error):
+            self.breaker.record_success()
+        else:
+            self.add("failures")
+            if self.breaker.record_failure():
+                self.add("opened")
+                logger.error(f"Circuit for {self.model} opened after {self.breaker.consecutive_failures} failures: {error}")
+
+guards = {}
+guards_lock = threading.Lock()
+# Runs sync requests that may be hedged, so the caller can stop waiting for a slow one. Recreated in a forked
+# worker process, which has none of the parent's threads.
+hedge_executor = None
+hedge_executor_pid = None
+
+def guard_for(llm):
+    model = telemetry.model_name(llm)
+    with guards_lock:
+        if model not in guards:
+            guards[model] = ModelGuard(model)
+        return guards[model]
+
+def candidates(llm, prompt="", schema=None):
+    # A route from llm_backends lists its chat models best first, constrained to the JSON schema where the
+    # backend supports it. A plain chat model is its only candidate.
+    return llm.candidates(prompt, schema) if hasattr(llm, "candidates") else [llm]
+
+def set_rate(llm, rate_per_second, burst=LLM_BURST):
+    for model in candidates(llm):
+        guard_for(model).bucket.configure(rate_per_second, burst)
+
+def stats():
+    with guards_lock:
+        current = list(guards.values())
+    return {guard.model: dict(guard.stats, state=guard.breaker.state, rate_per_second=guard.bucket.rate) for guard in current}
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+        return True
+    # Provider errors that only reach us as text still start with or mention their status code
+    message = str(error).lower()
+    return bool(RETRYABLE_STATUS_PATTERN.search(message)) or "quota" in message or "rate limit" in message
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+def timed_request(llm, prompt, stage, guard):
+    start = time.perf_counter()
+    response = telemetry.traced_invoke(llm, prompt, stage)
+    guard.observe(stage, time.perf_counter() - start)
+    return response
+
+async def atimed_request(llm, prompt, stage, guard):
+    start = time.perf_counter()
+    response = await telemetry.traced_ainvoke(llm, prompt, stage)
+    guard.observe(stage, time.perf_counter() - start)
+    return response
+
+def hedged_request(llm, prompt, stage, guard):
+    global hedge_executor, hedge_executor_pid
+    delay = guard.hedge_delay(stage)
+    if delay is None:
+        return timed_request(llm, prompt, stage, guard)
+    with guards_lock:
+        if hedge_executor_pid != os.getpid():
+            hedge_executor = ThreadPoolExecutor(max_workers=8)
+            hedge_executor_pid = os.getpid()
+    submit = lambda: hedge_executor.submit(contextvars.copy_context().run, timed_request, llm, prompt, stage, guard)
+    primary = submit()
+    done, _ = wait([primary], timeout=delay)
+    if done or not guard.may_hedge():
+        return primary.result()
+    guard.add("hedges")
+    pending = {primary, submit()}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The losing request cannot be cancelled once running, its answer is dropped
+                if future is not primary:
+                    guard.add("hedge_wins")
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+async def ahedged_request(llm, prompt, stage, guard):
+    delay = guard.hedge_delay(stage)
+    if delay is None:
+        return await atimed_request(llm, prompt, stage, guard)
+    primary = asyncio.ensure_future(atimed_request(llm, prompt, stage, guard))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not guard.may_hedge():
+        return await primary
+    guard.add("hedges")
+    pending = {primary, asyncio.ensure_future(atimed_request(llm, prompt, stage, guard))}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        guard.add("hedge_wins")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+def may_fall_back(error):
+    # The next backend is tried while this one's circuit is open or its retries are used up
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+def invoke(llm, prompt, stage, max_retries=LLM_MAX_RETRIES, schema=None):
+    models = candidates(llm, prompt, schema)
+    for index, model in enumerate(models):
+        try:
+            return invoke_model(model, prompt, stage, max_retries)
+        except Exception as e:
+            if index == len(models) - 1 or not may_fall_back(e):
+                raise
+            logger.warning(f"Falling back from {telemetry.model_name(model)} in {stage}: {e}")
+            telemetry.count("llm.fallbacks")
+
+async def ainvoke(llm, prompt, stage, max_retries=LLM_MAX_RETRIES, semaphore=None, schema=None):
+    models = candidates(llm, prompt, schema)
+    for index, model in enumerate(models):
+        try:
+            return await ainvoke_model(model, prompt, stage, max_retries, semaphore)
+        except Exception as e:
+            if index == len(models) - 1 or not may_fall_back(e):
+                raise
+            logger.warning(f"Falling back from {telemetry.model_name(model)} in {stage}: {e}")
+            telemetry.count("llm.fallbacks")
+
+def invoke_model(llm, prompt, stage, max_retries):
+    guard = guard_for(llm)
+    attempt = 0
+    while True:
+        time.sleep(guard.admit())
+        try:
+            response = hedged_request(llm, prompt, stage, guard)
+            guard.record(None)
+            return response
+        except Exception as e:
+            guard.record(e)
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Retryable error from {guard.model} in {stage} ({e}), retrying in {delay:.1f}s")
+            guard.add("retries")
+            telemetry.count("retries.llm")
+            attempt += 1
+            time.sleep(delay)
+
+async def ainvoke_model(llm, prompt, stage, max_retries, semaphore):
+    # semaphore caps the caller's requests in flight, it is not held during backoff
+    guard = guard_for(llm)
+    attempt = 0
+    while True:
+        try:
+            if semaphore is None:
+                await asyncio.sleep(guard.admit())
+                response = await ahedged_request(llm, prompt, stage, guard)
+            else:
+                async with semaphore:
+                    await asyncio.sleep(guard.admit())
+                    response = await ahedged_request(llm, prompt, stage, guard)
+            guard.record(None)
+            return response
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            guard.record(e)
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Retryable error from {guard.model} in {stage} ({e}), retrying in {delay:.1f}s")
+            guard.add("retries")
+            telemetry.count("retries.llm")
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import threading
+import llm_client
+import telemetry
+from llm_backends import THINK_PATTERN
+from telemetry import logger
+
+# JSON answers of the LLM stages. Backends that support it generate them constrained to the stage's schema
+# (llm_backends), the others are parsed leniently here. An answer that still does not parse or validate gets
+# one repair call that resends only the broken output and the schema, never the CV or the job.
+LLM_OUTPUT_REPAIR = os.environ.get("LLM_OUTPUT_REPAIR", "true").lower() == "true"
+LLM_REPAIR_MAX_CHARS = int(os.environ.get("LLM_REPAIR_MAX_CHARS", "4000"))
+
+FENCE_PATTERN = re.compile(r"```(?:json)?", re.IGNORECASE)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+JSON_START_PATTERN = re.compile(r"[\[{]")
+TYPOGRAPHIC_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+# Start positions tried per text, the answer normally starts at the first one
+MAX_JSON_STARTS = 50
+
+decoder = json.JSONDecoder()
+
+class OutputError(ValueError):
+    pass
+
+def cleaned_variants(text):
+    text = FENCE_PATTERN.sub("", THINK_PATTERN.sub("", str(text))).strip()
+    yield text
+    fixed = TRAILING_COMMA_PATTERN.sub(r"\1", text.translate(TYPOGRAPHIC_QUOTES))
+    if fixed != text:
+        yield fixed
+
+def extract_json(text):
+    # The first JSON value in the text: code fences, <think> blocks and prose around it are skipped,
+    # trailing commas and typographic quotes are fixed
+    for variant in cleaned_variants(text):
+        for index, match in enumerate(JSON_START_PATTERN.finditer(variant)):
+            if index >= MAX_JSON_STARTS:
+                break
+            try:
+                return decoder.raw_decode(variant, match.start())[0]
+            except json.JSONDecodeError:
+                continue
+    raise OutputError("No JSON value in the model output")
+
+def parse(content, validate):
+    # validate turns the JSON value into the stage's result and raises ValueError, KeyError or TypeError
+    try:
+        return validate(extract_json(content))
+    except OutputError:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise OutputError(f"Model output does not match the schema: {e}") from e
+
+# Parse failures and repairs per stage, mirrored as llm_output.<name>.<stage> telemetry counters
+lock = threading.Lock()
+counts = {}
+
+def add(stage, name):
+    with lock:
+        stage_counts = counts.setdefault(stage, {"responses": 0, "parse_failures": 0, "repairs": 0, "repaired": 0})
+        stage_counts[name] += 1
+    telemetry.count(f"llm_output.{name}.{stage}")
+
+def stats():
+    with lock:
+        return {
+            stage: dict(c, parse_failure_rate=round(c["parse_failures"] / c["responses"], 4) if c["responses"] else 0.0,
+                        repair_success_rate=round(c["repaired"] / c["repairs"], 4) if c["repairs"] else 0.0)
+            for stage, c in counts.items()
+        }
+
+def checked(stage, content, validate):
+    add(stage, "responses")
+    try:
+        return parse(content, validate)
+    except OutputError as e:
+        add(stage, "parse_failures")
+        logger.warning(f"Unparseable {stage} output ({e}): {str(content)[:200]}")
+        raise
+
+def repair_prompt(content, schema, error):
+    return (
+        "The output below should be JSON matching this schema but is not. "
+        "Return only the corrected JSON, keep the values unchanged where possible.\n"
+        f"Schema: {json.dumps(schema, separators=(',', ':'))}\n"
+        f"Error: {error}\n"
+        f"Output:\n{str(content)[:LLM_REPAIR_MAX_CHARS]}"
+    )
+
+def invoke(llm, prompt, stage, schema, validate, max_retries=llm_client.LLM_MAX_RETRIES):
+    response = llm_client.invoke(llm, prompt, stage, max_retries, schema=schema)
+    try:
+        return checked(stage, response.content, validate)
+    except OutputError as e:
+        if not LLM_OUTPUT_REPAIR:
+            raise
+        add(stage, "repairs")
+        repaired = llm_client.invoke(llm, repair_prompt(response.content, schema, e), stage, max_retries, schema=schema)
+        result = parse(repaired.content, validate)
+        add(stage, "repaired")
+        return result
+
+async def ainvoke(llm, prompt, stage, schema, validate, max_retries=llm_client.LLM_MAX_RETRIES, semaphore=None):
+    response = await llm_client.ainvoke(llm, prompt, stage, max_retries, semaphore, schema=schema)
+    try:
+        return checked(stage, response.content, validate)
+    except OutputError as e:
+        if not LLM_OUTPUT_REPAIR:
+            raise
+        add(stage, "repairs")
+        repaired = await llm_client.ainvoke(llm, repair_prompt(response.content, schema, e), stage, max_retries,
+                                            semaphore, schema=schema)
+        result = parse(repaired.content, validate)
+        add(stage, "repaired")
+        return result
@@ -0,0 +1,184 @@
+import os
+import csv
+import gzip
+import json
+import time
+import uuid
+import random
+from io import StringIO
+from object_store import PreconditionFailed
+import telemetry
+from telemetry import logger
+
+FIELDNAMES = [
+    "Job ID", "Title", "Company", "Location", "Salary", "Contract Type",
+    "Description", "Link", "Score", "Reason"
+]
+
+# Segments folded into a new snapshot once this many have piled up
+MATCH_STORE_COMPACT_SEGMENTS = int(os.environ.get("MATCH_STORE_COMPACT_SEGMENTS", "8"))
+MATCH_STORE_MAX_RETRIES = int(os.environ.get("MATCH_STORE_MAX_RETRIES", "8"))
+
+class MatchStore:
+    # Per user: job_matches.csv is the snapshot sorted by Job ID, every run appends a gzipped JSONL
+    # segment, and a manifest lists the segments in commit order. The Job IDs in the snapshot are kept in a
+    # separate index that only compaction rewrites, so a commit writes its segment and the small manifest.
+    # Manifest and snapshot are only replaced with conditional writes, so concurrent runs never lose updates.
+    def __init__(self, store, compact_segments=MATCH_STORE_COMPACT_SEGMENTS, max_retries=MATCH_STORE_MAX_RETRIES):
+        self.store = store
+        self.compact_segments = max(1, compact_segments)
+        self.max_retries = max_retries
+
+    def snapshot_key(self, email):
+        return f"{email}/job_matches.csv"
+
+    def manifest_key(self, email):
+        return f"{email}/job_matches.manifest.json"
+
+    def index_key(self, email):
+        return f"{email}/job_matches.index.json.gz"
+
+    def load_manifest(self, email):
+        obj = self.store.get(self.manifest_key(email))
+        if obj is None:
+            return None, None
+        return json.loads(obj[0]), obj[1]
+
+    def read_snapshot(self, email):
+        # Returns (rows by Job ID, etag), ({}, None) if there is no snapshot yet
+        obj = self.store.get(self.snapshot_key(email))
+        if obj is None:
+            return {}, None
+        reader = csv.DictReader(StringIO(obj[0].decode("utf-8")))
+        return {row["Job ID"]: row for row in reader}, obj[1]
+
+    def read_segment(self, key):
+        obj = self.store.get(key)
+        if obj is None:
+            raise KeyError(f"Segment {key} not found")
+        return [json.loads(line) for line in gzip.decompress(obj[0]).decode("utf-8").splitlines() if line]
+
+    def read_index(self, email):
+        obj = self.store.get(self.index_key(email))
+        return set(json.loads(gzip.decompress(obj[0]))) if obj is not None else set()
+
+    def write_index(self, email, job_ids):
+        data = gzip.compress(json.dumps(sorted(job_ids)).encode("utf-8"))
+        self.store.put(self.index_key(email), data, content_type="application/gzip")
+
+    def known_ids(self, email):
+        # Job IDs stored so far: the snapshot's index plus the ids in the segments not compacted yet
+        for _ in range(self.max_retries + 1):
+            manifest, _ = self.load_manifest(email)
+            if manifest is None:
+                # Nothing committed yet, a CSV written by the old full-rewrite store has no index
+                return set(self.read_snapshot(email)[0])
+            # Manifests written before the index moved out of them still carry it
+            job_ids = set(manifest["index"]) if "index" in manifest else self.read_index(email)
+            try:
+                for segment in manifest["segments"]:
+                    job_ids.update(row["Job ID"] for row in self.read_segment(segment["key"]))
+                return job_ids
+            except KeyError:
+                # Compacted meanwhile, the ids are in the new index now
+                continue
+        return job_ids
+
+    def commit(self, email, update):
+        # Read-modify-write of the manifest with If-Match, retried when another run committed first
+        for attempt in range(self.max_retries + 1):
+            manifest, etag = self.load_manifest(email)
+            if manifest is None:
+                # First commit for this user, a CSV written by the old full-rewrite store becomes the snapshot
+                rows, _ = self.read_snapshot(email)
+                if rows:
+                    self.write_index(email, rows)
+                manifest = {"next_seq": 1, "segments": [], "snapshot": bool(rows)}
+            # Manifests written before the index moved out of them
+            manifest.pop("index", None)
+            result = update(manifest)
+            try:
+                self.store.put(
+                    self.manifest_key(email), json.dumps(manifest).encode("utf-8"),
+                    if_match=etag, if_none_match=etag is None, content_type="application/json"
+                )
+                return manifest, result
+            except PreconditionFailed:
+                if attempt == self.max_retries:
+                    raise
+                telemetry.count("retries.match_store_commit")
+                time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+
+    def append(self, email, rows):
+        # Writes the rows as a new segment and commits it, returns the upsert counts
+        rows = list({row["Job ID"]: row for row in rows}.values())
+        key = f"{email}/segments/{uuid.uuid4().hex}.jsonl.gz"
+        data = gzip.compress("\n".join(json.dumps(row) for row in rows).encode("utf-8"))
+        self.store.put(key, data, if_none_match=True, content_type="application/gzip")
+        # Counted before the commit, a job first stored by a concurrent run may be counted as inserted by both
+        known = self.known_ids(email)
+        inserted = sum(1 for row in rows if row["Job ID"] not in known)
+
+        def update(manifest):
+            seq = manifest["next_seq"]
+            manifest["next_seq"] = seq + 1
+            manifest["segments"].append({"seq": seq, "key": key, "rows": len(rows)})
+            return {"segment": key, "seq": seq, "inserted": inserted, "updated": len(rows) - inserted}
+
+        manifest, result = self.commit(email, update)
+        result["compacted"] = 0
+        # The first run compacts right away so the user gets a CSV
+        if not manifest.get("snapshot") or len(manifest["segments"]) >= self.compact_segments:
+            result["compacted"] = self.compact(email)
+        return result
+
+    def read_matches(self, email):
+        # Current rows: the snapshot with all committed segments applied in order
+        rows, _ = self.read_snapshot(email)
+        manifest, _ = self.load_manifest(email)
+        for segment in (manifest or {}).get("segments", []):
+            for row in self.read_segment(segment["key"]):
+                rows[row["Job ID"]] = row
+        return rows
+
+    def compact(self, email):
+        # Folds the committed segments into a new sorted snapshot, returns how many were folded
+        rows, snapshot_etag = self.read_snapshot(email)
+        manifest, _ = self.load_manifest(email)
+        segments = (manifest or {}).get("segments", [])
+        if not segments:
+            return 0
+        try:
+            for segment in segments:
+                for row in self.read_segment(segment["key"]):
+                    rows[row["Job ID"]] = row
+        except KeyError as e:
+            logger.warning(f"Skipping compaction for {email}, another run already compacted: {e}")
+            return 0
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for job_id in sorted(rows):
+            writer.writerow(rows[job_id])
+        try:
+            self.store.put(
+                self.snapshot_key(email), output.getvalue().encode("utf-8"),
+                if_match=snapshot_etag, if_none_match=snapshot_etag is None, content_type="text/csv"
+            )
+        except PreconditionFailed:
+            logger.warning(f"Skipping compaction for {email}, the snapshot changed while compacting")
+            return 0
+        # Rebuilt from the snapshot, before the segments leave the manifest so no id is ever missing from both
+        self.write_index(email, rows)
+        compacted = {segment["seq"] for segment in segments}
+
+        def update(manifest):
+            manifest["snapshot"] = True
+            manifest["segments"] = [segment for segment in manifest["segments"] if segment["seq"] not in compacted]
+
+        self.commit(email, update)
+        # Re-applying a segment that is already in the snapshot is harmless, so a crash before this point loses nothing
+        for segment in segments:
+            self.store.delete(segment["key"])
+        logger.info(f"Compacted {len(segments)} segments into {self.snapshot_key(email)} ({len(rows)} jobs)")
+        return len(segments)
@@ -0,0 +1,115 @@
+import os
+import hashlib
+import threading
+import boto3
+from botocore.exceptions import ClientError
+
+try:
+    import fcntl
+except ImportError:  # Windows, the local store then only guards against other threads
+    fcntl = None
+
+class PreconditionFailed(Exception):
+    pass
+
+class S3ObjectStore:
+    def __init__(self, bucket, prefix="", endpoint_url=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = boto3.client("s3", endpoint_url=endpoint_url) if endpoint_url else boto3.client("s3")
+
+    def get(self, key):
+        # Returns (data, etag), or None if the object does not exist
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read(), response["ETag"]
+
+    def put(self, key, data, if_match=None, if_none_match=False, content_type="application/octet-stream"):
+        # if_match / if_none_match map to S3 conditional writes and raise PreconditionFailed on conflict
+        kwargs = {"Bucket": self.bucket, "Key": self.prefix + key, "Body": data, "ContentType": content_type}
+        if if_match:
+            kwargs["IfMatch"] = if_match
+        if if_none_match:
+            kwargs["IfNoneMatch"] = "*"
+        try:
+            return self.s3.put_object(**kwargs)["ETag"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise PreconditionFailed(key) from e
+            raise
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def list(self, prefix=""):
+        keys = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            keys.extend(obj["Key"][len(self.prefix):] for obj in page.get("Contents", []))
+        return sorted(keys)
+
+class LocalObjectStore:
+    # Local directory stand-in for S3 with the same ETag and conditional write semantics
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return data, f'"{hashlib.md5(data).hexdigest()}"'
+
+    def put(self, key, data, if_match=None, if_none_match=False, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock, open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            current = self.get(key)
+            if if_none_match and current is not None:
+                raise PreconditionFailed(key)
+            if if_match and (current is None or current[1] != if_match):
+                raise PreconditionFailed(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix=""):
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name == ".lock" or name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+def make_object_store(env_prefix, default_path, default_backend="local", default_bucket=None):
+    # <env_prefix>_BACKEND is "s3" (with _BUCKET, _PREFIX, _ENDPOINT_URL) or "local" (with _PATH)
+    if os.environ.get(f"{env_prefix}_BACKEND", default_backend).lower() == "s3":
+        return S3ObjectStore(
+            os.environ.get(f"{env_prefix}_BUCKET", default_bucket),
+            prefix=os.environ.get(f"{env_prefix}_PREFIX", ""),
+            endpoint_url=os.environ.get(f"{env_prefix}_ENDPOINT_URL"),
+        )
+    return LocalObjectStore(os.environ.get(f"{env_prefix}_PATH", default_path))
@@ -1,47 +1,105 @@
 import json
-import os
+import time
 import boto3
 from datetime import datetime
-from langchain_google_genai import ChatGoogleGenerativeAI
+import cv_cache
+import llm_backends
+import llm_client
+import llm_output
+import prompt_builder
+import telemetry
+from telemetry import logger
 
-# Initialize LLM
-gemini_api_key = os.environ["GEMINI_API_KEY"]
-llm = ChatGoogleGenerativeAI(model='gemini-2.0-flash-exp', google_api_key=gemini_api_key)
+# Backends for this stage from the LLM_BACKENDS_* settings, retries, rate limiting and the circuit breaker
+# are handled by llm_client
+llm = llm_backends.route("parse-cv")
+MODEL_NAME = llm.model
 
+# Bump whenever the parsing prompt changes so cached parsed CVs are not reused
+PARSER_VERSION = "2" if prompt_builder.compact() else "1"
+
+# The fields the prompt asks for, enforced on backends with structured output
+CV_SCHEMA = {
+    "title": "parsed_cv",
+    "type": "object",
+    "properties": {
+        "Full Name": {"type": "string"},
+        "Email": {"type": "string"},
+        "Skills": {"type": "string"},
+        "Education": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"Degree": {"type": "string"}, "Institution": {"type": "string"}, "Duration": {"type": "string"}},
+        }},
+        "Work Experience": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"Title": {"type": "string"}, "Company": {"type": "string"}, "Duration": {"type": "string"}},
+        }},
+    },
+    "required": ["Full Name", "Email", "Skills", "Education", "Work Experience"],
+}
+
+def validate_cv(parsed):
+    if not isinstance(parsed, dict) or not parsed:
+        raise ValueError("Expected a JSON object with the resume fields")
+    return parsed
+
+def build_verbose_prompt(text):
+    return (
+        "Extract the following structured fields from this resume:\n"
+        "- Full Name\n- Email\n- Skills (comma-separated)\n"
+        "- Education (degrees, institutions)\n- Work Experience (title, company, duration)\n\n"
+        f"Resume:\n{text}\n\nReturn a JSON object."
+    )
+
+def build_prompt(text):
+    if not prompt_builder.compact():
+        return build_verbose_prompt(text)
+    # Instructions first so they form a cacheable prefix, the PDF text with its runs of whitespace collapsed
+    prompt = (
+        "Extract the following structured fields from this resume as JSON:\n"
+        "- Full Name\n- Email\n- Skills (comma-separated)\n"
+        "- Education (degrees, institutions)\n- Work Experience (title, company, duration)\n\n"
+        f"Resume:\n{prompt_builder.normalize_cv_text(text)}"
+    )
+    return prompt_builder.record("parse-cv", prompt, telemetry.estimate_tokens(build_verbose_prompt(text)))
+
+def run(event):
+    text = event["cv_text"]
+    pdf_sha256 = event.get("pdf_sha256")
+    if pdf_sha256:
+        cached = cv_cache.get_parsed_cv(pdf_sha256, PARSER_VERSION, MODEL_NAME)
+        if cached is not None:
+            logger.info(f"Parsed CV served from the cache for PDF {pdf_sha256}")
+            return {
+                "message": "CV parsed",
+                "parsed_cv": cached,
+                "cache": cv_cache.stats()
+            }
+    start = time.perf_counter()
+
+    prompt = build_prompt(text)
+    cv_json = llm_output.invoke(llm, prompt, "parse-cv", CV_SCHEMA, validate_cv)
+    if pdf_sha256:
+        cv_cache.set_parsed_cv(pdf_sha256, PARSER_VERSION, MODEL_NAME, cv_json, time.perf_counter() - start)
+    return {
+        "message": "CV parsed",
+        "parsed_cv": cv_json,
+        "cache": cv_cache.stats(),
+        "llm": llm_client.stats(),
+        "output": llm_output.stats()
+    }
+
+@telemetry.traced_handler("parse-cv")
 def lambda_handler(event, context):
     try:
-        text = event["cv_text"]
-
-        prompt = (
-            "Extract the following structured fields from this resume:\n"
-            "- Full Name\n- Email\n- Skills (comma-separated)\n"
-            "- Education (degrees, institutions)\n- Work Experience (title, company, duration)\n\n"
-            f"Resume:\n{text}\n\nReturn a JSON object."
-        )
-        result = llm.invoke(prompt)
-
-        raw_content = result.content.strip()
-        # Remove code block markers if present
-        if raw_content.startswith("```json"):
-            raw_content = raw_content[len("```json"):].strip()
-        if raw_content.endswith("```"):
-            raw_content = raw_content[:-3].strip()
-
-        # Now parse the cleaned content
-        try:
-            cv_json = json.loads(raw_content)
-        except json.JSONDecodeError as e:
-            print("Cleaned model output that failed JSON parse:\n", raw_content)
-            raise e
         result = {
             "statusCode": 200,
-            "body": json.dumps({
-                "message": "CV parsed",
-                "parsed_cv": cv_json
-            })
+            "body": json.dumps(run(event))
         }
-        print(f"Result: {result}")
-        
         return result
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error in parse_cv lambda: {e}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
@@ -0,0 +1,116 @@
+import os
+import mmap
+import hashlib
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from PyPDF2 import PdfReader
+from telemetry import logger
+
+# Extraction settings
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGE_TIMEOUT = float(os.environ.get("PDF_PAGE_TIMEOUT", "10"))
+# Smaller documents are extracted serially, starting the pool would cost more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_SPOOL_CHUNK_SIZE = int(os.environ.get("PDF_SPOOL_CHUNK_SIZE", str(1024 * 1024)))
+
+@contextmanager
+def open_source(source):
+    # Yields (path, sha256) for a file path, raw bytes or a readable stream such as an S3 body.
+    # Streams are copied to a temp file chunk by chunk, so the PDF is never held in memory as a whole.
+    if isinstance(source, (str, os.PathLike)):
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(PDF_SPOOL_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        yield os.fspath(source), digest.hexdigest()
+        return
+    digest = hashlib.sha256()
+    spool = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    try:
+        with spool:
+            if isinstance(source, (bytes, bytearray)):
+                digest.update(source)
+                spool.write(source)
+            else:
+                for chunk in iter(lambda: source.read(PDF_SPOOL_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    spool.write(chunk)
+        yield spool.name, digest.hexdigest()
+    finally:
+        os.remove(spool.name)
+
+def open_reader(path):
+    # The reader works on a read-only memory map of the file instead of a copy of its bytes
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mapped)
+
+def page_text(reader, index):
+    return reader.pages[index].extract_text() or ""
+
+# Each pool worker opens the document once and then extracts single pages
+worker_reader = None
+
+def init_worker(path):
+    global worker_reader
+    worker_reader = open_reader(path)
+
+def extract_worker_page(index):
+    return page_text(worker_reader, index)
+
+def extract_parallel(path, page_count, workers, timeout):
+    texts, failed = [], []
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(path,))
+    try:
+        results = [pool.apply_async(extract_worker_page, (index,)) for index in range(page_count)]
+        # Joined in page order, a page that times out or fails is left empty
+        for index, result in enumerate(results):
+            try:
+                texts.append(result.get(timeout))
+            except Exception as e:
+                logger.warning(f"Skipping PDF page {index + 1}: {type(e).__name__} {e}")
+                texts.append("")
+                failed.append(index)
+    finally:
+        # Also kills a worker that is still stuck on a page
+        pool.terminate()
+    return texts, failed
+
+def extract_serial(path, page_count, timeout):
+    texts, failed = [], []
+    reader = open_reader(path)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        for index in range(page_count):
+            try:
+                texts.append(executor.submit(page_text, reader, index).result(timeout))
+                continue
+            except FutureTimeout as e:
+                # The stuck thread cannot be stopped, so continue with a fresh thread and reader
+                executor.shutdown(wait=False)
+                executor = ThreadPoolExecutor(max_workers=1)
+                reader = open_reader(path)
+                error = e
+            except Exception as e:
+                error = e
+            logger.warning(f"Skipping PDF page {index + 1}: {type(error).__name__} {error}")
+            texts.append("")
+            failed.append(index)
+    finally:
+        executor.shutdown(wait=False)
+    return texts, failed
+
+def extract_text(path, workers=PDF_EXTRACT_WORKERS, timeout=PDF_PAGE_TIMEOUT, parallel_min_pages=PDF_PARALLEL_MIN_PAGES):
+    # Returns (text, page count, indexes of pages that timed out or failed)
+    page_count = len(open_reader(path).pages)
+    if workers > 1 and page_count >= parallel_min_pages:
+        try:
+            texts, failed = extract_parallel(path, page_count, min(workers, page_count), timeout)
+            return "".join(texts), page_count, failed
+        except OSError as e:
+            # e.g. no /dev/shm inside Lambda
+            logger.warning(f"Process pool unavailable ({e}), extracting serially")
+    texts, failed = extract_serial(path, page_count, timeout)
+    return "".join(texts), page_count, failed
@@ -0,0 +1,142 @@
+import os
+import time
+import queue
+import threading
+from job_prefilter import prefilter_jobs
+from job_dedup import JobDeduper, dedup_jobs, propagate_scores
+from stage_loader import load_stage
+import telemetry
+
+# Bounded queues between the stages cap how many jobs are held in memory at once
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "4"))
+STREAM_FLUSH_SIZE = int(os.environ.get("STREAM_FLUSH_SIZE", "25"))
+
+END = object()
+
+class StreamingPipeline:
+    # fetch (pages) -> score (pages) -> store (micro-batches), each stage in its own thread
+    def __init__(self, structured_cv, email, queue_size=STREAM_QUEUE_SIZE, flush_size=STREAM_FLUSH_SIZE):
+        self.structured_cv = structured_cv
+        self.email = email
+        self.flush_size = max(1, flush_size)
+        self.pages = queue.Queue(maxsize=max(1, queue_size))
+        self.scored = queue.Queue(maxsize=max(1, queue_size))
+        self.stopped = threading.Event()
+        self.error = None
+        self.start = None
+        # Postings repeated on later pages or under other keywords are not scored again
+        self.deduper = JobDeduper()
+        self.representatives = {}
+        self.scores = {}
+        self.stats = {
+            "jobs_fetched": 0,
+            "jobs_scored": 0,
+            "jobs_unscored": 0,
+            "jobs_deduplicated": 0,
+            "jobs_stored": 0,
+            "store_batches": 0,
+            "time_to_first_result": None,
+            "elapsed": None,
+        }
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    def put(self, target, item):
+        # Blocks while the next stage is busy, gives up if another stage failed
+        while not self.stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, source):
+        while not self.stopped.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return END
+
+    def fetch(self, keywords, fetch_options):
+        try:
+            fetch_jobs = load_stage("fetch-jobs")
+            for page in fetch_jobs.iter_job_pages(keywords, **fetch_options):
+                self.stats["jobs_fetched"] += len(page)
+                if not self.put(self.pages, page):
+                    return
+        except Exception as e:
+            self.fail(Exception(f"Error fetching jobs: {e}"))
+        finally:
+            self.put(self.pages, END)
+
+    def score(self):
+        try:
+            job_scoring = load_stage("job-scoring")
+            while True:
+                page = self.get(self.pages)
+                if page is END:
+                    break
+                page, duplicates = dedup_jobs(page, self.deduper, self.representatives)
+                self.stats["jobs_deduplicated"] += sum(map(len, duplicates.values()))
+                page = prefilter_jobs(page, self.structured_cv, top_k=0)
+                with telemetry.span("stream.score_page", jobs=len(page)):
+                    result = job_scoring.run({"jobs": page, "cv": self.structured_cv}) if page else {"jobs": []}
+                scored = result["jobs"]
+                self.stats["jobs_scored"] += len(scored)
+                self.stats["jobs_unscored"] += len(result.get("unscored", []))
+                # Duplicates of postings scored on an earlier page are stored with this page
+                scored = propagate_scores(scored, duplicates, self.scores)
+                if not scored:
+                    continue
+                if not self.put(self.scored, scored):
+                    return
+        except Exception as e:
+            self.fail(Exception(f"Error scoring jobs: {e}"))
+        finally:
+            self.put(self.scored, END)
+
+    def flush(self, store, batch):
+        with telemetry.span("stream.store_batch", jobs=len(batch)):
+            store.run({"email": self.email, "jobs": batch})
+        self.stats["jobs_stored"] += len(batch)
+        self.stats["store_batches"] += 1
+        if self.stats["time_to_first_result"] is None:
+            self.stats["time_to_first_result"] = round(time.perf_counter() - self.start, 4)
+
+    def store(self):
+        store = load_stage("store-job-matches-to-s3")
+        batch = []
+        while True:
+            scored = self.get(self.scored)
+            if scored is END:
+                break
+            batch.extend(scored)
+            while len(batch) >= self.flush_size:
+                self.flush(store, batch[:self.flush_size])
+                batch = batch[self.flush_size:]
+        if batch and not self.stopped.is_set():
+            self.flush(store, batch)
+
+    def run(self, keywords, **fetch_options):
+        self.start = time.perf_counter()
+        workers = [
+            threading.Thread(target=self.fetch, args=(keywords, fetch_options), daemon=True),
+            threading.Thread(target=self.score, daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            self.store()
+        except Exception as e:
+            self.fail(Exception(f"Error while storing scored jobs: {e}"))
+        for worker in workers:
+            worker.join()
+        self.stats["elapsed"] = round(time.perf_counter() - self.start, 4)
+        if self.error is not None:
+            raise self.error
+        return self.stats
@@ -0,0 +1,103 @@
+import os
+import re
+import json
+import html
+import telemetry
+
+# "compact" sends CV digests and cleaned descriptions, "verbose" the previous indented JSON and raw descriptions
+PROMPT_STYLE = os.environ.get("PROMPT_STYLE", "compact")
+# Token budgets, estimated like telemetry.estimate_tokens (4 characters per token)
+CV_DIGEST_MAX_TOKENS = int(os.environ.get("CV_DIGEST_MAX_TOKENS", "600"))
+DESCRIPTION_MAX_TOKENS = int(os.environ.get("DESCRIPTION_MAX_TOKENS", "350"))
+# Kept for each description even when a long CV digest leaves less of the prompt budget
+DESCRIPTION_MIN_TOKENS = int(os.environ.get("DESCRIPTION_MIN_TOKENS", "80"))
+SCORING_PROMPT_TOKEN_BUDGET = int(os.environ.get("SCORING_PROMPT_TOKEN_BUDGET", "1200"))
+SCORING_BATCH_TOKEN_BUDGET = int(os.environ.get("SCORING_BATCH_TOKEN_BUDGET", "6000"))
+CV_TEXT_MAX_TOKENS = int(os.environ.get("CV_TEXT_MAX_TOKENS", "6000"))
+
+CHARS_PER_TOKEN = 4
+TAG_PATTERN = re.compile(r"<[^>]+>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+BLANK_LINES_PATTERN = re.compile(r"\n\s*\n+")
+# Adzuna cuts descriptions at about 500 characters and ends them with an ellipsis
+TRUNCATION_TAIL = re.compile(r"\s*(?:…|\.\.\.)\s*$")
+# Top-level CV fields that say nothing about the fit
+CONTACT_FIELD_PATTERN = re.compile(r"name|e-?mail|phone|mobile|address|linkedin|github|website|url", re.IGNORECASE)
+
+def compact():
+    return PROMPT_STYLE != "verbose"
+
+def truncate_tokens(text, max_tokens):
+    # Deterministic: cut at the last space before the character budget and mark the cut
+    limit = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:max(0, limit - 2)]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:") + " …"
+
+def normalize_description(text, max_tokens=DESCRIPTION_MAX_TOKENS):
+    text = WHITESPACE_PATTERN.sub(" ", html.unescape(TAG_PATTERN.sub(" ", str(text or "")))).strip()
+    if TRUNCATION_TAIL.search(text):
+        # The word before the ellipsis is usually cut in half
+        text = TRUNCATION_TAIL.sub("", text)
+        text = text.rsplit(" ", 1)[0] if " " in text else text
+    return truncate_tokens(text, max_tokens)
+
+def normalize_cv_text(text, max_tokens=CV_TEXT_MAX_TOKENS):
+    # PDF text keeps its line breaks, runs of spaces and blank lines are collapsed
+    lines = (" ".join(line.split()) for line in str(text or "").splitlines())
+    text = BLANK_LINES_PATTERN.sub("\n", "\n".join(lines)).strip()
+    return truncate_tokens(text, max_tokens)
+
+def render(value):
+    if isinstance(value, dict):
+        return "; ".join(f"{key}: {render(item)}" for key, item in value.items() if item not in (None, "", [], {}))
+    if isinstance(value, list):
+        return ", ".join(render(item) for item in value if item not in (None, "", [], {}))
+    return WHITESPACE_PATTERN.sub(" ", str(value)).strip()
+
+def render_entry(entry):
+    # Experience and education entries keep their values only, the field names are obvious from them
+    if isinstance(entry, dict):
+        return " | ".join(render(item) for item in entry.values() if item not in (None, "", [], {}))
+    return render(entry)
+
+def cv_digest(cv, max_tokens=CV_DIGEST_MAX_TOKENS):
+    # One line per CV field, list entries on their own lines, built once per CV and reused for every prompt
+    if isinstance(cv, str):
+        try:
+            cv = json.loads(cv)
+        except json.JSONDecodeError:
+            return normalize_cv_text(cv, max_tokens)
+    if not isinstance(cv, dict):
+        return truncate_tokens(render(cv), max_tokens)
+    lines = []
+    for key, value in cv.items():
+        if value in (None, "", [], {}) or CONTACT_FIELD_PATTERN.search(str(key)):
+            continue
+        if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            lines.append(f"{key}:")
+            lines.extend(f"- {render_entry(item)}" for item in value)
+        else:
+            lines.append(f"{key}: {render(value)}")
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+def description_budget(tokens_left):
+    return max(DESCRIPTION_MIN_TOKENS, min(DESCRIPTION_MAX_TOKENS, tokens_left))
+
+class PreparedCV:
+    # Built once per CV: the digest every compact prompt reuses, and the tokens of the indented CV JSON the
+    # verbose prompts sent, so the tokens saved per prompt are counted without building the verbose one
+    def __init__(self, cv):
+        self.digest = cv_digest(cv)
+        self.verbose_tokens = telemetry.estimate_tokens(json.dumps(cv, indent=2))
+
+def record(stage, prompt, verbose_tokens):
+    # Tokens sent and saved against the previous prompt, per stage
+    tokens = telemetry.estimate_tokens(prompt)
+    telemetry.count(f"prompt_tokens.{stage}", tokens)
+    telemetry.count(f"prompt_tokens_saved.{stage}", verbose_tokens - tokens)
+    return prompt
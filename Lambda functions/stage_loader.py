@@ -0,0 +1,38 @@
+import os
+import sys
+import threading
+import importlib.util
+import telemetry
+
+STAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Held while a stage module executes, so threads never see a half-initialized module
+load_lock = threading.RLock()
+
+def load_stage(function_name):
+    # Stage files are named after their Lambda function (with dashes), so they are loaded by path
+    module_name = function_name.replace("-", "_")
+    with load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        return load_module(function_name, module_name)
+
+def load_module(function_name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(STAGE_DIR, f"{function_name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    return module
+
+def run_stage(function_name, payload):
+    # Module-level entry point so stages can be run in worker processes
+    with telemetry.span(f"stage.{function_name}"):
+        return load_stage(function_name).run(payload)
+
+def run_stage_collected(function_name, payload):
+    # Returns (result, telemetry snapshot) so a worker's counts can be added to the caller's run
+    return telemetry.run_collected(run_stage, function_name, payload)
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # stages without an LLM are deployed without LangChain
+    BaseCallbackHandler = object
+
+# JSON lines go to stdout (CloudWatch in Lambda) unless a file is given
+TELEMETRY_LOG_LEVEL = os.environ.get("TELEMETRY_LOG_LEVEL", "INFO").upper()
+TELEMETRY_LOG_PATH = os.environ.get("TELEMETRY_LOG_PATH")
+
+logger = logging.getLogger("pipeline")
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RunIdFilter(logging.Filter):
+    # Stamped when the record is queued, the run may have changed by the time it is written
+    def filter(self, record):
+        record.run_id = collector.run_id
+        return True
+
+# Callers only put records on the queue, the listener thread formats and writes them
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+queue_handler.addFilter(RunIdFilter())
+listener = None
+
+def configure(path=TELEMETRY_LOG_PATH, level=TELEMETRY_LOG_LEVEL, mode="a", root=False):
+    # root=True routes every logger through the queue (jobAgent.py, browser_use included)
+    global listener
+    if listener is not None:
+        flush()
+        listener.stop()
+    handler = logging.FileHandler(path, mode=mode, encoding="utf-8") if path else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    target = logging.getLogger() if root else logger
+    target.handlers = [queue_handler]
+    target.setLevel(level)
+    if root:
+        logger.handlers = []
+        logger.setLevel(logging.NOTSET)
+    logger.propagate = root
+
+def restart_after_fork():
+    # A forked worker process inherits the queue but not the listener thread
+    global log_queue, listener
+    if listener is None:
+        return
+    log_queue = queue.Queue(-1)
+    queue_handler.queue = log_queue
+    listener = QueueListener(log_queue, *listener.handlers)
+    listener.start()
+
+def flush():
+    # Waits until the listener wrote every queued record, call before a Lambda invocation returns
+    if listener is not None:
+        log_queue.join()
+
+def log(level, message, **fields):
+    logger.log(level, message, extra={"fields": fields})
+
+class Collector:
+    # Aggregates of one run: spans by name, LLM calls by model and plain counters
+    def __init__(self, name=None):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.llm = {}
+        self.counters = {}
+
+    def add_span(self, name, seconds, error):
+        with self.lock:
+            entry = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["errors"] += int(error)
+
+    def add_llm(self, model, seconds, prompt_tokens=0, completion_tokens=0, estimated=False, error=False):
+        with self.lock:
+            entry = self.llm.setdefault(model, {
+                "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_calls": 0, "seconds": 0.0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["estimated_calls"] += int(estimated)
+            entry["seconds"] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "spans": {name: dict(entry) for name, entry in self.spans.items()},
+                "llm": {model: dict(entry) for model, entry in self.llm.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        # Adds the counts of a worker process or a stage Lambda to this run
+        with self.lock:
+            for name, other in snapshot.get("spans", {}).items():
+                entry = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+                for field in ("count", "seconds", "errors"):
+                    entry[field] += other[field]
+                entry["max_seconds"] = max(entry["max_seconds"], other["max_seconds"])
+            for model, other in snapshot.get("llm", {}).items():
+                entry = self.llm.setdefault(model, dict.fromkeys(other, 0))
+                for field, value in other.items():
+                    entry[field] = entry.get(field, 0) + value
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+# The run of this process, worker code can record into its own collector through the context
+collector = Collector()
+current_collector = contextvars.ContextVar("current_collector", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+def active():
+    return current_collector.get() or collector
+
+def start_run(name):
+    global collector
+    collector = Collector(name)
+    return collector
+
+def count(name, value=1):
+    active().count(name, value)
+
+def merge(snapshot):
+    if snapshot:
+        active().merge(snapshot)
+
+@contextmanager
+def span(name, **fields):
+    # Times the block, the yielded dict takes extra fields for the span's log line
+    parent = current_span.get()
+    token = current_span.set(name)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        current_span.reset(token)
+        active().add_span(name, seconds, error is not None)
+        if logger.isEnabledFor(logging.DEBUG):
+            log(logging.DEBUG, "span", span=name, parent=parent, seconds=round(seconds, 6),
+                error=repr(error) if error else None, **fields)
+
+def estimate_tokens(text):
+    return max(1, len(str(text)) // 4)
+
+def model_name(llm):
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+def record_llm(model, seconds, prompt, response):
+    # Token counts from the provider's usage metadata, estimated from the text length when it has none
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        prompt_tokens, completion_tokens, estimated = usage.get("input_tokens", 0), usage.get("output_tokens", 0), False
+    else:
+        prompt_tokens, completion_tokens, estimated = estimate_tokens(prompt), estimate_tokens(getattr(response, "content", response)), True
+    active().add_llm(model, seconds, prompt_tokens, completion_tokens, estimated)
+    if logger.isEnabledFor(logging.DEBUG):
+        log(logging.DEBUG, "llm call", model=model, seconds=round(seconds, 4), prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens, estimated=estimated)
+
+def traced_invoke(llm, prompt, stage):
+    model = model_name(llm)
+    start = time.perf_counter()
+    with span(f"llm.{stage}", model=model):
+        try:
+            response = llm.invoke(prompt)
+        except Exception:
+            active().add_llm(model, time.perf_counter() - start, error=True)
+            raise
+    record_llm(model, time.perf_counter() - start, prompt, response)
+    return response
+
+async def traced_ainvoke(llm, prompt, stage):
+    model = model_name(llm)
+    start = time.perf_counter()
+    with span(f"llm.{stage}", model=model):
+        try:
+            response = await llm.ainvoke(prompt)
+        except Exception:
+            active().add_llm(model, time.perf_counter() - start, error=True)
+            raise
+    record_llm(model, time.perf_counter() - start, prompt, response)
+    return response
+
+class LLMCallback(BaseCallbackHandler):
+    # For LLMs called by code we don't own (the browser_use agent), passed as callbacks=[LLMCallback()]
+    def __init__(self, model=None):
+        self.model = model
+        self.started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.started[run_id] = (time.perf_counter(), messages)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = (time.perf_counter(), prompts)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, prompt = self.started.pop(run_id, (time.perf_counter(), ""))
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None) or getattr(generation, "text", "")
+        record_llm(self.model or "unknown", time.perf_counter() - start, prompt, message)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start, _ = self.started.pop(run_id, (time.perf_counter(), ""))
+        active().add_llm(self.model or "unknown", time.perf_counter() - start, error=True)
+
+def run_collected(fn, *args):
+    # Runs fn with its own counters and returns (result, snapshot), for worker processes and threads
+    own = Collector()
+    token = current_collector.set(own)
+    try:
+        return fn(*args), own.snapshot()
+    finally:
+        current_collector.reset(token)
+        # Worker processes exit without atexit hooks
+        flush()
+
+def summary():
+    snapshot = collector.snapshot()
+    for entry in snapshot["spans"].values():
+        entry["seconds"] = round(entry["seconds"], 4)
+        entry["max_seconds"] = round(entry["max_seconds"], 4)
+    for entry in snapshot["llm"].values():
+        entry["seconds"] = round(entry["seconds"], 4)
+    totals = {field: sum(entry[field] for entry in snapshot["llm"].values())
+              for field in ("calls", "errors", "prompt_tokens", "completion_tokens")}
+    return dict(snapshot, run=collector.name, run_id=collector.run_id,
+                seconds=round(time.time() - collector.started, 4), llm_totals=totals)
+
+def report():
+    # Logs the run summary as one JSON line and returns it
+    run_summary = summary()
+    log(logging.INFO, "run summary", summary=run_summary)
+    flush()
+    return run_summary
+
+def traced_handler(stage):
+    # Lambda entry points: one run per invocation. The summary is returned next to the body under
+    # "telemetry", so the orchestrator can add a stage Lambda's counts to its own run.
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global collector
+            if collector.name is not None:
+                # Called inside a run of this process (local emulation), the counts already land there
+                with span(f"stage.{stage}"):
+                    return handler(event, context)
+            start_run(stage)
+            try:
+                with span(f"stage.{stage}"):
+                    response = handler(event, context)
+                run_summary = report()
+                if isinstance(response, dict):
+                    response["telemetry"] = run_summary
+                return response
+            finally:
+                collector = Collector()
+        return wrapper
+    return decorate
+
+configure()
+atexit.register(flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=restart_after_fork)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("TELEMETRY_LOG_LEVEL", "WARNING")
+
+from common import load_stage
+from fakes import FakeChatModel, make_cv, make_jobs
+import llm_backends
+import telemetry
+
+STAGES = ["parse-cv", "extract-job-keywords", "job-scoring"]
+
+class FakeServerModel(FakeChatModel):
+    # A fake model behind a server with a fixed number of parallel slots, like a local Ollama
+    def __init__(self, model, latency, slots=None, seed=0):
+        super().__init__(latency=latency, seed=seed)
+        self.model = model
+        self.slots = threading.Semaphore(slots) if slots else None
+
+    def invoke(self, prompt):
+        if self.slots is None:
+            return super().invoke(prompt)
+        with self.slots:
+            return super().invoke(prompt)
+
+def stage_event(stage, jobs):
+    cv = make_cv()
+    if stage == "parse-cv":
+        return {"cv_text": "\n".join(f"{key}: {value}" for key, value in cv.items())}
+    if stage == "extract-job-keywords":
+        return {"structured-cv": cv}
+    return {"jobs": make_jobs(jobs), "cv": cv}
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+def measure(stage, route, backends, args):
+    # Runs the stage `calls` times, `parallel` at once, and returns latency and cost per call
+    module = load_stage(stage)
+    module.llm = route
+    telemetry.start_run(f"{stage}-benchmark")
+    samples = []
+
+    def call(_):
+        start = time.perf_counter()
+        module.run(stage_event(stage, args.jobs))
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        list(executor.map(call, range(args.calls)))
+    elapsed = time.perf_counter() - start
+    usage = telemetry.summary()["llm"]
+    by_model = {backend.model: backend for backend in backends}
+    cost = sum(by_model[model].cost(entry["prompt_tokens"], entry["completion_tokens"])
+               for model, entry in usage.items() if model in by_model)
+    return {
+        "p50": percentile(samples, 0.5),
+        "p95": percentile(samples, 0.95),
+        "calls_per_second": round(args.calls / elapsed, 2),
+        "usd_per_call": round(cost / args.calls, 6),
+        "llm_calls": {model: entry["calls"] for model, entry in usage.items()},
+    }
+
+def build_models(backends, args):
+    # Offline every backend is a fake with its own latency, the local one keeps its request queue
+    latencies = dict(item.split("=") for item in args.fake_latency.split(","))
+    models = {}
+    for backend in backends:
+        fake = FakeServerModel(backend.model, float(latencies.get(backend.name, 1.0)),
+                               slots=args.local_slots if backend.name == "local" else None)
+        models[backend.name] = backend.wrap(fake) if backend.name == "local" else fake
+    return models
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-stage latency and cost across LLM backends and the router.")
+    parser.add_argument("--backends", default="gemini,openai,local")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--calls", type=int, default=20, help="stage invocations per backend")
+    parser.add_argument("--parallel", type=int, default=4, help="stage invocations at once")
+    parser.add_argument("--jobs", type=int, default=10, help="jobs per job-scoring invocation")
+    parser.add_argument("--live", action="store_true", help="call the configured backends instead of fakes")
+    parser.add_argument("--fake-latency", default="gemini=0.8,openai=1.2,local=0.3", help="seconds per fake call")
+    parser.add_argument("--local-slots", type=int, default=4, help="parallel requests the fake local server handles")
+    args = parser.parse_args()
+
+    backends = [llm_backends.BACKENDS[name]() for name in args.backends.split(",")]
+    models = None if args.live else build_models(backends, args)
+    results = {}
+    for stage in args.stages.split(","):
+        results[stage] = {}
+        for backend in backends:
+            route = llm_backends.Route(stage, [backend], models=models)
+            results[stage][backend.name] = measure(stage, route, backends, args)
+        # Every backend of a large enough tier allowed, each call goes where the router sends it
+        routed = llm_backends.Route(stage, llm_backends.eligible(stage, backends), models=models)
+        results[stage]["routed"] = measure(stage, routed, backends, args)
+
+    print(f"{'stage':>22} {'backend':>8} {'p50 s':>8} {'p95 s':>8} {'calls/s':>8} {'usd/call':>10}  llm calls")
+    for stage, by_backend in results.items():
+        for name, r in by_backend.items():
+            print(f"{stage:>22} {name:>8} {r['p50']:>8} {r['p95']:>8} {r['calls_per_second']:>8} {r['usd_per_call']:>10}  {r['llm_calls']}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
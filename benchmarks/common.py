@@ -0,0 +1,14 @@
+import os
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Lambda functions")
+sys.path.insert(0, LAMBDA_DIR)
+
+from stage_loader import load_stage
+
+# Benchmarks import load_stage from here, after the path setup above
+__all__ = ["LAMBDA_DIR", "load_stage", "estimate_tokens"]
+
+def estimate_tokens(text):
+    # Rough provider-agnostic estimate, good enough to compare prompt variants
+    return max(1, len(text) // 4)
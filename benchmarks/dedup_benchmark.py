@@ -0,0 +1,54 @@
+import time
+import random
+import argparse
+import tracemalloc
+
+import common  # noqa: F401 - only for its side effect, adds the Lambda functions folder to sys.path
+from fakes import make_jobs
+from job_dedup import JobDeduper, dedup_jobs, job_key
+
+def make_feed(size, repost_rate, repeat_rate, seed=0):
+    # Distinct postings plus recruiter reposts (new id, a few words changed) and repeats of the same id,
+    # returns the shuffled feed and the original id of every repost
+    rng = random.Random(seed)
+    jobs = make_jobs(size, seed=seed)
+    reposts, origin = [], {}
+    for job in rng.sample(jobs, int(size * repost_rate)):
+        words = job["description"].split()
+        for _ in range(3):
+            words[rng.randrange(len(words))] = rng.choice(["senior", "junior", "remote", "hybrid"])
+        repost_id = f"r{job['id']}"
+        origin[repost_id] = job["id"]
+        reposts.append(dict(job, id=repost_id, description=" ".join(words), redirect_url=f"https://recruiter.example/{repost_id}"))
+    feed = jobs + reposts + rng.sample(jobs, int(size * repeat_rate))
+    rng.shuffle(feed)
+    return feed, origin
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dedup latency, memory and accuracy on a synthetic job feed.")
+    parser.add_argument("--sizes", default="1000,10000,30000")
+    parser.add_argument("--repost-rate", type=float, default=0.2)
+    parser.add_argument("--repeat-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    for size in map(int, args.sizes.split(",")):
+        feed, origin = make_feed(size, args.repost_rate, args.repeat_rate)
+        deduper = JobDeduper()
+        tracemalloc.start()
+        start = time.perf_counter()
+        canonical, duplicates = dedup_jobs(feed, deduper)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # A repost is found if it landed in the same cluster as its original posting
+        cluster = {job_key(job): job_key(job) for job in canonical}
+        for key, copies in duplicates.items():
+            cluster.update((job_key(job), key) for job in copies)
+        found = sum(1 for repost_id, original_id in origin.items() if cluster[repost_id] == cluster[original_id])
+        merged = len(feed) - len(set(map(job_key, feed))) + len(origin)
+        print(f"{len(feed):>6} postings: {len(canonical)} scored ({len(feed) - len(canonical)} LLM calls saved, "
+              f"{merged} expected), repost recall {found / len(origin) if origin else 1:.2%}, {elapsed * 1000:.0f} ms, "
+              f"peak memory {peak / 1024 / 1024:.1f} MiB, {deduper.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import io
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+from common import estimate_tokens, load_stage
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+class FakeChatModel:
+    def __init__(self, latency=0.0, per_token_latency=0.0, failure_rate=0.0, malformed_rate=0.0, seed=0):
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def respond(self, prompt):
+        if "should be JSON matching this schema" in prompt:
+            return repair_output(prompt.split("Output:\n", 1)[1])
+        if "### Job Postings (JSON array)" in prompt:
+            ids = re.findall(r'"id":\s*"([^"]+)"', prompt.split("### Job Postings (JSON array)", 1)[1])
+            titles = re.findall(r'"title":\s*"([^"]*)"', prompt)
+            return json.dumps([
+                {"id": job_id, "score": fake_score(title), "reason": f"Fake match for {title}"}
+                for job_id, title in zip(ids, titles)
+            ])
+        if "### Job Posting" in prompt:
+            title = re.search(r"Title: (.*)", prompt).group(1).strip()
+            return json.dumps({"score": fake_score(title), "reason": f"Fake match for {title}"})
+        if "structured fields from this resume" in prompt:
+            return "```json\n" + json.dumps(make_cv(), indent=2) + "\n```"
+        if "job role or field keywords" in prompt:
+            return '["data science", "machine learning", "natural language processing"]'
+        return "{}"
+
+    def _record(self, prompt):
+        self.calls += 1
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        content = self.respond(prompt)
+        if self.malformed_rate and self.random.random() < self.malformed_rate and "should be JSON matching this schema" not in prompt:
+            content = malform(content, self.random)
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        delay = self.latency + self.per_token_latency * (prompt_tokens + completion_tokens)
+        return FakeMessage(content), delay
+
+    def invoke(self, prompt):
+        message, delay = self._record(prompt)
+        time.sleep(delay)
+        return message
+
+    async def ainvoke(self, prompt):
+        message, delay = self._record(prompt)
+        await asyncio.sleep(delay)
+        return message
+
+def malform(content, rng):
+    # Formatting glitches seen from real models: chatter around the JSON, a trailing comma, a cut-off answer
+    kind = rng.choice(["chatter", "trailing_comma", "truncated"])
+    if kind == "chatter":
+        return f"Sure! Here is the result:\n```json\n{content}\n```\nLet me know if you need more."
+    if kind == "trailing_comma":
+        return content[:-1] + "," + content[-1]
+    return content[:-1]
+
+def repair_output(output):
+    # Answers a repair request by closing the cut-off JSON
+    start = min((i for i in (output.find("{"), output.find("[")) if i >= 0), default=0)
+    text = output[start:].split("\n```", 1)[0]
+    for suffix in ("", "}", "]", "}]", "]}"):
+        try:
+            return json.dumps(json.loads(text + suffix))
+        except json.JSONDecodeError:
+            continue
+    return text
+
+class FakeS3Client:
+    # In-memory stand-in for the boto3 S3 client calls used by the Lambda functions,
+    # including conditional writes, deletes and listing
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    def count(self, operation):
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self.lock:
+            self.count("PutObject")
+            current = self.objects.get((Bucket, Key))
+            if (IfNoneMatch == "*" and current is not None) or (IfMatch and (current is None or current["ETag"] != IfMatch)):
+                raise ClientError({"Error": {"Code": "PreconditionFailed", "Message": "At least one of the pre-conditions you specified did not hold"}}, "PutObject")
+            self.objects[(Bucket, Key)] = {
+                "data": data,
+                "ETag": etag,
+                "LastModified": datetime.now(timezone.utc),
+                "Metadata": kwargs.get("Metadata", {}),
+            }
+        return {"ETag": etag}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.count("GetObject")
+            if (Bucket, Key) not in self.objects:
+                raise self.exceptions.NoSuchKey(f"{Bucket}/{Key}")
+            obj = self.objects[(Bucket, Key)]
+        return {
+            "Body": io.BytesIO(obj["data"]),
+            "ETag": obj["ETag"],
+            "LastModified": obj["LastModified"],
+            "ContentLength": len(obj["data"]),
+            "Metadata": obj["Metadata"],
+        }
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.count("DeleteObject")
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        with self.lock:
+            self.count("DeleteObjects")
+            for obj in Delete["Objects"]:
+                self.objects.pop((Bucket, obj["Key"]), None)
+        return {}
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix="", **kwargs):
+                with client.lock:
+                    client.count("ListObjectsV2")
+                    contents = [
+                        {"Key": key, "Size": len(obj["data"]), "LastModified": obj["LastModified"], "ETag": obj["ETag"]}
+                        for (bucket, key), obj in sorted(client.objects.items()) if bucket == Bucket and key.startswith(Prefix)
+                    ]
+                for i in range(0, max(1, len(contents)), 1000):
+                    yield {"Contents": contents[i:i + 1000], "KeyCount": len(contents[i:i + 1000])}
+
+        return Paginator()
+
+class FakeLambdaClient:
+    # Invokes the stage handlers in this process, with the JSON round trip of a real invoke
+    def invoke(self, FunctionName, Payload, InvocationType="RequestResponse", **kwargs):
+        result = load_stage(FunctionName).lambda_handler(json.loads(Payload), None)
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+def fake_score(title):
+    return int(hashlib.md5(title.encode("utf-8")).hexdigest(), 16) % 101
+
+def make_cv():
+    return {
+        "Full Name": "Jane Doe",
+        "Email": "jane.doe@example.com",
+        "Skills": "Python, SQL, PyTorch, scikit-learn, NLP, Docker, AWS, Spark",
+        "Education": [
+            {"Degree": "Master's in Data Science", "Institution": "TU Berlin", "Duration": "2021-2023"},
+            {"Degree": "Bachelor of Computer Science", "Institution": "University of Pune", "Duration": "2016-2020"},
+        ],
+        "Work Experience": [
+            {"Title": "Machine Learning Engineer", "Company": "Acme GmbH", "Duration": "2023 - Present"},
+            {"Title": "Data Analyst Intern", "Company": "Globex", "Duration": "2022 - 2023"},
+        ],
+    }
+
+TITLES = [
+    "Data Scientist", "Machine Learning Engineer", "NLP Engineer", "Backend Developer",
+    "Sales Manager", "Accountant", "Data Engineer", "Nurse", "Frontend Developer", "MLOps Engineer",
+]
+
+def make_jobs(count, seed=0):
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(count):
+        title = f"{rng.choice(TITLES)} {i}"
+        jobs.append({
+            "id": str(4000000000 + i),
+            "title": title,
+            "company": {"display_name": f"Company {rng.randint(1, 500)}"},
+            "location": {"display_name": rng.choice(["Berlin", "Munich", "Hamburg", "Remote"])},
+            "category": {"label": "IT Jobs"},
+            "description": " ".join(rng.choice(["python", "sql", "teams", "customers", "models", "pipelines",
+                                                  "cloud", "reporting", "budget", "patients"]) for _ in range(80)),
+            "redirect_url": f"https://www.adzuna.de/details/{4000000000 + i}",
+            "created": f"2025-05-{1 + i % 28:02d}T10:00:00Z",
+        })
+    return jobs
+
+CV_WORDS = [
+    "python", "machine", "learning", "pipelines", "experience", "models", "data", "engineering",
+    "deployed", "team", "research", "university", "project", "analysis", "cloud", "production",
+]
+
+def make_pdf(pages, lines_per_page=40, seed=0):
+    # Minimal multi-page PDF with text lines, as a fixture for text extraction
+    rng = random.Random(seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    for i in range(pages):
+        lines = [" ".join(rng.choice(CV_WORDS) for _ in range(10)) for _ in range(lines_per_page)]
+        content = "BT /F1 10 Tf 14 TL 72 760 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
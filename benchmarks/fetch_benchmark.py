@@ -0,0 +1,34 @@
+import os
+import time
+import argparse
+
+from stub_adzuna import StubAdzunaServer
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch jobs from a local stub Adzuna server.")
+    parser.add_argument("--keywords", default="data science,machine learning,natural language processing")
+    parser.add_argument("--countries", default="de,at,ch")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--results-per-page", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub server latency per request in seconds")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05, help="share of requests answered with 429")
+    args = parser.parse_args()
+
+    with StubAdzunaServer(total_jobs=5000, latency=args.latency, rate_limit_rate=args.rate_limit_rate) as stub:
+        os.environ["ADZUNA_BASE_URL"] = stub.base_url
+        from common import load_stage
+        fetch_jobs = load_stage("fetch-jobs")
+
+        start = time.perf_counter()
+        jobs = fetch_jobs.fetch_jobs(
+            args.keywords.split(","),
+            countries=args.countries.split(","),
+            pages=args.pages,
+            results_per_page=args.results_per_page,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{stub.requests} requests, {len(jobs)} unique jobs in {elapsed:.2f}s "
+              f"(single request latency {args.latency:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import re
+import copy
+import json
+import time
+import argparse
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("TELEMETRY_LOG_LEVEL", "ERROR")
+
+from common import load_stage
+from fakes import FakeChatModel, make_cv, make_jobs
+import llm_output
+
+def strict_extract(text):
+    # The previous parsing: code fences stripped at line starts, then json.loads
+    return json.loads(re.sub(r"^```json|```$", "", text.strip(), flags=re.MULTILINE))
+
+MODES = {
+    # mode: (extractor, repair call)
+    "strict": (strict_extract, False),
+    "lenient": (llm_output.extract_json, False),
+    "lenient+repair": (llm_output.extract_json, True),
+}
+
+def run(mode, jobs, cv, batch_size, malformed_rate, latency, seed):
+    job_scoring = load_stage("job-scoring")
+    job_scoring.llm = FakeChatModel(latency=latency, malformed_rate=malformed_rate, seed=seed)
+    llm_output.extract_json, llm_output.LLM_OUTPUT_REPAIR = MODES[mode]
+    llm_output.counts.clear()
+    start = time.perf_counter()
+    result = job_scoring.run({"jobs": copy.deepcopy(jobs), "cv": cv, "batch_size": batch_size, "concurrency": 8})
+    elapsed = time.perf_counter() - start
+    output = llm_output.stats().get("job-scoring", {})
+    return {
+        "mode": mode,
+        "batch_size": batch_size,
+        "llm_calls": job_scoring.llm.calls,
+        "unscored_jobs": len(result["unscored"]),
+        "parse_failure_rate": output.get("parse_failure_rate", 0.0),
+        "repairs": output.get("repairs", 0),
+        "repair_success_rate": output.get("repair_success_rate", 0.0),
+        "wall_clock_seconds": round(elapsed, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare strict and lenient parsing with repair calls on malformed LLM output.")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--batch-sizes", default="1,10")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="share of answers with a formatting glitch")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cv, jobs = make_cv(), make_jobs(args.jobs, seed=args.seed)
+    extract_json, repair = llm_output.extract_json, llm_output.LLM_OUTPUT_REPAIR
+    results = []
+    try:
+        for batch_size in map(int, args.batch_sizes.split(",")):
+            for mode in MODES:
+                results.append(run(mode, jobs, cv, batch_size, args.malformed_rate, args.latency, args.seed))
+    finally:
+        llm_output.extract_json, llm_output.LLM_OUTPUT_REPAIR = extract_json, repair
+
+    print(f"{'mode':>15} {'batch':>5} {'calls':>6} {'unscored':>9} {'parse fail':>11} {'repairs':>8} {'repaired':>9} {'seconds':>8}")
+    for r in results:
+        print(f"{r['mode']:>15} {r['batch_size']:>5} {r['llm_calls']:>6} {r['unscored_jobs']:>9} {r['parse_failure_rate']:>11.1%} "
+              f"{r['repairs']:>8} {r['repair_success_rate']:>9.0%} {r['wall_clock_seconds']:>8}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
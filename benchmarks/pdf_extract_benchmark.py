@@ -0,0 +1,50 @@
+import io
+import time
+import argparse
+import tracemalloc
+
+import common  # noqa: F401 - only for its side effect, adds the Lambda functions folder to sys.path
+from fakes import make_pdf
+from PyPDF2 import PdfReader
+import pdf_extract
+
+def extract_in_memory(data):
+    # The previous approach: whole body in a BytesIO, pages extracted one after the other
+    pdf_reader = PdfReader(io.BytesIO(data))
+    return "".join([page.extract_text() or "" for page in pdf_reader.pages])
+
+def extract_with_engine(data, workers):
+    with pdf_extract.open_source(io.BytesIO(data)) as (path, sha256):
+        return pdf_extract.extract_text(path, workers=workers, parallel_min_pages=1)[0]
+
+def measure(fn, repeats):
+    best, peak, text = None, 0, ""
+    for _ in range(repeats):
+        tracemalloc.start()
+        start = time.perf_counter()
+        text = fn()
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak, text
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial in-memory and parallel PDF text extraction.")
+    parser.add_argument("--pages", default="2,20,200")
+    parser.add_argument("--workers", type=int, default=pdf_extract.PDF_EXTRACT_WORKERS)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'mode':<18} {'seconds':>8} {'peak MB':>8} {'speedup':>8}")
+    for pages in map(int, args.pages.split(",")):
+        data = make_pdf(pages)
+        baseline, peak, expected = measure(lambda: extract_in_memory(data), args.repeats)
+        print(f"{pages:>6} {'in-memory serial':<18} {baseline:>8.3f} {peak / 1e6:>8.2f} {1.0:>8.2f}")
+        for mode, workers in (("engine serial", 1), (f"engine {args.workers} procs", args.workers)):
+            elapsed, peak, text = measure(lambda: extract_with_engine(data, workers), args.repeats)
+            assert text == expected, f"{mode} text differs from the in-memory extraction"
+            print(f"{pages:>6} {mode:<18} {elapsed:>8.3f} {peak / 1e6:>8.2f} {baseline / elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    main()
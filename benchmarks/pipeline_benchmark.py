@@ -0,0 +1,204 @@
+import os
+import json
+import math
+import time
+import uuid
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Every cache off and no rate limit, so each run does the full work
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SCORING_RATE_PER_SECOND", "0")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+os.environ.setdefault("LLM_BACKOFF_BASE", "0.01")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("ADZUNA_CACHE_BACKEND", "none")
+os.environ.setdefault("CV_CACHE_BACKEND", "none")
+os.environ.setdefault("PREFILTER_TOP_K", "0")
+os.environ.setdefault("TELEMETRY_LOG_LEVEL", "WARNING")
+
+from common import load_stage
+from fakes import FakeChatModel, FakeLambdaClient, FakeS3Client, make_pdf
+from stub_adzuna import StubAdzunaServer
+
+STAGES = ["extract-cv-text", "parse-cv", "extract-job-keywords", "fetch-jobs", "job-scoring", "store-job-matches-to-s3"]
+BUCKET = "benchmark-bucket"
+CV_KEY = "cvs/benchmark.pdf"
+RESULTS_PER_PAGE = 50
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda q: ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+    return {"count": len(ordered), "p50": round(pick(0.5), 4), "p95": round(pick(0.95), 4),
+            "p99": round(pick(0.99), 4), "max": round(ordered[-1], 4)}
+
+class StageTimer:
+    # Wraps every stage's run() to collect one latency sample per call
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def install(self):
+        for stage in STAGES:
+            module = load_stage(stage)
+            run = getattr(module, "untimed_run", module.run)
+            module.untimed_run = run
+            module.run = self.timed(stage, run)
+
+    def timed(self, stage, run):
+        def timed_run(event):
+            start = time.perf_counter()
+            try:
+                return run(event)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed_run
+
+def install_fakes(args, s3):
+    from object_store import S3ObjectStore
+    from match_store import MatchStore
+    import checkpoints
+    load_stage("extract-cv-text").s3 = s3
+    load_stage("parse-cv").llm = FakeChatModel(latency=args.llm_latency, seed=args.seed)
+    load_stage("extract-job-keywords").llm = FakeChatModel(latency=args.llm_latency, seed=args.seed)
+    load_stage("job-scoring").llm = FakeChatModel(latency=args.llm_latency, failure_rate=args.llm_failure_rate, seed=args.seed)
+    # Matches and checkpoints go through the S3 code path against the in-memory client
+    match_store = S3ObjectStore(BUCKET)
+    match_store.s3 = s3
+    load_stage("store-job-matches-to-s3").match_store = MatchStore(match_store)
+    checkpoint_store = S3ObjectStore(BUCKET, prefix="checkpoints/")
+    checkpoint_store.s3 = s3
+    checkpoints.checkpoint_store = checkpoint_store
+    main = load_stage("Main-cv-job-match")
+    main.lambda_client = FakeLambdaClient()
+    # Scoring shards run on threads instead of worker processes, so their calls are timed too
+    main.InProcessTransport.executor = lambda self, max_workers: ThreadPoolExecutor(max_workers=max_workers)
+    return main
+
+def run_once(main, args):
+    import telemetry
+    # A fresh ETag per run, so checkpoints are written but never resumed
+    event = {
+        "transport": args.transport,
+        "mode": "batch",
+        "Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": CV_KEY, "eTag": uuid.uuid4().hex}}}],
+    }
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = main.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    body = json.loads(response["body"])
+    if response["statusCode"] != 200:
+        raise RuntimeError(f"Pipeline failed: {body}")
+    summary = response.get("telemetry") or telemetry.summary()
+    return elapsed, peak, body, summary
+
+def measure(main, args, size):
+    timer = StageTimer()
+    timer.install()
+    e2e, peaks, llm, counters, jobs = [], [], {}, {}, 0
+    # Every keyword sees the whole pool, so each run fetches exactly `size` distinct jobs
+    fetch_jobs = load_stage("fetch-jobs")
+    fetch_jobs.ADZUNA_PAGES = max(1, math.ceil(size / RESULTS_PER_PAGE))
+    with StubAdzunaServer(total_jobs=size, latency=args.adzuna_latency, seed=args.seed, keyword_offsets=False) as stub:
+        fetch_jobs.adzuna_base_url = stub.base_url
+        for i in range(args.warmup + args.repeat):
+            elapsed, peak, body, summary = run_once(main, args)
+            if i < args.warmup:
+                timer.samples = {stage: [] for stage in STAGES}
+                continue
+            e2e.append(elapsed)
+            peaks.append(peak)
+            jobs = sum(cv.get("jobs") or (cv.get("stream") or {}).get("jobs_stored", 0) for cv in body["cvs"])
+            llm = summary.get("llm_totals", {})
+            counters = summary.get("counters", {})
+        adzuna_requests = stub.requests
+    return {
+        "jobs": size,
+        "jobs_stored": jobs,
+        "runs": len(e2e),
+        "end_to_end_seconds": percentiles(e2e),
+        "throughput_jobs_per_second": round(size / (sum(e2e) / len(e2e)), 2),
+        "peak_memory_mib": round(max(peaks) / 1024 / 1024, 2),
+        "stages": {stage: percentiles(samples) for stage, samples in timer.samples.items()},
+        "llm": llm,
+        "adzuna_requests": adzuna_requests,
+        "counters": counters,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(baseline, results):
+    # p50 and p95 changes against an earlier results file, positive means slower
+    print(f"Compared with {baseline.get('commit')} ({baseline.get('created')}):")
+    old_sizes = {run["jobs"]: run for run in baseline["sizes"]}
+    for run in results["sizes"]:
+        old = old_sizes.get(run["jobs"])
+        if not old:
+            continue
+        change = lambda new, before: f"{(new / before - 1) * 100:+.1f}%" if before else "n/a"
+        rows = [("end-to-end", run["end_to_end_seconds"], old["end_to_end_seconds"])]
+        rows += [(stage, run["stages"].get(stage, {}), old["stages"].get(stage, {})) for stage in STAGES]
+        for name, new, before in rows:
+            if new and before:
+                print(f"  {run['jobs']:>6} jobs {name:>24}: p50 {change(new['p50'], before['p50'])}, p95 {change(new['p95'], before['p95'])}")
+        print(f"  {run['jobs']:>6} jobs {'peak memory':>24}: {change(run['peak_memory_mib'], old['peak_memory_mib'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole pipeline offline against a fake LLM, a stub Adzuna server and in-memory S3.")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="jobs fetched per run")
+    parser.add_argument("--repeat", type=int, default=3, help="measured runs per size")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured runs per size")
+    parser.add_argument("--transport", choices=["lambda", "in-process"], default="lambda")
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="share of scoring calls failing with a 429")
+    parser.add_argument("--adzuna-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="pipeline_benchmark.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    load_stage("fetch-jobs").ADZUNA_RESULTS_PER_PAGE = RESULTS_PER_PAGE
+    s3 = FakeS3Client()
+    s3.put_object(Bucket=BUCKET, Key=CV_KEY, Body=make_pdf(2, seed=args.seed))
+    main_stage = install_fakes(args, s3)
+
+    results = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "sizes": [],
+    }
+    for size in map(int, args.sizes.split(",")):
+        run = measure(main_stage, args, size)
+        results["sizes"].append(run)
+        e2e = run["end_to_end_seconds"]
+        print(f"{size:>6} jobs: p50 {e2e['p50']}s, p95 {e2e['p95']}s, {run['throughput_jobs_per_second']} jobs/s, "
+              f"peak memory {run['peak_memory_mib']} MiB, {run['llm'].get('calls', 0)} LLM calls per run")
+        for stage, stats in run["stages"].items():
+            if stats:
+                print(f"        {stage:>24}: p50 {stats['p50']}s, p95 {stats['p95']}s over {stats['count']} calls")
+    results["s3_requests"] = s3.requests
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import csv
+import json
+import time
+import argparse
+
+import common  # noqa: F401 - only for its side effect, adds the Lambda functions folder to sys.path
+from fakes import make_cv, make_jobs
+from job_prefilter import prefilter_jobs
+
+def load_scored_jobs(path):
+    # Reads a job_matches.csv exported by store-job-matches-to-s3
+    jobs, scores = [], {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            jobs.append({
+                "id": row["Job ID"],
+                "title": row["Title"],
+                "category": {"label": ""},
+                "description": row["Description"],
+            })
+            scores[row["Job ID"]] = float(row["Score"] or 0)
+    return jobs, scores
+
+def recall(jobs, scores, cv, top_k, min_score):
+    relevant = {job_id for job_id, score in scores.items() if score >= min_score}
+    kept = {job["id"] for job in prefilter_jobs(jobs, cv, top_k=top_k, threshold=0)}
+    return len(relevant & kept) / len(relevant) if relevant else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prefilter latency and recall against LLM scores.")
+    parser.add_argument("--matches", help="job_matches.csv with LLM scores to use as the fixture set")
+    parser.add_argument("--cv", help="structured CV JSON file matching the fixture set")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--min-score", type=float, default=70, help="LLM score from which a job counts as relevant")
+    parser.add_argument("--sizes", default="100,1000,5000,10000")
+    args = parser.parse_args()
+
+    cv = make_cv()
+    for size in map(int, args.sizes.split(",")):
+        jobs = make_jobs(size)
+        start = time.perf_counter()
+        prefilter_jobs(jobs, cv, top_k=args.top_k)
+        print(f"{size:>6} jobs: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if args.matches and args.cv:
+        with open(args.cv, encoding="utf-8") as f:
+            cv = json.load(f)
+        jobs, scores = load_scored_jobs(args.matches)
+        print(f"Recall@{args.top_k} of jobs scored >= {args.min_score}: "
+              f"{recall(jobs, scores, cv, args.top_k, args.min_score):.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import re
+import copy
+import json
+import random
+import argparse
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("TELEMETRY_LOG_LEVEL", "WARNING")
+
+from common import estimate_tokens, load_stage
+from fakes import FakeMessage, make_cv
+import llm_backends
+import prompt_builder
+
+SKILLS = [
+    "python", "sql", "pytorch", "scikit-learn", "nlp", "docker", "aws", "spark", "java", "react",
+    "kubernetes", "excel", "sap", "tableau", "go", "terraform", "airflow", "salesforce",
+]
+FILLER = [
+    "You will join a growing team", "We offer flexible working hours", "Our customers rely on us",
+    "You take ownership of your projects", "We value collaboration &amp; open feedback",
+    "Relocation support is available", "You report to the head of the department",
+]
+
+def make_description(rng, long):
+    # Adzuna-like: HTML fragments and entities, cut at about 500 characters with an ellipsis.
+    # Every few postings come from sources that send the whole text.
+    sentences = []
+    while sum(map(len, sentences)) < (3000 if long else 700):
+        skills = rng.sample(SKILLS, 2)
+        if rng.random() < 0.5:
+            sentences.append(f"<p>Experience with <strong>{skills[0]}</strong> and {skills[1]} is required.</p>")
+        else:
+            sentences.append(f"{rng.choice(FILLER)}.&nbsp;  ")
+    text = " ".join(sentences)
+    return text if long else text[:500] + "…"
+
+def make_jobs(count, seed=0):
+    rng = random.Random(seed)
+    titles = ["Data Scientist", "Machine Learning Engineer", "Backend Developer", "Sales Manager", "Data Engineer",
+              "Accountant", "NLP Engineer", "Frontend Developer"]
+    return [{
+        "id": str(5000000000 + i),
+        "title": f"{rng.choice(titles)} {i}",
+        "company": {"display_name": f"Company {rng.randint(1, 500)}"},
+        "location": {"display_name": rng.choice(["Berlin", "Munich", "Remote"])},
+        "category": {"label": "IT Jobs"},
+        "description": make_description(rng, long=i % 5 == 0),
+    } for i in range(count)]
+
+class OverlapScoringModel:
+    # Offline stand-in for the scoring LLM: the share of the skills the job asks for that the candidate has.
+    # It reads only what the prompt contains, so anything the compact prompt drops shows up in the scores.
+    def invoke(self, prompt):
+        candidate, job = prompt.split("### Job Posting", 1)
+        job = job.split("### Instructions", 1)[0]
+        wanted = {skill for skill in SKILLS if re.search(rf"\b{re.escape(skill)}\b", job, re.IGNORECASE)}
+        has = {skill for skill in wanted if re.search(rf"\b{re.escape(skill)}\b", candidate, re.IGNORECASE)}
+        score = round(100 * len(has) / len(wanted)) if wanted else 0
+        return FakeMessage(json.dumps({"score": score, "reason": f"{len(has)} of {len(wanted)} skills"}))
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+def stats(samples):
+    ordered = sorted(samples)
+    return {"p50": ordered[len(ordered) // 2], "max": ordered[-1], "total": sum(ordered)}
+
+def token_report(jobs, cv, batch_size):
+    # Prompt tokens per stage, both styles built from the same inputs
+    job_scoring, parse_cv, keywords = load_stage("job-scoring"), load_stage("parse-cv"), load_stage("extract-job-keywords")
+    cv_text = "\n\n".join(f"{key}:   {value}" for key, value in cv.items())
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    prepared = prompt_builder.PreparedCV(cv)
+    prompts = {
+        "parse-cv": (
+            [parse_cv.build_verbose_prompt(cv_text)],
+            [parse_cv.build_prompt(cv_text)]),
+        "extract-job-keywords": (
+            [keywords.build_prompt(json.dumps(cv, indent=2))],
+            [keywords.build_prompt(prepared.digest)]),
+        "job-scoring": (
+            [job_scoring.build_verbose_scoring_prompt(job, cv) for job in jobs],
+            [job_scoring.build_scoring_prompt(job, cv, prepared) for job in jobs]),
+        f"job-scoring (batch {batch_size})": (
+            [job_scoring.build_verbose_batch_scoring_prompt(batch, cv) for batch in batches],
+            [job_scoring.build_batch_scoring_prompt(batch, cv, prepared) for batch in batches]),
+    }
+    report = {}
+    for stage, (verbose, compact) in prompts.items():
+        before, after = stats(map(estimate_tokens, verbose)), stats(map(estimate_tokens, compact))
+        report[stage] = {"verbose": before, "compact": after,
+                         "saved_percent": round(100 * (1 - after["total"] / before["total"]), 1)}
+    return report
+
+def ranks(values):
+    # Average ranks, ties share theirs
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    result = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            result[order[k]] = (i + j) / 2
+        i = j + 1
+    return result
+
+def spearman(a, b):
+    ra, rb = ranks(a), ranks(b)
+    mean_a, mean_b = sum(ra) / len(ra), sum(rb) / len(rb)
+    cov = sum((x - mean_a) * (y - mean_b) for x, y in zip(ra, rb))
+    var = (sum((x - mean_a) ** 2 for x in ra) * sum((y - mean_b) ** 2 for y in rb)) ** 0.5
+    return round(cov / var, 4) if var else 1.0
+
+def score_with(style, jobs, cv, model):
+    job_scoring = load_stage("job-scoring")
+    prompt_builder.PROMPT_STYLE = style
+    job_scoring.llm = model
+    scored = job_scoring.run({"jobs": copy.deepcopy(jobs), "cv": cv, "concurrency": 4})["jobs"]
+    return [json.loads(job["score"])["score"] for job in scored]
+
+def quality_check(jobs, cv, model, top):
+    # The same jobs scored with the previous and the compact prompt
+    verbose, compact = score_with("verbose", jobs, cv, model), score_with("compact", jobs, cv, model)
+    differences = [abs(a - b) for a, b in zip(verbose, compact)]
+    best = lambda scores: set(sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:top])
+    return {
+        "jobs": len(jobs),
+        "mean_abs_difference": round(sum(differences) / len(differences), 2),
+        "max_abs_difference": max(differences),
+        "spearman": spearman(verbose, compact),
+        "top": top,
+        "top_overlap": len(best(verbose) & best(compact)) / top,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt tokens and scores of the verbose and compact prompts.")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="size of the best-scored set compared between styles")
+    parser.add_argument("--live", action="store_true", help="score with the configured job-scoring backends (uses --live-jobs jobs)")
+    parser.add_argument("--live-jobs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cv, jobs = make_cv(), make_jobs(args.jobs, seed=args.seed)
+    tokens = token_report(jobs, cv, args.batch_size)
+    print(f"{'stage':>24} {'verbose p50':>12} {'compact p50':>12} {'verbose max':>12} {'compact max':>12} {'saved':>7}")
+    for stage, r in tokens.items():
+        print(f"{stage:>24} {r['verbose']['p50']:>12} {r['compact']['p50']:>12} {r['verbose']['max']:>12} "
+              f"{r['compact']['max']:>12} {r['saved_percent']:>6}%")
+
+    if args.live:
+        quality = quality_check(jobs[:args.live_jobs], cv, llm_backends.route("job-scoring"), min(args.top, args.live_jobs))
+    else:
+        quality = quality_check(jobs, cv, OverlapScoringModel(), args.top)
+    print(f"Scores verbose vs compact over {quality['jobs']} jobs: mean |diff| {quality['mean_abs_difference']}, "
+          f"max |diff| {quality['max_abs_difference']}, Spearman {quality['spearman']}, "
+          f"top-{quality['top']} overlap {quality['top_overlap']:.0%}")
+    print(json.dumps({"tokens": tokens, "quality": quality}, indent=2))
+
+if __name__ == "__main__":
+    main()
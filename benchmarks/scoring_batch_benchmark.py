@@ -0,0 +1,58 @@
+import os
+import copy
+import time
+import json
+import argparse
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+# Every batch size scores the same jobs, cached scores would hide its calls and tokens
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+
+from common import load_stage
+from fakes import FakeChatModel, make_cv, make_jobs
+
+def run(batch_size, jobs, cv, concurrency, latency, per_token_latency):
+    job_scoring = load_stage("job-scoring")
+    job_scoring.llm = FakeChatModel(latency=latency, per_token_latency=per_token_latency)
+    jobs = copy.deepcopy(jobs)
+    start = time.perf_counter()
+    job_scoring.lambda_handler({
+        "jobs": jobs,
+        "cv": cv,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "rate_per_second": 0,
+    }, None)
+    elapsed = time.perf_counter() - start
+    llm = job_scoring.llm
+    return {
+        "batch_size": batch_size,
+        "llm_calls": llm.calls,
+        "prompt_tokens_per_job": round(llm.prompt_tokens / len(jobs), 1),
+        "completion_tokens_per_job": round(llm.completion_tokens / len(jobs), 1),
+        "wall_clock_ms_per_job": round(elapsed * 1000 / len(jobs), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and batched job scoring prompts.")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--batch-sizes", default="1,5,10,20")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM base latency in seconds")
+    parser.add_argument("--per-token-latency", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    cv, jobs = make_cv(), make_jobs(args.jobs)
+    results = [
+        run(int(batch_size), jobs, cv, args.concurrency, args.latency, args.per_token_latency)
+        for batch_size in args.batch_sizes.split(",")
+    ]
+    print(f"{'batch':>5} {'calls':>6} {'prompt tok/job':>15} {'completion tok/job':>19} {'ms/job':>8}")
+    for r in results:
+        print(f"{r['batch_size']:>5} {r['llm_calls']:>6} {r['prompt_tokens_per_job']:>15} "
+              f"{r['completion_tokens_per_job']:>19} {r['wall_clock_ms_per_job']:>8}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_RATE_PER_SECOND", "0")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("ADZUNA_CACHE_BACKEND", "none")
+# The prefilter ranks per page when streaming and over all jobs in batch mode, a threshold would keep
+# different jobs in the two modes. Without one both modes score and store the same jobs.
+os.environ.setdefault("PREFILTER_THRESHOLD", "0")
+
+from common import load_stage
+from fakes import FakeChatModel, make_cv
+from stub_adzuna import StubAdzunaServer
+
+KEYWORDS = ["data science", "machine learning", "natural language processing"]
+
+def run_batch(cv, email, fetch_options):
+    # The same steps as the streaming pipeline, one stage after the other over all jobs
+    from job_prefilter import prefilter_jobs
+    from job_dedup import dedup_jobs, propagate_scores
+    start = time.perf_counter()
+    jobs = load_stage("fetch-jobs").fetch_jobs(KEYWORDS, **fetch_options)
+    jobs, duplicates = dedup_jobs(jobs)
+    jobs = prefilter_jobs(jobs, cv, top_k=0)
+    scored = load_stage("job-scoring").run({"jobs": jobs, "cv": cv})["jobs"]
+    jobs = propagate_scores(scored, duplicates)
+    load_stage("store-job-matches-to-s3").run({"email": email, "jobs": jobs})
+    elapsed = round(time.perf_counter() - start, 4)
+    return {"jobs_scored": len(scored), "jobs_stored": len(jobs), "time_to_first_result": elapsed, "elapsed": elapsed}
+
+def run_streaming(cv, email, fetch_options):
+    from pipeline_stream import StreamingPipeline
+    return StreamingPipeline(cv, email).run(KEYWORDS, **fetch_options)
+
+def measure(name, runner, cv, fetch_options, llm_latency):
+    load_stage("job-scoring").llm = FakeChatModel(latency=llm_latency)
+    from object_store import LocalObjectStore
+    from match_store import MatchStore
+    load_stage("store-job-matches-to-s3").match_store = MatchStore(LocalObjectStore(tempfile.mkdtemp()))
+    tracemalloc.start()
+    stats = runner(cv, f"{name}@example.com", fetch_options)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Near-duplicate clusters depend on the order pages arrive in, so the scored counts can differ slightly
+    print(f"{name:>9}: {stats['jobs_scored']} jobs scored, {stats['jobs_stored']} stored, "
+          f"first result after {stats['time_to_first_result']}s, total {stats['elapsed']}s, "
+          f"{1000 * stats['elapsed'] / max(1, stats['jobs_stored']):.2f} ms per stored job, "
+          f"peak memory {peak / 1024 / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batch and streaming fetch -> score -> store.")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--results-per-page", type=int, default=20)
+    parser.add_argument("--adzuna-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with StubAdzunaServer(total_jobs=5000, latency=args.adzuna_latency) as stub:
+        os.environ["ADZUNA_BASE_URL"] = stub.base_url
+        cv = make_cv()
+        fetch_options = {"pages": args.pages, "results_per_page": args.results_per_page}
+        measure("batch", run_batch, cv, fetch_options, args.llm_latency)
+        measure("streaming", run_streaming, cv, fetch_options, args.llm_latency)
@@ -0,0 +1,104 @@
+import re
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fakes import make_jobs
+
+SEARCH_PATH = re.compile(r"^/(?P<country>[a-z]{2})/search/(?P<page>\d+)$")
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+class StubAdzunaServer:
+    # Serves /<country>/search/<page> like the Adzuna jobs API, with configurable latency and 429s.
+    # error_statuses are answered, in order, to the first requests.
+    def __init__(self, total_jobs=1000, latency=0.0, rate_limit_rate=0.0, seed=0, keyword_offsets=True, error_statuses=()):
+        self.jobs = make_jobs(total_jobs, seed=seed)
+        self.keyword_offsets = keyword_offsets
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.error_statuses = list(error_statuses)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = StubHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def search(self, keyword, country, page, per_page):
+        # Each keyword sees a deterministic, overlapping slice of the job pool, newest first,
+        # or the whole pool without keyword_offsets
+        offset = sum(map(ord, keyword + country)) % max(1, len(self.jobs) // 2) if self.keyword_offsets else 0
+        start = offset + (page - 1) * per_page
+        return self.jobs[start:start + per_page]
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = stub.error_statuses.pop(0) if stub.error_statuses else None
+                    if status is None and stub.random.random() < stub.rate_limit_rate:
+                        status = 429
+                try:
+                    time.sleep(stub.latency)
+                    response = self.respond(status)
+                finally:
+                    # Counted as finished before the reply is sent, so max_in_flight never overcounts the client
+                    with stub.lock:
+                        stub.in_flight -= 1
+                self.reply(*response)
+
+            def respond(self, status):
+                url = urlparse(self.path)
+                match = SEARCH_PATH.match(url.path)
+                if status is not None:
+                    return status, {"error": "rate limited" if status == 429 else "unavailable"}, {"Retry-After": "0"}
+                if not match:
+                    return 404, {"error": "not found"}
+                params = parse_qs(url.query)
+                results = stub.search(
+                    params.get("what", [""])[0],
+                    match.group("country"),
+                    int(match.group("page")),
+                    int(params.get("results_per_page", ["10"])[0]),
+                )
+                return 200, {"count": len(stub.jobs), "results": results}
+
+            def reply(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
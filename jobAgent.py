@@ -1,19 +1,23 @@
-import csv
 import os
 import re
 import sys
 from pathlib import Path
-from PyPDF2 import PdfReader
 
 from browser_use.browser.browser import Browser, BrowserConfig
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Shared helpers (CV cache) live next to the Lambda functions
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Lambda functions"))
+import cv_cache
+import llm_backends
+import page_cache
+import telemetry
+from job_store import JobStore, JOBS_CSV_PATH
 
 import asyncio
 from typing import List, Optional
 
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, SecretStr
 
 from browser_use import ActionResult, Agent, Controller
@@ -22,20 +26,21 @@ from browser_use.browser.context import BrowserContext
 load_dotenv()
 import logging
 
-logging.basicConfig(handlers=[logging.FileHandler(
-                                        filename='Job Agent.log', 
-                                        encoding='utf-8', 
-                                        mode='w+')],
-                    format="%(asctime)s %(name)s:%(levelname)s:%(message)s", 
-                    datefmt="%F %A %T",
-                    level=logging.DEBUG
-)
+# Every logger (browser_use included) only queues its records, a background thread writes them as JSON lines
+telemetry.configure(path='Job Agent.log', level=os.getenv("AGENT_LOG_LEVEL", "INFO"), mode='w', root=True)
 
 controller = Controller()
 
 CV = os.getenv("CV_PATH")
 logging.info(f"CV path = {CV}")
 
+job_store = JobStore()
+if job_store.count() == 0 and os.path.exists(JOBS_CSV_PATH):
+    # Jobs saved to jobs.csv before the store existed
+    logging.info(f"Imported {job_store.import_csv(JOBS_CSV_PATH)} jobs from {JOBS_CSV_PATH}")
+
+save_counts = {"inserted": 0, "updated": 0}
+
 class Job(BaseModel):
     title: str
     link: str
@@ -45,27 +50,86 @@ class Job(BaseModel):
     salary: Optional[str] = None
     cover_letter: Optional[str] = None
 
+class JobPage(BaseModel):
+    url: str
+
+class JobQuery(BaseModel):
+    min_fit_score: Optional[float] = None
+    company: Optional[str] = None
+    location: Optional[str] = None
+    limit: int = 20
+    page: int = 1
+
 @controller.action("Save jobs to file - with a score how well it fits to my profile", param_model=Job)
 def save_jobs(job:Job):
-    with open("jobs.csv","a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([job.title, job.company, job.fit_score, job.link, job.salary, job.location, job.cover_letter])
+    # Deduplicated by link and by company + title, also across parallel sub-tasks
+    with telemetry.span("agent.save_jobs"):
+        outcome = job_store.save(job.model_dump())
+    save_counts[outcome] += 1
+    if outcome == "updated":
+        return "Job was already saved, updated it"
     return "Saved Job to file"
 
-@controller.action("Read jobs from file")
-def read_jobs():
-    with open("jobs.csv","r", newline="") as f:
-        jobs = f.read()
-    f.close()
-    return jobs
+@controller.action(
+    "Read saved jobs - filter by min_fit_score, company or location, returns one page of at most limit jobs",
+    param_model=JobQuery,
+)
+def read_jobs(query:JobQuery):
+    limit = max(1, min(query.limit, 100))
+    offset = (max(1, query.page) - 1) * limit
+    with telemetry.span("agent.read_jobs"):
+        rows, total = job_store.query(query.min_fit_score, query.company, query.location, limit, offset)
+    if not rows:
+        return f"No saved jobs match (total matches: {total})"
+    # Cover letters are left out to keep the context small
+    lines = [f"Jobs {offset + 1}-{offset + len(rows)} of {total} (page {max(1, query.page)}):"]
+    for row in rows:
+        lines.append(f"- {row['title']} | {row['company']} | {row['location'] or ''} | fit {row['fit_score']} | {row['link']}")
+    return "\n".join(lines)
+
+@controller.action("Export saved jobs to the jobs CSV file")
+def export_jobs():
+    return f"Exported {job_store.export_csv(JOBS_CSV_PATH)} jobs to {JOBS_CSV_PATH}"
+
+@controller.action("Check if I have already seen this job - pass the link of the job posting", param_model=JobPage)
+def have_seen_job(page:JobPage):
+    # Links differing only in tracking parameters, fragment or trailing slash are the same job
+    cached = page_cache.get_page(page.url)
+    if cached is None:
+        return "Not seen yet, open it with read_job_page"
+    return f"Already seen: {cached['title'] or cached['url']}. Use get_cached_job_description instead of opening it again"
+
+@controller.action("Get cached job description - pass the link of the job posting", param_model=JobPage)
+def get_cached_job_description(page:JobPage):
+    cached = page_cache.serve_page(page.url)
+    if cached is None:
+        return ActionResult(error="No cached description for this job, open it with read_job_page")
+    return ActionResult(extracted_content=cached["text"], include_in_memory=True)
+
+@controller.action(
+    "Read job page - opens the job posting and returns its description, served from the cache if it was read before",
+    param_model=JobPage,
+    requires_browser=True,
+)
+async def read_job_page(page:JobPage, browser:BrowserContext):
+    cached = page_cache.serve_page(page.url)
+    if cached is not None:
+        return ActionResult(extracted_content=cached["text"], include_in_memory=True)
+    with telemetry.span("agent.page_load"):
+        tab = await browser.get_current_page()
+        await tab.goto(page.url)
+        await tab.wait_for_load_state()
+        text = await tab.inner_text("body")
+    page_cache.put_page(page.url, text, await tab.title())
+    logging.info(f"Cached job page {page.url} with {len(text)} characters")
+    return ActionResult(extracted_content=text[:page_cache.PAGE_CACHE_MAX_CHARS], include_in_memory=True)
 
 @controller.action("Read my CV for context to fill forms")
 def read_cv():
-    pdf = PdfReader(CV)
-    text = ""
-    for page in pdf.pages:
-        text += page.extract_text() or ""
-	
+    # Served from the CV cache until the PDF's content changes
+    text, pdf_sha256 = cv_cache.read_pdf_text(CV)
+
+    logging.info(f"CV cache stats: {cv_cache.stats()}")
     logging.info(f"Read CV with {len(text)} characters")
     print(f"Read CV with {len(text)} characters")
     return ActionResult(extracted_content=text, include_in_memory=True)
@@ -110,12 +174,72 @@ browser = Browser(
 	)
 )
 
+# "split" partitions the search into sub-tasks by keyword, city and results page that run in parallel
+AGENT_MODE = os.getenv("AGENT_MODE", "single")
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "3"))
+SEARCH_KEYWORDS = [k.strip() for k in os.getenv("SEARCH_KEYWORDS", "machine learning,data scientist").split(",") if k.strip()]
+SEARCH_CITIES = [c.strip() for c in os.getenv("SEARCH_CITIES", "Berlin,Munich,Hamburg,Frankfurt").split(",") if c.strip()]
+SEARCH_PAGES = int(os.getenv("SEARCH_PAGES", "1"))
+JOBS_PER_TASK = int(os.getenv("JOBS_PER_TASK", "10"))
+
+def build_sub_tasks(keywords, cities, pages, jobs_per_task):
+	tasks = []
+	for keyword in keywords:
+		for city in cities:
+			for page in range(1, pages + 1):
+				tasks.append(
+					'You are a professional job finder. '
+					'1. Read my cv with read_cv.'
+					'2. Go to https://www.google.de.'
+					f'3. Search for full time {keyword} jobs in {city}, Germany and open results page {page}. '
+					f'Find up to {jobs_per_task} jobs on that page only. Go through each job details with read_job_page and save them to a file.'
+					'4. Make sure the job is for 0 experience professionals and does not requires German language proficiency.'
+					'5. Go through the job description and create a short cover letter implying my strong skills for the job. In salutation add my full name and then my email address.'
+					'6. Use read_jobs with the company to skip jobs that are already saved.'
+				)
+	return tasks
+
+class BrowserContextPool:
+	# At most `size` contexts on the shared browser, handed from one sub-task to the next
+	def __init__(self, browser, size):
+		self.browser = browser
+		self.size = max(1, size)
+		self.idle = asyncio.Queue()
+		self.created = 0
+		self.lock = asyncio.Lock()
+
+	async def acquire(self):
+		async with self.lock:
+			if self.idle.empty() and self.created < self.size:
+				self.created += 1
+				return await self.browser.new_context()
+		return await self.idle.get()
+
+	def release(self, context):
+		self.idle.put_nowait(context)
+
+	async def close(self):
+		while not self.idle.empty():
+			await self.idle.get_nowait().close()
+
+async def run_sub_task(task, llm, pool):
+	context = await pool.acquire()
+	try:
+		agent = Agent(task=task, llm=llm, controller=controller, browser=browser, browser_context=context)
+		with telemetry.span("agent.sub_task"):
+			await agent.run()
+	except Exception as e:
+		# One failing sub-task does not stop the others
+		logging.error(f"Sub-task failed: {e}")
+	finally:
+		pool.release(context)
+
 async def main():
 	ground_task = (
 		'You are a professional job finder. '
 		'1. Read my cv with read_cv.'
 		'2. Go to https://www.google.de.'
-		'3. Find 100 full time jobs in machine learning/data scientist. Go through each job details and save them to a file.'
+		'3. Find 100 full time jobs in machine learning/data scientist. Go through each job details with read_job_page and save them to a file.'
 		'4. Make sure the job is for 0 experience professionals and does not requires German language proficiency.'
 		'5. Go through the job description and create a short cover letter implying my strong skills for the job. In salutation add my full name and then my email address.'
 		'6. search in all the companies in Germany.'
@@ -124,15 +248,35 @@ async def main():
 		ground_task
 	]
 
-	#llm = ChatOpenAI(model="deepseek-r1:8b",base_url="http://localhost:11434/v1",api_key=os.getenv("DEEPSEEK_API"))
-	llm = ChatGoogleGenerativeAI(model='gemini-2.0-flash-exp', api_key=os.getenv("GEMINI_API"))
+	# Gemini, an OpenAI-compatible API or a local server, chosen by LLM_BACKENDS_AGENT (see llm_backends.py).
+	# Latency and tokens of every call the agent makes end up in the run summary
+	llm_callback = telemetry.LLMCallback()
+	backend, llm = llm_backends.chat_model("agent", callbacks=[llm_callback])
+	llm_callback.model = backend.model
+	telemetry.start_run("jobAgent")
 
-	agents = []
-	for task in tasks:
-		agent = Agent(task=task, llm=llm, controller=controller, browser=browser)
-		agents.append(agent)
+	if AGENT_MODE == "split":
+		# Every sub-task gets its own context from the pool, saved jobs are deduplicated by the job store
+		tasks = build_sub_tasks(SEARCH_KEYWORDS, SEARCH_CITIES, SEARCH_PAGES, JOBS_PER_TASK)
+		pool = BrowserContextPool(browser, AGENT_CONCURRENCY)
+		logging.info(f"Running {len(tasks)} sub-tasks with {pool.size} browser contexts")
+		try:
+			await asyncio.gather(*[run_sub_task(task, llm, pool) for task in tasks])
+		finally:
+			await pool.close()
+	else:
+		agents = []
+		for task in tasks:
+			agent = Agent(task=task, llm=llm, controller=controller, browser=browser)
+			agents.append(agent)
 
-	await asyncio.gather(*[agent.run() for agent in agents])
+		await asyncio.gather(*[agent.run() for agent in agents])
+	logging.info(f"Saved jobs this run: {save_counts}")
+	logging.info(f"Page cache stats: {page_cache.stats()}")
+	# jobs.csv stays available as an export of the job store
+	logging.info(f"Exported {job_store.export_csv(JOBS_CSV_PATH)} jobs to {JOBS_CSV_PATH}")
+	run_summary = telemetry.report()
+	print(f"LLM usage this run: {run_summary['llm_totals']}, took {run_summary['seconds']}s")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,136 @@
+import os
+import re
+import csv
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite")
+JOBS_CSV_PATH = os.getenv("JOBS_CSV_PATH", "jobs.csv")
+
+# Column order of jobs.csv, kept for the CSV export
+CSV_COLUMNS = ["title", "company", "fit_score", "link", "salary", "location", "cover_letter"]
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "gclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "ref", "refid", "referrer", "trk", "trackingid", "tk", "from", "src", "source", "si", "sid",
+}
+
+def normalize_url(url):
+    # Same posting behind a different scheme, "www.", fragment, trailing slash, parameter order or tracking parameters
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith("www.") else host
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit(("", host, parts.path.rstrip("/"), urlencode(query), "")).lstrip("/")
+
+def link_key(link):
+    return normalize_url(link)
+
+def company_title_key(company, title):
+    normalize = lambda value: re.sub(r"\s+", " ", (value or "").strip().casefold())
+    return f"{normalize(company)}|{normalize(title)}"
+
+class JobStore:
+    # Jobs found by the browser agent, deduplicated by link and by company + title
+    def __init__(self, path=JOB_STORE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, title TEXT, company TEXT, fit_score REAL, link TEXT, "
+            "salary TEXT, location TEXT, cover_letter TEXT, link_key TEXT, company_title_key TEXT NOT NULL, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_link_key ON jobs (link_key) WHERE link_key != ''")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_company_title_key ON jobs (company_title_key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_fit_score ON jobs (fit_score)")
+        self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def save(self, job):
+        # Returns "inserted", or "updated" when the job was already saved under the same link or company + title
+        keys = (link_key(job.get("link")), company_title_key(job.get("company"), job.get("title")))
+        now = time.time()
+        with self.lock:
+            existing = self.conn.execute(
+                "SELECT id FROM jobs WHERE (link_key = ? AND link_key != '') OR company_title_key = ? ORDER BY id",
+                keys
+            ).fetchall()
+            if not existing:
+                self.conn.execute(
+                    "INSERT INTO jobs (title, company, fit_score, link, salary, location, cover_letter, "
+                    "link_key, company_title_key, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [job.get(column) for column in CSV_COLUMNS] + list(keys) + [now, now]
+                )
+                self.conn.commit()
+                return "inserted"
+            # The link and the company + title may point at two different rows, keep the first one
+            job_id = existing[0]["id"]
+            for duplicate in existing[1:]:
+                self.conn.execute("DELETE FROM jobs WHERE id = ?", (duplicate["id"],))
+            # Fields missing from the new sighting keep their saved value
+            self.conn.execute(
+                "UPDATE jobs SET title = COALESCE(?, title), company = COALESCE(?, company), "
+                "fit_score = COALESCE(?, fit_score), link = COALESCE(?, link), salary = COALESCE(?, salary), location = COALESCE(?, location), "
+                "cover_letter = COALESCE(?, cover_letter), link_key = CASE WHEN ? != '' THEN ? ELSE link_key END, "
+                "company_title_key = ?, updated = ? WHERE id = ?",
+                [job.get(column) for column in CSV_COLUMNS] + [keys[0], keys[0], keys[1], now, job_id]
+            )
+            self.conn.commit()
+            return "updated"
+
+    def query(self, min_fit_score=None, company=None, location=None, limit=20, offset=0):
+        # Returns (matching rows, best fit first, total number of matches)
+        conditions, params = [], []
+        if min_fit_score is not None:
+            conditions.append("fit_score >= ?")
+            params.append(min_fit_score)
+        if company:
+            conditions.append("instr(lower(company), lower(?)) > 0")
+            params.append(company)
+        if location:
+            conditions.append("instr(lower(location), lower(?)) > 0")
+            params.append(location)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY fit_score IS NULL, fit_score DESC, id LIMIT ? OFFSET ?",
+                params + [max(0, limit), max(0, offset)]
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def export_csv(self, path=JOBS_CSV_PATH):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(CSV_COLUMNS)} FROM jobs ORDER BY id").fetchall()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(rows)
+        return len(rows)
+
+    def import_csv(self, path=JOBS_CSV_PATH):
+        # Loads a jobs.csv written by the old save_jobs (no header, CSV_COLUMNS order)
+        imported = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for values in csv.reader(f):
+                if not values or values == CSV_COLUMNS:
+                    continue
+                job = dict(zip(CSV_COLUMNS, values + [None] * (len(CSV_COLUMNS) - len(values))))
+                try:
+                    job["fit_score"] = float(job["fit_score"]) if job["fit_score"] else None
+                except ValueError:
+                    job["fit_score"] = None
+                self.save({column: value if value != "" else None for column, value in job.items()})
+                imported += 1
+        return imported
@@ -0,0 +1,32 @@
+import os
+# cache_store is one of the shared helpers in the Lambda functions folder, jobAgent.py puts it on sys.path
+from job_store import normalize_url
+from cache_store import content_hash, make_cache
+
+# Job pages the agent has read, so a posting is not opened and read again within the TTL
+PAGE_CACHE_MAX_CHARS = int(os.getenv("PAGE_CACHE_MAX_CHARS", "20000"))
+page_cache = make_cache("visited-pages", "PAGE_CACHE", "page-cache.sqlite", default_ttl=7 * 24 * 3600)
+
+counters = {"saved_visits": 0, "pages_cached": 0}
+
+def page_key(url):
+    return content_hash(normalize_url(url))
+
+def get_page(url):
+    # Returns the cached {"url", "title", "text"} or None, a plain lookup that saves no visit
+    return page_cache.get(page_key(url))
+
+def serve_page(url):
+    # Like get_page, for a cached page that replaces opening the posting, so it counts as a saved visit
+    page = get_page(url)
+    if page is not None:
+        counters["saved_visits"] += 1
+    return page
+
+def put_page(url, text, title=None):
+    page_cache.set(page_key(url), {"url": normalize_url(url), "title": title, "text": (text or "")[:PAGE_CACHE_MAX_CHARS]})
+    counters["pages_cached"] += 1
+    page_cache.evict()
+
+def stats():
+    return dict(page_cache.stats(), **counters)
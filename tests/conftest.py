@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Lambda stages import their shared modules by name, the benchmarks folder holds the stub servers and fakes,
+# the agent's modules sit at the top level
+for folder in ("", "Lambda functions", "benchmarks"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+os.environ.setdefault("TELEMETRY_LOG_LEVEL", "WARNING")
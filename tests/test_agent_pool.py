@@ -0,0 +1,146 @@
+import os
+import re
+import asyncio
+import threading
+import importlib
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip("browser_use")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from browser_use.browser.browser import Browser, BrowserConfig
+
+JOB_LINK = re.compile(r"http://127\.0\.0\.1:\d+/jobs/\d+\.html")
+JOB_COUNT = 6
+POOL_SIZE = 2
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def job_site(tmp_path_factory):
+    # Static job postings served from a local http.server
+    site = tmp_path_factory.mktemp("site")
+    (site / "jobs").mkdir()
+    for i in range(JOB_COUNT):
+        (site / "jobs" / f"{i}.html").write_text(
+            f"<html><head><title>Data Scientist {i}</title></head><body><h1>Data Scientist {i}</h1>"
+            f"<p>Description {i}: Python, SQL and machine learning for our analytics team.</p></body></html>",
+            encoding="utf-8",
+        )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(site)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(scope="module")
+def job_agent(tmp_path_factory):
+    # jobAgent writes its log, job store and page cache relative to the working directory
+    workdir = tmp_path_factory.mktemp("agent")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield importlib.import_module("jobAgent")
+    finally:
+        os.chdir(cwd)
+
+class ScriptedAgentModel:
+    # Offline stand-in for the agent's LLM: reads the posting linked in the task, then finishes
+    model_name = "scripted"
+
+    def __init__(self):
+        self.steps = {}
+
+    def with_structured_output(self, schema, include_raw=False, method=None):
+        model = self
+
+        class Structured:
+            async def ainvoke(self, messages):
+                link = next(match.group() for message in messages for match in [JOB_LINK.search(str(message.content))] if match)
+                step = model.steps.get(link, 0)
+                model.steps[link] = step + 1
+                action = {"read_job_page": {"url": link}} if step == 0 else {"done": {"text": f"Read {link}"}}
+                state = {"evaluation_previous_goal": "Success", "memory": "", "next_goal": ""}
+                return {"parsed": schema.model_validate({"current_state": state, "action": [action]}), "raw": None}
+
+        return Structured()
+
+def record_agents(monkeypatch, job_agent):
+    agents = []
+
+    class RecordingAgent(job_agent.Agent):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            agents.append(self)
+
+    monkeypatch.setattr(job_agent, "Agent", RecordingAgent)
+    return agents
+
+def tasks_for(job_site):
+    return [f"Open the job posting {job_site}/jobs/{i}.html with read_job_page." for i in range(JOB_COUNT)]
+
+async def launch(browser):
+    try:
+        await browser.get_playwright_browser()
+    except Exception as e:
+        await browser.close()
+        pytest.skip(f"No browser for Playwright: {e}")
+
+def test_pooled_agents_reuse_contexts_and_extract_every_page(job_agent, job_site, monkeypatch):
+    agents = record_agents(monkeypatch, job_agent)
+    browser = Browser(config=BrowserConfig(headless=True, disable_security=True))
+    monkeypatch.setattr(job_agent, "browser", browser)
+
+    async def run():
+        await launch(browser)
+        pool = job_agent.BrowserContextPool(browser, POOL_SIZE)
+        try:
+            await asyncio.gather(*[job_agent.run_sub_task(task, ScriptedAgentModel(), pool) for task in tasks_for(job_site)])
+            return pool.created, pool.idle.qsize()
+        finally:
+            await pool.close()
+            await browser.close()
+
+    created, idle = asyncio.run(run())
+    # Six sub-tasks ran on two contexts, handed back to the pool after each one
+    assert (created, idle) == (POOL_SIZE, POOL_SIZE)
+    contexts = {id(agent.browser_context) for agent in agents}
+    assert len(agents) == JOB_COUNT and len(contexts) == POOL_SIZE
+    assert all(agent.injected_browser_context and agent.history.is_done() for agent in agents)
+    for i in range(JOB_COUNT):
+        page = job_agent.page_cache.get_page(f"{job_site}/jobs/{i}.html")
+        assert page is not None and f"Description {i}:" in page["text"]
+
+def test_agents_get_the_pooled_context(job_agent, job_site, monkeypatch):
+    # The pinned browser_use Agent takes the pool's context as browser_context and keeps it open after the run
+    agents = record_agents(monkeypatch, job_agent)
+    monkeypatch.setattr(job_agent.Agent, "run", lambda self: asyncio.sleep(0.01))
+    browser = Browser(config=BrowserConfig(headless=True))
+    monkeypatch.setattr(job_agent, "browser", browser)
+
+    async def run():
+        pool = job_agent.BrowserContextPool(browser, POOL_SIZE)
+        await asyncio.gather(*[job_agent.run_sub_task(task, ScriptedAgentModel(), pool) for task in tasks_for(job_site)])
+        return pool
+
+    pool = asyncio.run(run())
+    pooled = {id(pool.idle.get_nowait()) for _ in range(pool.idle.qsize())}
+    assert pool.created == POOL_SIZE and len(pooled) == POOL_SIZE
+    assert {id(agent.browser_context) for agent in agents} == pooled
+    assert all(agent.injected_browser_context and agent.browser is browser for agent in agents)
+
+def test_a_seen_check_saves_no_visit(job_agent, monkeypatch):
+    # Only a cached description that replaces opening the posting counts as a saved visit
+    monkeypatch.setitem(job_agent.page_cache.counters, "saved_visits", 0)
+    page = job_agent.JobPage(url="https://jobs.example.com/posting/42?utm_source=feed")
+    assert job_agent.have_seen_job(page).startswith("Not seen yet")
+    job_agent.page_cache.put_page("https://jobs.example.com/posting/42", "Description 42", "Posting 42")
+    assert job_agent.have_seen_job(page).startswith("Already seen: Posting 42")
+    assert job_agent.page_cache.counters["saved_visits"] == 0
+    assert job_agent.get_cached_job_description(page).extracted_content == "Description 42"
+    assert job_agent.page_cache.counters["saved_visits"] == 1
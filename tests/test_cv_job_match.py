@@ -0,0 +1,93 @@
+import os
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+os.environ.setdefault("ADZUNA_CACHE_BACKEND", "none")
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import checkpoints
+import fetch_state
+import llm_client
+from fakes import FakeChatModel, make_cv
+from match_store import MatchStore
+from object_store import LocalObjectStore
+from stage_loader import load_stage
+from stub_adzuna import StubAdzunaServer
+
+main = load_stage("Main-cv-job-match")
+fetch_jobs = load_stage("fetch-jobs")
+job_scoring = load_stage("job-scoring")
+store_stage = load_stage("store-job-matches-to-s3")
+
+RECORD = {"s3": {"bucket": {"name": "cvs"}, "object": {"key": "cvs/test.pdf", "eTag": "1"}}}
+
+class OutageModel(FakeChatModel):
+    # Fails the scoring calls of the listed job titles while down
+    def __init__(self, failing_titles):
+        super().__init__()
+        self.failing_titles = failing_titles
+        self.down = True
+
+    def respond(self, prompt):
+        if self.down and any(f"Title: {title}\n" in prompt for title in self.failing_titles):
+            raise RuntimeError("model unavailable")
+        return super().respond(prompt)
+
+class CannedTransport(main.InProcessTransport):
+    # The CV stages answer from fixed results, fetching, scoring and storing run for real on threads
+    def call(self, function_name, payload):
+        if function_name == "extract-cv-text":
+            return {"cv_text": ["Data scientist"], "pdf_sha256": None}
+        if function_name == "parse-cv":
+            return {"parsed_cv": make_cv()}
+        if function_name == "extract-job-keywords":
+            return {"keywords": ["data science"]}
+        return super().call(function_name, payload)
+
+    def executor(self, max_workers):
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    with StubAdzunaServer(total_jobs=30, keyword_offsets=False) as stub:
+        monkeypatch.setattr(fetch_jobs, "adzuna_base_url", stub.base_url)
+        monkeypatch.setattr(fetch_jobs, "ADZUNA_INCREMENTAL", True)
+        monkeypatch.setattr(fetch_jobs, "ADZUNA_COUNTRIES", ["de"])
+        monkeypatch.setattr(fetch_jobs, "ADZUNA_PAGES", 1)
+        monkeypatch.setattr(fetch_jobs, "ADZUNA_RESULTS_PER_PAGE", 30)
+        monkeypatch.setattr(fetch_jobs, "WatermarkStore", lambda path: fetch_state.WatermarkStore(str(tmp_path / "fetch-state.json")))
+        monkeypatch.setattr(checkpoints, "checkpoint_store", LocalObjectStore(str(tmp_path / "checkpoints")))
+        monkeypatch.setattr(store_stage, "match_store", MatchStore(LocalObjectStore(str(tmp_path / "matches"))))
+        yield stub
+
+def run_pipeline(etag):
+    transport = CannedTransport()
+    cv_run = main.prepare_cv(transport, {"s3": dict(RECORD["s3"], object=dict(RECORD["s3"]["object"], eTag=etag))})
+    main.match_cvs(transport, [cv_run])
+    return cv_run
+
+def test_jobs_that_fail_scoring_are_requeued_by_the_next_run(pipeline, monkeypatch):
+    failing = pipeline.jobs[:3]
+    model = OutageModel([job["title"] for job in failing])
+    llm_client.set_rate(model, 0)
+    monkeypatch.setattr(job_scoring, "llm", model)
+
+    first = run_pipeline("1")
+    assert first["stored"]
+    assert {job["id"] for job in first["unscored"]} >= {job["id"] for job in failing}
+    assert not set(store_stage.match_store.read_matches(first["email"])) & {str(job["id"]) for job in first["unscored"]}
+
+    # The watermark already covers every posting, the failed jobs only come back from the queue
+    model.down = False
+    second = run_pipeline("2")
+    assert second["stored"] and not second["unscored"]
+    assert {job["id"] for job in second["jobs"]} == {job["id"] for job in first["unscored"]}
+    matches = store_stage.match_store.read_matches(second["email"])
+    assert all(matches[str(job["id"])]["Score"] not in (None, "") for job in first["unscored"])
+
+    # Once stored, nothing is left to requeue
+    assert run_pipeline("3")["jobs"] == []
@@ -0,0 +1,68 @@
+import os
+
+os.environ.setdefault("ADZUNA_CACHE_BACKEND", "none")
+
+import pytest
+import requests
+
+from stage_loader import load_stage
+from stub_adzuna import StubAdzunaServer
+
+fetch_jobs = load_stage("fetch-jobs")
+
+@pytest.fixture
+def stub(request, monkeypatch):
+    with StubAdzunaServer(**getattr(request, "param", {})) as server:
+        monkeypatch.setattr(fetch_jobs, "adzuna_base_url", server.base_url)
+        yield server
+
+@pytest.mark.parametrize("stub", [{"total_jobs": 100, "keyword_offsets": False}], indirect=True)
+def test_fetches_every_page_in_order(stub):
+    jobs = fetch_jobs.fetch_jobs(["data science"], countries=["de"], pages=5, results_per_page=20)
+    assert stub.requests == 5
+    assert [job["id"] for job in jobs] == [job["id"] for job in stub.jobs]
+
+@pytest.mark.parametrize("stub", [{"total_jobs": 100, "keyword_offsets": False}], indirect=True)
+def test_streamed_pages_are_complete(stub):
+    pages = list(fetch_jobs.iter_job_pages(["data science"], countries=["de"], pages=5, results_per_page=20))
+    assert sorted(job["id"] for page in pages for job in page) == sorted(job["id"] for job in stub.jobs)
+
+@pytest.mark.parametrize("stub", [{"total_jobs": 2000, "latency": 0.05}], indirect=True)
+def test_requests_in_flight_stay_within_max_workers(stub, monkeypatch):
+    monkeypatch.setattr(fetch_jobs, "ADZUNA_MAX_WORKERS", 4)
+    keywords, countries = ["data science", "machine learning", "nlp"], ["de", "at"]
+    fetch_jobs.fetch_jobs(keywords, countries=countries, pages=4, results_per_page=10)
+    assert stub.requests == 24
+    assert 1 < stub.max_in_flight <= 4
+
+    stub.max_in_flight = 0
+    list(fetch_jobs.iter_job_pages(keywords, countries=countries, pages=4, results_per_page=10))
+    assert 1 < stub.max_in_flight <= 4
+
+@pytest.mark.parametrize("stub", [{"total_jobs": 100, "keyword_offsets": False, "error_statuses": [429, 503, 502, 504]}],
+                         indirect=True)
+def test_retries_rate_limits_and_server_errors(stub):
+    jobs = fetch_jobs.fetch_jobs(["data science"], countries=["de"], pages=2, results_per_page=20)
+    assert stub.requests == 2 + 4
+    assert [job["id"] for job in jobs] == [job["id"] for job in stub.jobs[:40]]
+
+@pytest.mark.parametrize("stub", [{"error_statuses": [503, 503]}], indirect=True)
+def test_gives_up_after_max_retries(stub, monkeypatch):
+    monkeypatch.setattr(fetch_jobs, "ADZUNA_MAX_RETRIES", 1)
+    with pytest.raises(requests.HTTPError):
+        fetch_jobs.fetch_page("data science", "de", 1, 20)
+    assert stub.requests == 2
+
+@pytest.mark.parametrize("stub", [{"total_jobs": 100, "keyword_offsets": False}], indirect=True)
+def test_incremental_watermarks_are_kept_per_consumer(stub, tmp_path):
+    state_path = str(tmp_path / "fetch-state.json")
+    fetch = lambda consumers: fetch_jobs.fetch_new_jobs(["data science"], countries=["de"], pages=2, results_per_page=20,
+                                                        state_path=state_path, by_keyword=True, consumers=consumers)
+    expected = [job["id"] for job in stub.jobs[:40]]
+
+    _, _, consumer_jobs = fetch({"cv-a": ["data science"]})
+    assert consumer_jobs == {"cv-a": expected}
+    # A second CV with the same keyword still gets the existing postings, the first one gets nothing new
+    jobs, keyword_jobs, consumer_jobs = fetch({"cv-a": ["data science"], "cv-b": ["data science"]})
+    assert consumer_jobs == {"cv-a": [], "cv-b": expected}
+    assert [job["id"] for job in jobs] == keyword_jobs["data science"] == expected
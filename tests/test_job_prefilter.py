@@ -0,0 +1,38 @@
+import os
+import json
+import copy
+
+from job_prefilter import prefilter_jobs, rank_jobs
+
+# Jobs labelled 0-100 by hand after the scoring prompt's criteria, not scores from a job-scoring run.
+# Recall against real LLM scores is measured by prefilter_benchmark.py --matches on an exported job_matches.csv
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "prefilter_labeled_jobs.json")
+TOP_K = 15
+MIN_LABEL = 70
+MIN_KEPT = 0.9
+
+def load_fixture():
+    with open(FIXTURE, encoding="utf-8") as f:
+        fixture = json.load(f)
+    labels = {job["id"]: job.pop("label") for job in fixture["jobs"]}
+    return fixture["cv"], fixture["jobs"], labels
+
+def test_top_k_keeps_hand_labeled_matches():
+    cv, jobs, labels = load_fixture()
+    matches = {job_id for job_id, label in labels.items() if label >= MIN_LABEL}
+    kept = {job["id"] for job in prefilter_jobs(jobs, cv, top_k=TOP_K, threshold=0)}
+    assert len(matches & kept) / len(matches) >= MIN_KEPT
+
+def test_ranking_does_not_drift_across_calls():
+    cv, jobs, _ = load_fixture()
+    first = rank_jobs(jobs, cv).tolist()
+    # Other job sets ranked in between, as on warm invocations, must not change the ranking
+    prefilter_jobs(copy.deepcopy(jobs[::2]) * 3, cv)
+    prefilter_jobs(jobs, "Java Spring Boot Kubernetes")
+    assert rank_jobs(jobs, cv).tolist() == first
+
+def test_keeps_original_order_of_selected_jobs():
+    cv, jobs, _ = load_fixture()
+    kept = [job["id"] for job in prefilter_jobs(jobs, cv, top_k=TOP_K, threshold=0)]
+    assert len(kept) == TOP_K
+    assert kept == sorted(kept, key=[job["id"] for job in jobs].index)
@@ -0,0 +1,41 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm_backends
+from fakes import FakeMessage
+
+class SlowServer:
+    # Tracks how many requests it handles at once
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        return FakeMessage(f"<think>reasoning</think> {prompt}")
+
+def test_listed_backends_must_be_configured(monkeypatch):
+    monkeypatch.delenv("LOCAL_LLM_BASE_URL", raising=False)
+    monkeypatch.setenv("LLM_BACKENDS_EXTRACT_JOB_KEYWORDS", "local")
+    with pytest.raises(ValueError, match="local \\(set LOCAL_LLM_BASE_URL\\)"):
+        llm_backends.route("extract-job-keywords")
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://localhost:11434/v1")
+    assert [backend.name for backend in llm_backends.allowed_backends("extract-job-keywords")] == ["local"]
+
+def test_queued_model_bounds_requests_in_flight():
+    server = SlowServer()
+    model = llm_backends.QueuedChatModel(server, concurrency=3)
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        answers = list(executor.map(lambda i: model.invoke(f"prompt {i}").content, range(24)))
+    assert answers == [f"prompt {i}" for i in range(24)]
+    assert server.max_in_flight == 3
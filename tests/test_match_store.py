@@ -0,0 +1,69 @@
+import json
+import threading
+
+from match_store import MatchStore
+from object_store import LocalObjectStore
+
+EMAIL = "jane@example.com"
+
+class RecordingStore(LocalObjectStore):
+    # Keeps the size of every write
+    def __init__(self, root):
+        super().__init__(root)
+        self.writes = []
+
+    def put(self, key, data, **kwargs):
+        etag = super().put(key, data, **kwargs)
+        self.writes.append((key, len(data)))
+        return etag
+
+def rows(start, count, score="50"):
+    return [{"Job ID": str(i), "Title": f"Job {i}", "Score": score} for i in range(start, start + count)]
+
+def test_upsert_counts_and_rows_across_compactions(tmp_path):
+    store = MatchStore(LocalObjectStore(str(tmp_path)), compact_segments=3)
+    results = [store.append(EMAIL, rows(i * 10, 20)) for i in range(6)]
+    assert results[0]["inserted"] == 20
+    assert all(result["inserted"] == 10 and result["updated"] == 10 for result in results[1:])
+    assert any(result["compacted"] for result in results[1:])
+    store.append(EMAIL, rows(0, 5, score="90"))
+    matches = store.read_matches(EMAIL)
+    assert sorted(matches, key=int) == [str(i) for i in range(70)]
+    assert matches["3"]["Score"] == "90"
+
+def test_commit_writes_do_not_grow_with_history(tmp_path):
+    recording = RecordingStore(str(tmp_path))
+    store = MatchStore(recording, compact_segments=4)
+    commit_bytes = []
+    for i in range(20):
+        recording.writes.clear()
+        result = store.append(EMAIL, rows(i * 50, 50))
+        assert result["inserted"] == 50
+        if not result["compacted"]:
+            # The new segment and the manifest, no index
+            assert [key.rsplit("/", 1)[-1] for key, _ in recording.writes][1:] == ["job_matches.manifest.json"]
+            commit_bytes.append(sum(size for _, size in recording.writes))
+    manifest = json.loads(recording.get(store.manifest_key(EMAIL))[0])
+    assert "index" not in manifest
+    assert max(commit_bytes) < 2 * min(commit_bytes)
+
+def test_manifest_with_legacy_index_keeps_counts(tmp_path):
+    store = MatchStore(LocalObjectStore(str(tmp_path)), compact_segments=10)
+    store.append(EMAIL, rows(0, 10))
+    key = store.manifest_key(EMAIL)
+    manifest = json.loads(store.store.get(key)[0])
+    manifest["index"] = {str(i): 0 for i in range(10)}
+    store.store.put(key, json.dumps(manifest))
+    store.store.delete(store.index_key(EMAIL))
+    result = store.append(EMAIL, rows(5, 10))
+    assert (result["inserted"], result["updated"]) == (5, 5)
+    assert "index" not in json.loads(store.store.get(key)[0])
+
+def test_concurrent_appends_keep_every_row(tmp_path):
+    store = MatchStore(LocalObjectStore(str(tmp_path)), compact_segments=2)
+    threads = [threading.Thread(target=store.append, args=(EMAIL, rows(i * 10, 10))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.read_matches(EMAIL)) == 80
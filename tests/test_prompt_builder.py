@@ -0,0 +1,45 @@
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SCORE_CACHE_BACKEND", "none")
+
+import prompt_builder
+import telemetry
+from stage_loader import load_stage
+from fakes import make_cv, make_jobs
+
+job_scoring = load_stage("job-scoring")
+
+def saved_tokens(build):
+    # Counters recorded while building the prompts
+    result, snapshot = telemetry.run_collected(build)
+    return result, snapshot["counters"]
+
+def test_tokens_saved_match_the_verbose_prompts():
+    cv, jobs = make_cv(), make_jobs(5)
+    prepared = prompt_builder.PreparedCV(cv)
+    prompts, counters = saved_tokens(lambda: [job_scoring.build_scoring_prompt(job, cv, prepared) for job in jobs])
+    verbose = sum(telemetry.estimate_tokens(job_scoring.build_verbose_scoring_prompt(job, cv)) for job in jobs)
+    sent = sum(map(telemetry.estimate_tokens, prompts))
+    assert counters["prompt_tokens.job-scoring"] == sent
+    # Estimated in two parts, each rounds down by less than a token
+    assert abs(counters["prompt_tokens_saved.job-scoring"] - (verbose - sent)) <= len(jobs)
+
+    prompt, counters = saved_tokens(lambda: job_scoring.build_batch_scoring_prompt(jobs, cv, prepared))
+    verbose = telemetry.estimate_tokens(job_scoring.build_verbose_batch_scoring_prompt(jobs, cv))
+    assert abs(counters["prompt_tokens_saved.job-scoring"] - (verbose - telemetry.estimate_tokens(prompt))) <= 1
+
+def test_long_digest_leaves_the_minimum_description(monkeypatch):
+    cv = dict(make_cv(), Projects=[f"Project {i}: " + "pipelines and models " * 20 for i in range(20)])
+    job = dict(make_jobs(1)[0], description="Python and SQL for our analytics team. " * 100)
+    monkeypatch.setattr(prompt_builder, "SCORING_PROMPT_TOKEN_BUDGET", 300)
+    prepared = prompt_builder.PreparedCV(cv)
+    assert telemetry.estimate_tokens(prepared.digest) > prompt_builder.SCORING_PROMPT_TOKEN_BUDGET
+    description = job_scoring.build_scoring_prompt(job, cv, prepared).rsplit("Description: ", 1)[1]
+    # Cut at the last word boundary before the minimum budget
+    assert telemetry.estimate_tokens(description) >= 0.9 * prompt_builder.DESCRIPTION_MIN_TOKENS
+    assert description.startswith("Python and SQL")
+
+    monkeypatch.setattr(prompt_builder, "SCORING_BATCH_TOKEN_BUDGET", 300)
+    prompt = job_scoring.build_batch_scoring_prompt([job, job], cv, prepared)
+    assert prompt.count("Python and SQL for our analytics team.") >= 2 * 8